@@ -0,0 +1,223 @@
+"""
+Micro-benchmarks of the backend which run without SQL Server.
+
+pytds is replaced with an in-process fake driver returning canned result
+sets (benchmarks/fake_driver.py), so the numbers only include work done by
+Django and the backend: SQL compilation, parameter conversion, cursor
+creation, row decoding and bulk_create batching. Results are printed as JSON
+with sorted keys, each benchmark reports the best time of several repeats
+and deterministic counts, e.g. number of statements, which can be compared
+between runs.
+
+    python benchmarks/backend.py --repeat 5 --output before.json
+"""
+from __future__ import print_function, unicode_literals
+import argparse
+import datetime
+import decimal
+import json
+import os
+import platform
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import django  # NOQA
+from django.conf import settings  # NOQA
+
+import fake_driver  # NOQA
+
+
+def configure():
+    settings.configure(
+        DATABASES={
+            'default': {
+                'ENGINE': 'sqlserver',
+                'NAME': 'benchmark',
+                'HOST': 'localhost',
+                'USER': 'sa',
+                'PASSWORD': 'sa',
+            },
+        },
+        INSTALLED_APPS=['sqlserver'],
+        USE_TZ=True,
+    )
+    django.setup()
+    fake_driver.install()
+
+
+def get_model():
+    from django.db import models
+
+    class Row(models.Model):
+        number = models.IntegerField()
+        name = models.CharField(max_length=50)
+        text = models.TextField()
+        flag = models.BooleanField(default=False)
+        day = models.DateField()
+        created = models.DateTimeField()
+        at = models.TimeField()
+        amount = models.DecimalField(max_digits=10, decimal_places=2)
+        ratio = models.FloatField()
+        uid = models.UUIDField()
+
+        class Meta:
+            app_label = 'benchmark'
+    return Row
+
+
+def make_values(i):
+    from django.utils.timezone import utc
+    created = datetime.datetime(2017, 1, 2, 3, 4, 5, tzinfo=utc)
+    return {
+        'number': i, 'name': 'name', 'text': 'text', 'flag': bool(i % 2), 'day': created.date(),
+        'created': created, 'at': created.time(), 'amount': decimal.Decimal('1.50'), 'ratio': 0.5,
+        'uid': uuid.UUID(int=i),
+    }
+
+
+def make_rows(model, count):
+    names = [field.attname for field in model._meta.concrete_fields]
+    rows = []
+    for i in range(count):
+        values = make_values(i)
+        values['id'] = i + 1
+        rows.append(tuple(values[name] for name in names))
+    return rows
+
+
+def bench_compile(model, connection):
+    from django.db.models import Count
+    querysets = [
+        model.objects.filter(name='name', number__gt=10),
+        model.objects.order_by('-created')[100:120],
+        model.objects.values('day').annotate(count=Count('id')).order_by('day'),
+        model.objects.filter(created__year=2017).exclude(flag=True).only('name'),
+    ]
+
+    def run():
+        for queryset in querysets:
+            queryset.query.get_compiler(using='default').as_sql()
+    return run, len(querysets), {}
+
+
+def bench_params(model, connection):
+    objs = [model(**make_values(i)) for i in range(100)]
+    fields = [field for field in model._meta.concrete_fields if not field.primary_key]
+
+    def run():
+        for obj in objs:
+            for field in fields:
+                field.get_db_prep_save(getattr(obj, field.attname), connection)
+    return run, len(objs) * len(fields), {}
+
+
+def bench_cursor(model, connection):
+    connection.ensure_connection()
+
+    def run():
+        for i in range(100):
+            connection.cursor().close()
+    return run, 100, {}
+
+
+def make_bench_rows(fast):
+    def bench_rows(model, connection):
+        rows = make_rows(model, 10000)
+
+        def run():
+            fake_driver.set_result(rows)
+            connection.fast_row_decoding = fast
+            try:
+                list(model.objects.values_list(*[field.attname for field in model._meta.concrete_fields]))
+            finally:
+                connection.fast_row_decoding = False
+        return run, len(rows), {}
+    return bench_rows
+
+
+def bench_instances(model, connection):
+    rows = make_rows(model, 10000)
+
+    def run():
+        fake_driver.set_result(rows)
+        list(model.objects.all())
+    return run, len(rows), {}
+
+
+def bench_bulk_create(model, connection):
+    objs = [model(**make_values(i)) for i in range(10000)]
+
+    def run():
+        fake_driver.set_result([], rowcount=0)
+        model.objects.bulk_create(objs)
+    connection.ensure_connection()
+    before = connection.connection.statements
+    run()
+    return run, len(objs), {'statements': connection.connection.statements - before}
+
+
+BENCHMARKS = [
+    ('compile', bench_compile),
+    ('params', bench_params),
+    ('cursor', bench_cursor),
+    ('rows_default', make_bench_rows(False)),
+    ('rows_fast', make_bench_rows(True)),
+    ('instances', bench_instances),
+    ('bulk_create', bench_bulk_create),
+]
+
+
+def measure(run, repeat):
+    timings = []
+    for i in range(repeat):
+        start = time.time()
+        run()
+        timings.append(time.time() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5, help='Number of runs of each benchmark, best is reported.')
+    parser.add_argument('--output', help='Writes JSON to the file instead of standard output.')
+    parser.add_argument('names', nargs='*', help='Names of benchmarks to run, all by default.')
+    args = parser.parse_args()
+
+    configure()
+    from django.db import connection
+    model = get_model()
+    results = {}
+    for name, setup in BENCHMARKS:
+        if args.names and name not in args.names:
+            continue
+        run, operations, counts = setup(model, connection)
+        # warm up
+        run()
+        seconds = measure(run, args.repeat)
+        result = {
+            'operations': operations,
+            'seconds': round(seconds, 6),
+            'us_per_operation': round(seconds * 1e6 / operations, 3),
+        }
+        result.update(counts)
+        results[name] = result
+    output = json.dumps({
+        'benchmarks': results,
+        'environment': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'repeat': args.repeat,
+        },
+    }, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Compares Django's database cache backend with sqlserver.cache.DatabaseCache.
+
+Connects to SQL Server using the same environment variables as the test
+suite (HOST, SQLINSTANCE, DATABASE_NAME, SQLUSER, SQLPASSWORD), creates cache
+tables, runs each operation for every backend and prints operations per
+second and statements per operation.
+
+    python benchmarks/cache.py --iterations 2000
+"""
+from __future__ import print_function, unicode_literals
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import django  # NOQA
+from django.conf import settings  # NOQA
+
+INSTANCE = os.environ.get('SQLINSTANCE', '')
+HOST = os.environ.get('COMPUTERNAME', os.environ.get('HOST', 'localhost'))
+if INSTANCE:
+    HOST = '\\'.join([HOST, INSTANCE])
+
+BACKENDS = [
+    ('django', 'django.core.cache.backends.db.DatabaseCache', 'bench_cache_django'),
+    ('sqlserver', 'sqlserver.cache.DatabaseCache', 'bench_cache_sqlserver'),
+]
+
+
+def configure():
+    settings.configure(
+        DATABASES={
+            'default': {
+                'ENGINE': 'sqlserver',
+                'NAME': os.environ.get('DATABASE_NAME', 'django_test_backend'),
+                'HOST': HOST,
+                'USER': os.environ.get('SQLUSER', 'sa'),
+                'PASSWORD': os.environ.get('SQLPASSWORD', 'sa'),
+            },
+        },
+        CACHES=dict(
+            (name, {'BACKEND': backend, 'LOCATION': table, 'OPTIONS': {'MAX_ENTRIES': 1000000}})
+            for name, backend, table in BACKENDS
+        ),
+        INSTALLED_APPS=['sqlserver'],
+        USE_TZ=True,
+    )
+    django.setup()
+
+
+def measure(connection, iterations, func):
+    # statements are counted in a separate short run, query log is limited
+    # and logging would distort timings
+    connection.force_debug_cursor = True
+    connection.queries_log.clear()
+    for i in range(10):
+        func(i)
+    statements = len(connection.queries_log) / 10.0
+    connection.force_debug_cursor = False
+    start = time.time()
+    for i in range(iterations):
+        func(i)
+    elapsed = time.time() - start
+    return iterations / elapsed, statements
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=1000)
+    parser.add_argument('--batch-size', type=int, default=100, help='Number of keys in get_many/set_many.')
+    args = parser.parse_args()
+
+    configure()
+    from django.core.cache import caches
+    from django.core.management import call_command
+    from django.db import connection
+
+    call_command('createcachetable', verbosity=0)
+    batch = dict(('batch%d' % i, 'x' * 100) for i in range(args.batch_size))
+    operations = [
+        ('set', lambda cache: lambda i: cache.set('key%d' % i, 'x' * 100)),
+        ('get', lambda cache: lambda i: cache.get('key%d' % i)),
+        ('add', lambda cache: lambda i: cache.add('key%d' % i, 'y')),
+        ('set_many', lambda cache: lambda i: cache.set_many(batch)),
+        ('get_many', lambda cache: lambda i: cache.get_many(list(batch))),
+    ]
+    print('%-10s %-10s %12s %12s' % ('operation', 'backend', 'ops/sec', 'stmts/op'))
+    try:
+        for operation, make_func in operations:
+            for name, backend, table in BACKENDS:
+                cache = caches[name]
+                ops, statements = measure(connection, args.iterations, make_func(cache))
+                print('%-10s %-10s %12.1f %12.2f' % (operation, name, ops, statements))
+    finally:
+        with connection.cursor() as cursor:
+            for name, backend, table in BACKENDS:
+                cursor.execute('DROP TABLE %s' % connection.ops.quote_name(table))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+In-process replacement of pytds for benchmarks.
+
+Implements the part of pytds interface used by the backend. Statements are
+not parsed, statements which contain SELECT return rows set by
+:func:`set_result`, other statements affect number of rows given by
+``rowcount`` argument of :func:`set_result`. Executed statements are counted
+in ``Connection.statements``.
+"""
+from __future__ import absolute_import, unicode_literals
+import collections
+import sys
+
+# Django wraps exceptions of the driver module
+from pytds import (  # NOQA
+    Error, InterfaceError, DatabaseError, DataError, OperationalError, IntegrityError,
+    InternalError, ProgrammingError, NotSupportedError, Warning,
+)
+
+# SQL Server 2016
+PRODUCT_VERSION = 0x0D000FA1
+
+_result = {'rows': [], 'description': None, 'rowcount': 1}
+
+
+def set_result(rows, description=None, rowcount=1):
+    """
+    Sets rows returned by SELECT statements and number of rows affected
+    by other statements.
+    """
+    _result['rows'] = rows
+    _result['description'] = description
+    _result['rowcount'] = rowcount
+
+
+def connect(**kwargs):
+    return Connection(**kwargs)
+
+
+class Connection(object):
+    adoConn = collections.namedtuple('AdoConn', 'Properties')(Properties=[])
+    product_version = PRODUCT_VERSION
+
+    def __init__(self, autocommit=False, **kwargs):
+        self.autocommit = autocommit
+        self.isolation_level = 0
+        self.statements = 0
+        self.closed = False
+
+    def set_autocommit(self, value):
+        self.autocommit = value
+
+    def cursor(self):
+        return Cursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class Cursor(object):
+    arraysize = 1
+    spid = 1
+    messages = []
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.tzinfo_factory = None
+        self.description = None
+        self.rowcount = -1
+        self._rows = iter(())
+
+    def __iter__(self):
+        return self._rows
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def execute(self, operation, params=()):
+        self.connection.statements += 1
+        if 'SELECT' in operation:
+            self.description = _result['description']
+            self.rowcount = -1
+            self._rows = iter(_result['rows'])
+        else:
+            self.description = None
+            self.rowcount = _result['rowcount']
+            self._rows = iter(())
+
+    def executemany(self, operation, params_seq):
+        for params in params_seq:
+            self.execute(operation, params)
+
+    def callproc(self, procname, params=()):
+        self.execute('EXEC %s' % procname, params)
+        return params
+
+    def nextset(self):
+        return None
+
+    def fetchone(self):
+        return next(self._rows, None)
+
+    def fetchmany(self, size=None):
+        if size is None:
+            size = self.arraysize
+        return [row for _, row in zip(range(size), self._rows)]
+
+    def fetchall(self):
+        return list(self._rows)
+
+    def close(self):
+        self._rows = iter(())
+
+
+def install():
+    """Replaces pytds with this module as driver of the backend."""
+    from sqlserver.base import DatabaseWrapper
+    DatabaseWrapper.Database = sys.modules[__name__]
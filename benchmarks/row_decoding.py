@@ -0,0 +1,100 @@
+"""
+Measures decoding of fetched rows with and without fast_row_decoding option.
+
+Rows of a model with columns of mixed types are decoded by the query
+compiler without a database connection, so the numbers only include work
+done after pytds returned the values.
+
+    python benchmarks/row_decoding.py --rows 1000000
+"""
+from __future__ import print_function, unicode_literals
+import argparse
+import datetime
+import decimal
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import django  # NOQA
+from django.conf import settings  # NOQA
+
+
+def configure():
+    settings.configure(
+        DATABASES={
+            'default': {
+                'ENGINE': 'sqlserver',
+                'NAME': 'benchmark',
+                'HOST': 'localhost',
+                'USER': 'sa',
+                'PASSWORD': 'sa',
+            },
+        },
+        INSTALLED_APPS=['sqlserver'],
+        USE_TZ=True,
+    )
+    django.setup()
+
+
+def get_model():
+    from django.db import models
+
+    class Row(models.Model):
+        number = models.IntegerField()
+        name = models.CharField(max_length=50)
+        text = models.TextField()
+        flag = models.BooleanField(default=False)
+        day = models.DateField()
+        created = models.DateTimeField()
+        at = models.TimeField()
+        amount = models.DecimalField(max_digits=10, decimal_places=2)
+        ratio = models.FloatField()
+        uid = models.UUIDField()
+
+        class Meta:
+            app_label = 'benchmark'
+    return Row
+
+
+def make_rows(count):
+    from django.utils.timezone import utc
+    created = datetime.datetime(2017, 1, 2, 3, 4, 5, tzinfo=utc)
+    uid = uuid.uuid4()
+    return [
+        (i, i, 'name', 'text', bool(i % 2), created.date(), created, created.time(),
+         decimal.Decimal('1.50'), 0.5, uid)
+        for i in range(count)
+    ]
+
+
+def measure(connection, queryset, rows, fast):
+    connection.fast_row_decoding = fast
+    compiler = queryset.query.get_compiler(using=queryset.db)
+    compiler.as_sql()
+    start = time.time()
+    for row in compiler.results_iter(results=[rows]):
+        pass
+    return time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    args = parser.parse_args()
+
+    configure()
+    from django.db import connection
+    model = get_model()
+    rows = make_rows(args.rows)
+    queryset = model.objects.all()
+    print('%-10s %10s %14s' % ('mode', 'seconds', 'rows/sec'))
+    for name, fast in (('default', False), ('fast', True)):
+        elapsed = measure(connection, queryset, rows, fast)
+        print('%-10s %10.3f %14.0f' % (name, elapsed, args.rows / elapsed))
+
+
+if __name__ == '__main__':
+    main()
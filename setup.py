@@ -21,7 +21,7 @@ setup(
     description="Django backend database support for MS SQL Server and pytds.",
     author='Mikhail Denisenko',
     author_email='denisenkom@gmail.com',
-    packages=['sqlserver'],
+    packages=['sqlserver', 'sqlserver.management', 'sqlserver.management.commands'],
     classifiers=[
         'Development Status :: 4 - Beta',
         'Framework :: Django',
@@ -33,7 +33,7 @@ setup(
         'Topic :: Database',
     ],
     install_requires=[
-        'python-tds',
+        'python-tds<1.9',
         'django-mssql>=1.8',
     ],
     zip_safe=True,
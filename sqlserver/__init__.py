@@ -1,3 +1,7 @@
 from __future__ import absolute_import, unicode_literals
 # following PEP 386
 __version__ = "1.11"
+
+from .options import register_meta_options
+
+register_meta_options()
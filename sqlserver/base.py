@@ -2,8 +2,17 @@
 from __future__ import absolute_import, unicode_literals
 import datetime
 import collections
+import time
+import warnings
 
 import django.db.backends.base.client
+import django.db.models.aggregates
+from django.db.models.expressions import Col
+from django.db.models.sql.constants import MULTI
+from django.core.exceptions import ImproperlyConfigured
+from django.conf import settings
+from django.utils import six, timezone
+from django.utils.functional import cached_property
 from django.utils.timezone import utc
 
 import sqlserver_ado
@@ -13,8 +22,16 @@ import sqlserver_ado.operations
 import sqlserver_ado.introspection
 import sqlserver_ado.creation
 
+from .batch import Batch
+from .introspection import DatabaseIntrospection
+from .metrics import MetricsCursor, get_collector, instrument_connection
+from .schema import DatabaseSchemaEditor
+from .slow_queries import SlowQueryCursor
+from .statistics import StatisticsCursorDebugWrapper
+
 try:
     import pytds
+    import pytds.extensions
 except ImportError:
     raise Exception('pytds is not available, to install pytds run pip install python-tds')
 
@@ -38,10 +55,132 @@ _SUPPORTED_OPTIONS = [
 ]
 
 
+# 'read committed snapshot' is READ COMMITTED which reads row versions
+# when READ_COMMITTED_SNAPSHOT database option is ON
+ISOLATION_LEVELS = {
+    'read uncommitted': pytds.extensions.ISOLATION_LEVEL_READ_UNCOMMITTED,
+    'read committed': pytds.extensions.ISOLATION_LEVEL_READ_COMMITTED,
+    'read committed snapshot': pytds.extensions.ISOLATION_LEVEL_READ_COMMITTED,
+    'repeatable read': pytds.extensions.ISOLATION_LEVEL_REPEATABLE_READ,
+    'serializable': pytds.extensions.ISOLATION_LEVEL_SERIALIZABLE,
+    'snapshot': pytds.extensions.ISOLATION_LEVEL_SNAPSHOT,
+}
+
+_ISOLATION_LEVELS_SQL = {
+    pytds.extensions.ISOLATION_LEVEL_READ_UNCOMMITTED: 'READ UNCOMMITTED',
+    pytds.extensions.ISOLATION_LEVEL_READ_COMMITTED: 'READ COMMITTED',
+    pytds.extensions.ISOLATION_LEVEL_REPEATABLE_READ: 'REPEATABLE READ',
+    pytds.extensions.ISOLATION_LEVEL_SERIALIZABLE: 'SERIALIZABLE',
+    pytds.extensions.ISOLATION_LEVEL_SNAPSHOT: 'SNAPSHOT',
+}
+
+
+_DATABASE_OPTIONS_SQL = (
+    'SELECT is_read_committed_snapshot_on, snapshot_isolation_state '
+    'FROM sys.databases WHERE database_id = DB_ID()'
+)
+
+
+def get_isolation_level(name):
+    """
+    Returns pytds isolation level constant for isolation level name,
+    e.g. 'snapshot'.
+    """
+    try:
+        return ISOLATION_LEVELS[name.lower()]
+    except (KeyError, AttributeError):
+        raise ImproperlyConfigured(
+            "Invalid isolation level %r, valid values are: %s." % (
+                name, ', '.join("'%s'" % level for level in sorted(ISOLATION_LEVELS))))
+
+
+class LazySavepointCursor(object):
+    """
+    Cursor wrapper which sends pending savepoints of the connection in the
+    same batch as the next statement.
+    """
+    def __init__(self, cursor, db):
+        self.cursor = cursor
+        self.db = db
+
+    def __getattr__(self, attr):
+        return getattr(self.cursor, attr)
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _execute(self, savepoints, sql, params=()):
+        try:
+            return self.cursor.execute(sql, params)
+        except Exception:
+            # savepoints sent with a batch which failed to compile were not
+            # created, see DatabaseWrapper._savepoint_rollback()
+            self.db._unconfirmed_savepoints.update(savepoints)
+            raise
+
+    def _flush_savepoints(self):
+        savepoints = self.db._pending_savepoints
+        sql = self.db.pop_pending_savepoints_sql()
+        if sql:
+            self._execute(savepoints, sql)
+
+    def execute(self, sql, params=()):
+        savepoints = self.db._pending_savepoints
+        savepoints_sql = self.db.pop_pending_savepoints_sql()
+        if not savepoints_sql:
+            return self.cursor.execute(sql, params)
+        return self._execute(savepoints, savepoints_sql + sql, params)
+
+    def executemany(self, sql, param_list):
+        # pytds executes statement separately for every set of parameters
+        self._flush_savepoints()
+        return self.cursor.executemany(sql, param_list)
+
+    def callproc(self, procname, params=()):
+        self._flush_savepoints()
+        return self.cursor.callproc(procname, params)
+
+
+class LazySavepointConnection(object):
+    """
+    Wrapper of pytds connection which returns cursors sending pending
+    savepoints, so statements executed with cursors of the raw connection,
+    e.g. ``connection.connection.cursor()``, don't bypass them.
+    """
+    def __init__(self, connection, db):
+        self.__dict__['connection'] = connection
+        self.__dict__['db'] = db
+
+    def __getattr__(self, attr):
+        return getattr(self.connection, attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self.connection, attr, value)
+
+    def cursor(self):
+        return LazySavepointCursor(self.connection.cursor(), self.db)
+
+
+_fixed_timezones = {}
+
+
 def utc_tzinfo_factory(offset):
-    if offset != 0:
-        raise AssertionError("database connection isn't set to UTC")
-    return utc
+    """
+    Returns UTC for values of date and time columns without offset, and a
+    cached fixed offset timezone for values of datetimeoffset columns.
+    """
+    if offset == 0:
+        return utc
+    try:
+        return _fixed_timezones[offset]
+    except KeyError:
+        return _fixed_timezones.setdefault(offset, timezone.get_fixed_timezone(offset))
 
 
 #
@@ -49,13 +188,38 @@ def utc_tzinfo_factory(offset):
 #
 class DatabaseWrapper(sqlserver_ado.base.DatabaseWrapper):
     Database = pytds
+    SchemaEditorClass = DatabaseSchemaEditor
+    introspection_class = DatabaseIntrospection
+
+    def __init__(self, *args, **kwargs):
+        super(DatabaseWrapper, self).__init__(*args, **kwargs)
+        # django-mssql instantiates its own helper classes in __init__
+        # ignoring *_class attributes, replace them with extended versions
+        self.introspection = self.introspection_class(self)
+        self.isolation_level = None
+        self.lazy_savepoints = self.settings_dict['OPTIONS'].get('lazy_savepoints', False)
+        self.fast_row_decoding = self.settings_dict['OPTIONS'].get('fast_row_decoding', False)
+        self.query_statistics = self.settings_dict['OPTIONS'].get('query_statistics', False)
+        self.slow_query_threshold = self.settings_dict['OPTIONS'].get('slow_query_threshold')
+        self.slow_query_hashes = self.settings_dict['OPTIONS'].get('slow_query_hashes', True)
+        self._slow_query_connection = None
+        self.metrics = get_collector(self.settings_dict['OPTIONS'].get('metrics'))
+        self.metrics_tags = {'alias': self.alias}
+        self.round_trips = 0
+        self._request_round_trips = None
+        self._pending_savepoints = []
+        self._unconfirmed_savepoints = set()
+        self._pending_statistics = None
+        self._statistics_enabled = False
 
     def get_connection_params(self):
         """Returns a dict of parameters suitable for get_new_connection."""
         from django.conf import settings
         settings_dict = self.settings_dict
         options = settings_dict.get('OPTIONS', {})
-        autocommit = options.get('autocommit', False)
+        # connection is opened in the mode Django switches to right after
+        # connecting, switching costs a begin or rollback request
+        autocommit = options.get('autocommit', settings_dict.get('AUTOCOMMIT', True))
         conn_params = {
             'server': settings_dict['HOST'],
             'database': settings_dict['NAME'],
@@ -75,15 +239,193 @@ class DatabaseWrapper(sqlserver_ado.base.DatabaseWrapper):
                 conn_params[opt] = options[opt]
 
         self.tzinfo_factory = utc_tzinfo_factory if settings.USE_TZ else None
+        isolation_level = options.get('isolation_level')
+        self.isolation_level = None if isolation_level is None else get_isolation_level(isolation_level)
+        self._pending_savepoints = []
+        self._unconfirmed_savepoints = set()
+        self._pending_statistics = None
+        self._statistics_enabled = False
 
         return conn_params
 
+    def get_new_connection(self, conn_params):
+        start = time.time()
+        conn = super(DatabaseWrapper, self).get_new_connection(conn_params)
+        if self.metrics is not None:
+            instrument_connection(self, conn, time.time() - start)
+        if self.lazy_savepoints:
+            conn = LazySavepointConnection(conn, self)
+        return conn
+
+    def get_connection_init_sql(self):
+        """
+        Returns list of statements which are sent to the server in a single
+        batch after connecting.
+        """
+        sql = []
+        if self.isolation_level is not None:
+            sql.append('SET TRANSACTION ISOLATION LEVEL %s' % _ISOLATION_LEVELS_SQL[self.isolation_level])
+        if self.query_statistics and self.queries_logged:
+            sql.append('SET STATISTICS IO, TIME ON')
+        return sql
+
+    def init_connection_state(self):
+        """Initializes the database connection settings."""
+        super(DatabaseWrapper, self).init_connection_state()
+        if self.isolation_level is not None:
+            # pytds passes isolation level with every transaction begin
+            # request, it does not require a separate statement
+            self.connection.isolation_level = self.isolation_level
+        sql = self.get_connection_init_sql()
+        self._statistics_enabled = 'SET STATISTICS IO, TIME ON' in sql
+        check_rcsi = (self.settings_dict['OPTIONS'].get('isolation_level') or '').lower() == 'read committed snapshot'
+        # database options are read in the same batch when they are needed
+        # and not yet cached
+        read_options = check_rcsi and '_database_options' not in self.features.__dict__
+        if read_options:
+            sql.append(_DATABASE_OPTIONS_SQL)
+        if sql:
+            with self.connection.cursor() as cursor:
+                cursor.execute(';\n'.join(sql))
+                if read_options:
+                    self.features.__dict__['_database_options'] = cursor.fetchone()
+        if check_rcsi:
+            if not self.features.is_read_committed_snapshot_on:
+                warnings.warn(
+                    "'read committed snapshot' isolation level is used but READ_COMMITTED_SNAPSHOT "
+                    "option of database %s is OFF, readers will block writers." % self.settings_dict['NAME'],
+                    RuntimeWarning)
+
+    def set_isolation_level(self, level=None):
+        """
+        Sets isolation level of transactions started afterwards, ``None``
+        restores isolation level configured in OPTIONS.
+        """
+        self.ensure_connection()
+        if level is None:
+            # SQL Server's default is READ COMMITTED
+            value = self.isolation_level or pytds.extensions.ISOLATION_LEVEL_READ_COMMITTED
+        else:
+            value = get_isolation_level(level)
+        self.connection.isolation_level = value
+
     def create_cursor(self, name=None):
         """Creates a cursor. Assumes that a connection is established."""
-        cursor = self.connection.cursor()
+        connection = self.connection
+        if isinstance(connection, LazySavepointConnection):
+            # cursor is wrapped below together with other wrappers
+            connection = connection.connection
+        cursor = connection.cursor()
         cursor.tzinfo_factory = self.tzinfo_factory
+        if self.lazy_savepoints:
+            cursor = LazySavepointCursor(cursor, self)
+        if self.slow_query_threshold is not None:
+            cursor = SlowQueryCursor(cursor, self)
+        if self.metrics is not None:
+            cursor = MetricsCursor(cursor, self)
         return cursor
 
+    @property
+    def slow_query_connection(self):
+        """
+        Returns separate connection to the same database used to look up
+        query hashes of slow queries, it is closed together with this
+        connection.
+        """
+        if self._slow_query_connection is None:
+            options = dict(self.settings_dict['OPTIONS'])
+            options.pop('slow_query_threshold', None)
+            settings_dict = dict(self.settings_dict, OPTIONS=options)
+            self._slow_query_connection = self.__class__(settings_dict, alias='%s_slow_queries' % self.alias)
+        return self._slow_query_connection
+
+    def close(self):
+        super(DatabaseWrapper, self).close()
+        if self._slow_query_connection is not None:
+            self._slow_query_connection.close()
+
+    def _set_statistics(self, cursor, enabled):
+        # server sends statistics messages only while queries are logged,
+        # statistics are switched when logging is turned on or off
+        if self._statistics_enabled != enabled:
+            cursor.execute('SET STATISTICS IO, TIME %s' % ('ON' if enabled else 'OFF'))
+            self._statistics_enabled = enabled
+
+    def make_debug_cursor(self, cursor):
+        """
+        Creates a cursor which logs queries, with 'query_statistics' option
+        logged queries include statistics reported by the server.
+        """
+        if self.query_statistics:
+            self._set_statistics(cursor, True)
+            return StatisticsCursorDebugWrapper(cursor, self)
+        return super(DatabaseWrapper, self).make_debug_cursor(cursor)
+
+    def make_cursor(self, cursor):
+        if self.query_statistics:
+            self._set_statistics(cursor, False)
+        return super(DatabaseWrapper, self).make_cursor(cursor)
+
+    def batch(self):
+        """
+        Returns :class:`sqlserver.batch.Batch` which executes querysets added
+        to it in a single round trip.
+        """
+        return Batch(self)
+
+    def pop_pending_savepoints_sql(self):
+        """
+        Returns statements which create savepoints not yet sent to the
+        server and forgets them.
+        """
+        sql = ''.join('%s;\n' % self.ops.savepoint_create_sql(sid) for sid in self._pending_savepoints)
+        self._pending_savepoints = []
+        return sql
+
+    def _savepoint(self, sid):
+        if self.lazy_savepoints:
+            # sent together with the next statement, see LazySavepointCursor
+            self._pending_savepoints.append(sid)
+        else:
+            super(DatabaseWrapper, self)._savepoint(sid)
+
+    def _savepoint_rollback(self, sid):
+        if sid in self._pending_savepoints:
+            # nothing was executed since the savepoint
+            del self._pending_savepoints[self._pending_savepoints.index(sid):]
+        elif sid in self._unconfirmed_savepoints:
+            # savepoint was sent with a statement which failed, it does not
+            # exist if the whole batch failed to compile, then there is
+            # nothing to roll back and error 6401 is ignored
+            self._pending_savepoints = []
+            self._unconfirmed_savepoints.discard(sid)
+            with self.cursor() as cursor:
+                cursor.execute(
+                    'BEGIN TRY\n%s;\nEND TRY\n'
+                    'BEGIN CATCH\nIF ERROR_NUMBER() <> 6401 THROW;\nEND CATCH' %
+                    self.ops.savepoint_rollback_sql(sid)
+                )
+        else:
+            self._pending_savepoints = []
+            super(DatabaseWrapper, self)._savepoint_rollback(sid)
+
+    def _savepoint_commit(self, sid):
+        self._unconfirmed_savepoints.discard(sid)
+        if sid in self._pending_savepoints:
+            self._pending_savepoints.remove(sid)
+        else:
+            super(DatabaseWrapper, self)._savepoint_commit(sid)
+
+    def _commit(self):
+        self._pending_savepoints = []
+        self._unconfirmed_savepoints = set()
+        return super(DatabaseWrapper, self)._commit()
+
+    def _rollback(self):
+        self._pending_savepoints = []
+        self._unconfirmed_savepoints = set()
+        return super(DatabaseWrapper, self)._rollback()
+
     def __get_dbms_version(self, make_connection=True):
         """
         Returns the 'DBMS Version' string
@@ -123,6 +465,46 @@ sqlserver_ado.base.DatabaseFeatures.supports_bitwise_rightshift = False
 sqlserver_ado.base.DatabaseFeatures.can_introspect_default = False
 
 
+def _get_database_options(self):
+    with self.connection.cursor() as cursor:
+        cursor.execute(_DATABASE_OPTIONS_SQL)
+        return cursor.fetchone()
+
+
+def _is_read_committed_snapshot_on(self):
+    return bool(self._database_options[0])
+
+
+def _supports_snapshot_isolation(self):
+    # snapshot_isolation_state is 1 when ALLOW_SNAPSHOT_ISOLATION is ON
+    return self._database_options[1] == 1
+
+
+# database options are queried once per connection wrapper when needed
+sqlserver_ado.base.DatabaseFeatures._database_options = cached_property(
+    _get_database_options, name='_database_options')
+sqlserver_ado.base.DatabaseFeatures.is_read_committed_snapshot_on = cached_property(
+    _is_read_committed_snapshot_on, name='is_read_committed_snapshot_on')
+sqlserver_ado.base.DatabaseFeatures.supports_snapshot_isolation = cached_property(
+    _supports_snapshot_isolation, name='supports_snapshot_isolation')
+
+
+def _supports_online_nonclustered_columnstore_index(self):
+    # SQL Server 2017
+    return self.connection.get_server_version()[0] >= 14
+
+
+def _supports_online_clustered_columnstore_index(self):
+    # SQL Server 2019
+    return self.connection.get_server_version()[0] >= 15
+
+
+sqlserver_ado.base.DatabaseFeatures.supports_online_nonclustered_columnstore_index = cached_property(
+    _supports_online_nonclustered_columnstore_index, name='supports_online_nonclustered_columnstore_index')
+sqlserver_ado.base.DatabaseFeatures.supports_online_clustered_columnstore_index = cached_property(
+    _supports_online_clustered_columnstore_index, name='supports_online_clustered_columnstore_index')
+
+
 #
 # monkey patch SQLCompiler class
 #
@@ -181,6 +563,125 @@ else:
     sqlserver_ado.compiler.SQLCompiler._call_base_as_sql = _call_base_as_sql_new
 sqlserver_ado.compiler.SQLCompiler.as_sql = _as_sql
 
+
+_execute_sql = sqlserver_ado.compiler.SQLCompiler.execute_sql
+
+
+def _get_batch_results(self, result_type):
+    # rows already fetched by sqlserver.batch.Batch
+    rows = self.query.__dict__.pop('_batch_rows', None)
+    if rows is None or result_type != MULTI:
+        return None
+    # sets up columns which are used to convert rows
+    self.as_sql()
+    return iter([[row[0:self.col_count] for row in rows]])
+
+
+def _execute_sql_batched_old(self, result_type=MULTI):
+    results = _get_batch_results(self, result_type)
+    if results is None:
+        return _execute_sql(self, result_type)
+    return results
+
+
+def _execute_sql_batched_new(self, result_type=MULTI, chunked_fetch=False):
+    results = _get_batch_results(self, result_type)
+    if results is None:
+        return _execute_sql(self, result_type, chunked_fetch)
+    return results
+
+
+if django.VERSION < (1, 11, 0):
+    sqlserver_ado.compiler.SQLCompiler.execute_sql = _execute_sql_batched_old
+else:
+    sqlserver_ado.compiler.SQLCompiler.execute_sql = _execute_sql_batched_new
+
+
+#
+# monkey patch SQLCompiler.results_iter to skip converters of django-mssql
+# which don't change values returned by pytds
+#
+
+# converters mapped to column types for which pytds returns values of the
+# right type, None means that converter only handles values returned by ADO
+_native_column_types = {
+    'convert_booleanfield_value': ('bit',),
+    'convert_datefield_value': ('date',),
+    'convert_datetimefield_value': None,
+    'convert_datetimeoffsetfield_value': None,
+    'convert_timefield_value': ('time',),
+    'convert_uuidfield_value': ('uniqueidentifier',),
+    'convert_textfield_value': ('nvarchar', 'nchar', 'ntext'),
+}
+
+
+def _is_noop_converter(converter, expression, connection):
+    if getattr(converter, '__self__', None) is not connection.ops:
+        return False
+    name = getattr(converter, '__name__', None)
+    if name not in _native_column_types or not isinstance(expression, Col):
+        # expressions, e.g. CASE, may return values of other types
+        return False
+    column_types = _native_column_types[name]
+    if column_types is None:
+        return True
+    db_type = expression.output_field.db_type(connection)
+    return db_type is not None and db_type.split('(')[0].lower() in column_types
+
+
+def _get_row_decoder(self, fields):
+    """
+    Returns function which converts a row fetched for ``fields``, or None
+    if rows don't need conversion.
+    """
+    connection = self.connection
+    context = self.query.context
+    steps = []
+    for i, expression in enumerate(fields):
+        if not expression:
+            continue
+        converters = [
+            converter for converter in connection.ops.get_db_converters(expression)
+            if not _is_noop_converter(converter, expression, connection)
+        ] + expression.get_db_converters(connection)
+        steps.extend((i, converter, expression) for converter in converters)
+    if not steps:
+        return None
+
+    def decode(row):
+        row = list(row)
+        for i, converter, expression in steps:
+            row[i] = converter(row[i], expression, connection, context)
+        return tuple(row)
+    return decode
+
+
+_results_iter = sqlserver_ado.compiler.SQLCompiler.results_iter
+
+
+def _results_iter_fast(self, results=None, **kwargs):
+    # kwargs are passed to execute_sql() as is, chunked_fetch argument was
+    # added to results_iter() in a Django 1.11 bugfix release
+    if not getattr(self.connection, 'fast_row_decoding', False):
+        for row in _results_iter(self, results, **kwargs):
+            yield row
+        return
+    if results is None:
+        results = self.execute_sql(MULTI, **kwargs)
+    # decoder is built once per statement
+    decode = self.get_row_decoder([s[0] for s in self.select[0:self.col_count]])
+    for rows in results:
+        if decode is None:
+            for row in rows:
+                yield row
+        else:
+            for row in rows:
+                yield decode(row)
+
+
+sqlserver_ado.compiler.SQLCompiler.get_row_decoder = _get_row_decoder
+sqlserver_ado.compiler.SQLCompiler.results_iter = _results_iter_fast
+
 #
 # monkey patch DatabaseOperations to support select_for_update
 #
@@ -193,16 +694,59 @@ def _for_update_sql(self, nowait=False, skip_locked=False):
     return "WITH ({})".format(','.join(hints))
 
 
-def _value_to_db_date(self, value):
-    if value is None:
-        return None
+sqlserver_ado.operations.DatabaseOperations.for_update_sql = _for_update_sql
+
+
+#
+# monkey patch DatabaseOperations to pass date and time values to pytds as
+# is, pytds sends them as DATE, TIME and DATETIME2(7) parameters which match
+# types of columns and don't require parsing or implicit conversions
+#
+def _adapt_datefield_value(self, value):
+    if value is None or isinstance(value, six.string_types):
+        return value
     if isinstance(value, datetime.datetime):
         value = value.date()
-    return value.isoformat()
+    return value
 
 
-sqlserver_ado.operations.DatabaseOperations.for_update_sql = _for_update_sql
-sqlserver_ado.operations.DatabaseOperations.value_to_db_date = _value_to_db_date
+def _adapt_datetimefield_value(self, value):
+    if value is None or isinstance(value, six.string_types):
+        return value
+    if timezone.is_aware(value):
+        if settings.USE_TZ:
+            value = value.astimezone(utc).replace(tzinfo=None)
+        else:
+            raise ValueError("SQL Server backend does not support timezone-aware datetimes when USE_TZ is False.")
+    return value
+
+
+def _adapt_timefield_value(self, value):
+    if value is None or isinstance(value, six.string_types):
+        return value
+    if timezone.is_aware(value):
+        raise ValueError("SQL Server backend does not support timezone-aware times.")
+    return value
+
+
+sqlserver_ado.operations.DatabaseOperations.adapt_datefield_value = _adapt_datefield_value
+sqlserver_ado.operations.DatabaseOperations.adapt_datetimefield_value = _adapt_datetimefield_value
+sqlserver_ado.operations.DatabaseOperations.adapt_timefield_value = _adapt_timefield_value
+# used by django-mssql for lookups and its own date and time fields
+sqlserver_ado.operations.DatabaseOperations.value_to_db_date = _adapt_datefield_value
+sqlserver_ado.operations.DatabaseOperations._new_value_to_db_datetime = _adapt_datetimefield_value
+sqlserver_ado.operations.DatabaseOperations._new_value_to_db_time = _adapt_timefield_value
+
+
+#
+# monkey patch Count aggregate to use COUNT_BIG, COUNT returns int
+# which overflows on tables with more than 2^31-1 rows
+#
+def _count_as_microsoft(self, compiler, connection):
+    return self.as_sql(compiler, connection, function='COUNT_BIG')
+
+
+django.db.models.aggregates.Count.as_microsoft = _count_as_microsoft
 
 
 # monkey patch adoConn property onto connection class which is expected by django-mssql
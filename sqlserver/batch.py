@@ -0,0 +1,93 @@
+"""Execution of multiple querysets in a single round trip."""
+from __future__ import absolute_import, unicode_literals
+
+import django
+
+if django.VERSION >= (1, 11, 0):
+    from django.core.exceptions import EmptyResultSet
+else:
+    from django.db.models.sql.datastructures import EmptyResultSet
+
+
+class Batch(object):
+    """
+    Collects querysets and executes them as a single batch of statements
+    when the ``with`` block exits, each queryset is then populated from its
+    own result set::
+
+        with connection.batch() as batch:
+            authors = batch.add(Author.objects.all())
+            books = batch.add(Book.objects.filter(published=True))
+        # both querysets are evaluated here
+        list(authors)
+
+    Querysets are split between several batches only when they have more
+    parameters than a single statement allows.
+    """
+    # SQL Server allows at most 2100 parameters in a statement
+    max_query_params = 2000
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.querysets = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.execute()
+        else:
+            self.querysets = []
+
+    def add(self, queryset):
+        """
+        Adds queryset to the batch and returns its copy which is evaluated
+        when the batch is executed.
+        """
+        if queryset.db != self.connection.alias:
+            raise ValueError(
+                "Queryset uses database '%s', batch uses '%s'." % (queryset.db, self.connection.alias))
+        queryset = queryset._clone()
+        self.querysets.append(queryset)
+        return queryset
+
+    def _get_statements(self, querysets):
+        statements = []
+        for queryset in querysets:
+            compiler = queryset.query.get_compiler(using=self.connection.alias)
+            try:
+                sql, params = compiler.as_sql()
+            except EmptyResultSet:
+                # evaluated without a query
+                continue
+            statements.append((queryset, sql, list(params)))
+        return statements
+
+    def _split(self, statements):
+        batch, batch_params = [], 0
+        for statement in statements:
+            if batch and batch_params + len(statement[2]) > self.max_query_params:
+                yield batch
+                batch, batch_params = [], 0
+            batch.append(statement)
+            batch_params += len(statement[2])
+        if batch:
+            yield batch
+
+    def execute(self):
+        """Executes querysets added to the batch."""
+        querysets, self.querysets = self.querysets, []
+        with self.connection.cursor() as cursor:
+            for batch in self._split(self._get_statements(querysets)):
+                cursor.execute(
+                    ';\n'.join(sql for queryset, sql, params in batch),
+                    [param for queryset, sql, params in batch for param in params],
+                )
+                for i, (queryset, sql, params) in enumerate(batch):
+                    if i:
+                        cursor.nextset()
+                    # consumed by SQLCompiler.execute_sql
+                    queryset.query._batch_rows = cursor.fetchall()
+        for queryset in querysets:
+            queryset._fetch_all()
@@ -0,0 +1,271 @@
+"""
+Database cache backend optimized for SQL Server.
+
+Uses the same table as Django's database cache backend, so the table is
+created by createcachetable command.
+"""
+from __future__ import absolute_import, unicode_literals
+import base64
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache.backends import db
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.db import DatabaseError, connections, router, transaction
+from django.utils import six
+from django.utils.encoding import force_bytes
+
+try:
+    from django.utils.six.moves import cPickle as pickle
+except ImportError:
+    import pickle
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class DatabaseCache(db.DatabaseCache):
+    """
+    Database cache which sets an entry with a single MERGE statement, gets
+    and sets multiple entries with one statement per batch, and deletes
+    expired entries periodically in batches instead of counting the table
+    on every set.
+
+    Additional OPTIONS:
+     * CULL_INTERVAL: minimal number of seconds between culls, default 60
+     * CULL_BATCH_SIZE: maximal number of rows deleted by one statement,
+       default 1000
+     * MEMORY_OPTIMIZED: store entries in memory-optimized table, default False
+     * DURABILITY: durability of memory-optimized table, 'schema_and_data'
+       (default) or 'schema_only'
+     * BUCKET_COUNT: bucket count of the hash index of memory-optimized
+       table, default 1000000
+    """
+    # SQL Server allows at most 2100 parameters in a statement
+    max_query_params = 2000
+
+    def __init__(self, table, params):
+        super(DatabaseCache, self).__init__(table, params)
+        options = params.get('OPTIONS', {})
+        self._cull_interval = int(options.get('CULL_INTERVAL', 60))
+        self._cull_batch_size = int(options.get('CULL_BATCH_SIZE', 1000))
+        self._memory_optimized = bool(options.get('MEMORY_OPTIMIZED', False))
+        self._durability = options.get('DURABILITY')
+        self._bucket_count = int(options.get('BUCKET_COUNT', 1000000))
+        self._last_cull = 0
+
+    def _now(self):
+        # expiration times are stored in the same way as by Django's backend
+        now = datetime.utcnow() if settings.USE_TZ else datetime.now()
+        return now.replace(microsecond=0)
+
+    def _expires(self, timeout):
+        if timeout is None:
+            expires = datetime.max
+        elif settings.USE_TZ:
+            expires = datetime.utcfromtimestamp(timeout)
+        else:
+            expires = datetime.fromtimestamp(timeout)
+        return expires.replace(microsecond=0)
+
+    def _encode(self, value):
+        b64encoded = base64.b64encode(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        if six.PY3:
+            b64encoded = b64encoded.decode('latin1')
+        return b64encoded
+
+    def _decode(self, connection, value):
+        value = connection.ops.process_clob(value)
+        return pickle.loads(base64.b64decode(force_bytes(value)))
+
+    def _execute_write(self, connection, cursor, sql, params=None):
+        # a single statement is atomic on its own, savepoint is only needed
+        # to keep enclosing transaction usable if the statement fails
+        if connection.in_atomic_block:
+            with transaction.atomic(using=connection.alias):
+                cursor.execute(sql, params)
+        else:
+            cursor.execute(sql, params)
+
+    def _merge_sql(self, connection, rows, mode='set'):
+        """
+        Returns MERGE statement which sets ``rows`` entries, parameters are
+        cache_key, value, expires for each row followed by current time for
+        'add' mode.
+        """
+        return (
+            'MERGE %(table)s%(hint)s AS t '
+            'USING (VALUES %(values)s) AS s (cache_key, value, expires) '
+            'ON t.cache_key = s.cache_key '
+            'WHEN MATCHED%(matched)s THEN UPDATE SET value = s.value, expires = s.expires '
+            'WHEN NOT MATCHED THEN INSERT (cache_key, value, expires) '
+            'VALUES (s.cache_key, s.value, s.expires);'
+        ) % {
+            'table': connection.ops.quote_name(self._table),
+            # prevents concurrent inserts of the same key, memory-optimized
+            # tables detect such conflicts on their own
+            'hint': '' if self._memory_optimized else ' WITH (HOLDLOCK)',
+            'values': ', '.join(['(%s, %s, %s)'] * rows),
+            'matched': ' AND t.expires < %s' if mode == 'add' else '',
+        }
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        connection = connections[router.db_for_read(self.cache_model_class)]
+        table = connection.ops.quote_name(self._table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT value FROM %s WHERE cache_key = %%s AND expires > %%s' % table,
+                [key, connection.ops.adapt_datetimefield_value(self._now())],
+            )
+            row = cursor.fetchone()
+        if row is None:
+            return default
+        return self._decode(connection, row[0])
+
+    def get_many(self, keys, version=None):
+        key_map = dict((self.make_key(key, version=version), key) for key in keys)
+        for key in key_map:
+            self.validate_key(key)
+        connection = connections[router.db_for_read(self.cache_model_class)]
+        table = connection.ops.quote_name(self._table)
+        now = connection.ops.adapt_datetimefield_value(self._now())
+        result = {}
+        with connection.cursor() as cursor:
+            for chunk in _chunks(list(key_map), self.max_query_params - 1):
+                cursor.execute(
+                    'SELECT cache_key, value FROM %s WHERE cache_key IN (%s) AND expires > %%s' % (
+                        table, ', '.join(['%s'] * len(chunk))),
+                    chunk + [now],
+                )
+                for cache_key, value in cursor.fetchall():
+                    result[key_map[cache_key]] = self._decode(connection, value)
+        return result
+
+    def _base_set(self, mode, key, value, timeout=DEFAULT_TIMEOUT):
+        expires = self._expires(self.get_backend_timeout(timeout))
+        connection = connections[router.db_for_write(self.cache_model_class)]
+        params = [key, self._encode(value), connection.ops.adapt_datetimefield_value(expires)]
+        if mode == 'add':
+            params.append(connection.ops.adapt_datetimefield_value(self._now()))
+        with connection.cursor() as cursor:
+            self._maybe_cull(connection, cursor)
+            try:
+                self._execute_write(connection, cursor, self._merge_sql(connection, 1, mode), params)
+            except DatabaseError:
+                # To be threadsafe, updates/inserts are allowed to fail silently
+                return False
+            return mode == 'set' or cursor.rowcount > 0
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        connection = connections[router.db_for_write(self.cache_model_class)]
+        expires = connection.ops.adapt_datetimefield_value(self._expires(self.get_backend_timeout(timeout)))
+        rows = []
+        for key, value in data.items():
+            key = self.make_key(key, version=version)
+            self.validate_key(key)
+            rows.append([key, self._encode(value), expires])
+        with connection.cursor() as cursor:
+            self._maybe_cull(connection, cursor)
+            for chunk in _chunks(rows, self.max_query_params // 3):
+                try:
+                    self._execute_write(
+                        connection, cursor,
+                        self._merge_sql(connection, len(chunk)),
+                        [param for row in chunk for param in row],
+                    )
+                except DatabaseError:
+                    pass
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_key(key, version=version) for key in keys]
+        for key in keys:
+            self.validate_key(key)
+        connection = connections[router.db_for_write(self.cache_model_class)]
+        table = connection.ops.quote_name(self._table)
+        with connection.cursor() as cursor:
+            for chunk in _chunks(keys, self.max_query_params):
+                cursor.execute(
+                    'DELETE FROM %s WHERE cache_key IN (%s)' % (table, ', '.join(['%s'] * len(chunk))),
+                    chunk,
+                )
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        connection = connections[router.db_for_read(self.cache_model_class)]
+        table = connection.ops.quote_name(self._table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT 1 FROM %s WHERE cache_key = %%s AND expires > %%s' % table,
+                [key, connection.ops.adapt_datetimefield_value(self._now())],
+            )
+            return cursor.fetchone() is not None
+
+    def _maybe_cull(self, connection, cursor):
+        now = time.time()
+        if now - self._last_cull < self._cull_interval:
+            return
+        self._last_cull = now
+        self._cull(connection.alias, cursor, self._now())
+
+    def _count(self, connection, cursor):
+        if self._memory_optimized:
+            # partition statistics don't have row counts of memory-optimized tables
+            cursor.execute('SELECT COUNT_BIG(*) FROM %s' % connection.ops.quote_name(self._table))
+            return cursor.fetchone()[0]
+        return connection.introspection.get_table_row_count(cursor, self._table) or 0
+
+    def _cull(self, db, cursor, now):
+        if self._cull_frequency == 0:
+            self.clear()
+            return
+        connection = connections[db]
+        table = connection.ops.quote_name(self._table)
+        # short batches keep locks short and don't escalate to table locks
+        batch_size = self._cull_batch_size
+        while True:
+            self._execute_write(
+                connection, cursor,
+                'DELETE TOP (%d) FROM %s WHERE expires < %%s' % (batch_size, table),
+                [connection.ops.adapt_datetimefield_value(now)],
+            )
+            if cursor.rowcount < batch_size:
+                break
+        num = self._count(connection, cursor)
+        if num > self._max_entries:
+            # entries which expire first are culled
+            remaining = num // self._cull_frequency
+            while remaining > 0:
+                size = min(remaining, batch_size)
+                self._execute_write(
+                    connection, cursor,
+                    'WITH oldest AS (SELECT TOP (%d) cache_key FROM %s ORDER BY expires) '
+                    'DELETE FROM oldest' % (size, table),
+                )
+                if cursor.rowcount < size:
+                    break
+                remaining -= size
+
+    def create_memory_optimized_table_sql(self, connection):
+        """
+        Returns statement which creates memory-optimized table for this cache.
+        """
+        quote_name = connection.ops.quote_name
+        return (
+            'CREATE TABLE %(table)s ('
+            '[cache_key] nvarchar(255) NOT NULL PRIMARY KEY NONCLUSTERED HASH WITH (BUCKET_COUNT = %(bucket_count)d), '
+            '[value] nvarchar(max) NOT NULL, '
+            '[expires] datetime2 NOT NULL, '
+            'INDEX %(index)s NONCLUSTERED ([expires])'
+            ') WITH (MEMORY_OPTIMIZED = ON, DURABILITY = %(durability)s)'
+        ) % {
+            'table': quote_name(self._table),
+            'bucket_count': self._bucket_count,
+            'index': quote_name('%s_expires' % self._table),
+            'durability': (self._durability or 'schema_and_data').upper(),
+        }
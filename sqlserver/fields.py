@@ -0,0 +1,39 @@
+"""Model fields for SQL Server specific column types."""
+from __future__ import absolute_import, unicode_literals
+import datetime
+
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+import pytds
+import pytds.tds
+
+
+class DateTimeOffsetField(models.DateTimeField):
+    """
+    DateTimeField stored in DATETIMEOFFSET(7) column.
+
+    Aware datetimes are stored with their offset and are read back with the
+    same offset, without conversion to UTC in Python.
+    """
+    def db_type(self, connection):
+        if connection.vendor == 'microsoft':
+            return 'datetimeoffset(7)'
+        return super(DateTimeOffsetField, self).db_type(connection)
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if not prepared:
+            value = self.get_prep_value(value)
+        if (connection.vendor != 'microsoft' or not isinstance(value, datetime.datetime) or
+                not timezone.is_aware(value)):
+            return connection.ops.adapt_datetimefield_value(value)
+        # pytds sends aware datetimes as DATETIME2 in UTC when connection
+        # uses time zones, type of the parameter is specified explicitly,
+        # python-tds is pinned below 1.9 which moved types to tds_types
+        return pytds.Column(type=pytds.tds.DateTimeOffset(7), value=value)
+
+    def from_db_value(self, value, expression, connection, context):
+        if value is not None and not settings.USE_TZ and timezone.is_aware(value):
+            value = timezone.make_naive(value)
+        return value
@@ -0,0 +1,20 @@
+"""Database functions specific to SQL Server."""
+from __future__ import absolute_import, unicode_literals
+
+from django.db.models import Func, Value
+
+from .fields import DateTimeOffsetField
+
+
+class AtTimeZone(Func):
+    """
+    Converts datetime expression to the time zone given by its Windows name,
+    e.g. ``AtTimeZone('created', 'Pacific Standard Time')``, the result is
+    a datetimeoffset value. Requires SQL Server 2016 or newer.
+    """
+    arg_joiner = ' AT TIME ZONE '
+    template = '(%(expressions)s)'
+
+    def __init__(self, expression, zone, **extra):
+        extra.setdefault('output_field', DateTimeOffsetField())
+        super(AtTimeZone, self).__init__(expression, Value(zone), **extra)
@@ -0,0 +1,270 @@
+from __future__ import absolute_import, unicode_literals
+
+from django.db import models
+from django.db.models.sql import Query
+
+__all__ = [str('ColumnstoreIndex'), str('HashIndex'), str('Index'), str('Q'), str('UniqueIndex')]
+
+
+def _get_extra_sql(index, model, schema_editor):
+    """
+    Returns index build options and tablespace clauses for the given index.
+    """
+    fields = [model._meta.get_field(field_name) for field_name, order in index.fields_orders]
+    return schema_editor._get_index_tablespace_sql(model, fields, index=index)
+
+
+class Q(models.Q):
+    """
+    Q object which can be serialized into migrations and compared, used for
+    index conditions.
+    """
+    def __init__(self, *args, **kwargs):
+        connector = kwargs.pop('_connector', None)
+        negated = kwargs.pop('_negated', False)
+        super(Q, self).__init__(*(args + tuple(sorted(kwargs.items()))))
+        if connector is not None:
+            self.connector = connector
+        self.negated = negated
+
+    @classmethod
+    def from_q(cls, q):
+        """
+        Returns copy of the given Q object which is an instance of this class.
+        """
+        if isinstance(q, cls):
+            return q
+        obj = cls()
+        obj.connector = q.connector
+        obj.negated = q.negated
+        obj.children = [cls.from_q(child) if isinstance(child, models.Q) else tuple(child) for child in q.children]
+        return obj
+
+    def deconstruct(self):
+        path = '%s.%s' % (self.__class__.__module__, self.__class__.__name__)
+        args, kwargs = (), {}
+        if len(self.children) == 1 and not isinstance(self.children[0], models.Q):
+            child = self.children[0]
+            kwargs = {child[0]: child[1]}
+        else:
+            args = tuple(self.children)
+            if self.connector != self.default:
+                kwargs = {'_connector': self.connector}
+        if self.negated:
+            kwargs['_negated'] = True
+        return path, args, kwargs
+
+    def __eq__(self, other):
+        return isinstance(other, models.Q) and self.deconstruct() == Q.from_q(other).deconstruct()
+
+    def __ne__(self, other):
+        return not (self == other)
+
+    __hash__ = None
+
+
+class Index(models.Index):
+    """
+    Index which can be limited to rows matching a condition (filtered index)
+    and can store additional non-key columns (covering index).
+
+    ``condition`` is a Q object which can only reference columns of the
+    model's own table. ``include`` is a list of names of fields which are
+    stored in the leaf level of the index, so queries which only read these
+    fields don't need key lookups into the table.
+
+    ``online``, ``resumable``, ``maxdop`` and ``sort_in_tempdb`` are index
+    build options, when not given options from ``index_options`` of the
+    database settings are used. ``data_compression`` is 'none', 'row' or
+    'page'.
+    """
+    def __init__(self, fields=[], name=None, condition=None, include=None,
+                 online=None, resumable=None, maxdop=None, sort_in_tempdb=None,
+                 data_compression=None):
+        if condition is not None and not isinstance(condition, models.Q):
+            raise ValueError('Index.condition must be a Q instance.')
+        if data_compression not in (None, 'none', 'row', 'page'):
+            raise ValueError("Index.data_compression must be 'none', 'row' or 'page'.")
+        if include is not None and not isinstance(include, (list, tuple)):
+            raise ValueError('Index.include must be a list or tuple.')
+        self.condition = Q.from_q(condition) if condition is not None else None
+        self.include = list(include) if include else []
+        self.online = online
+        self.resumable = resumable
+        self.maxdop = maxdop
+        self.sort_in_tempdb = sort_in_tempdb
+        self.data_compression = data_compression
+        super(Index, self).__init__(fields, name)
+        if set(self.include) & set(field_name for field_name, order in self.fields_orders):
+            raise ValueError('Index.include can not contain key fields.')
+
+    def __repr__(self):
+        extra = ''
+        if self.include:
+            extra += ", include='%s'" % ', '.join(self.include)
+        if self.condition is not None:
+            extra += ', condition=%s' % self.condition
+        return "<%s: fields='%s'%s>" % (self.__class__.__name__, ', '.join(self.fields), extra)
+
+    def deconstruct(self):
+        path, args, kwargs = super(Index, self).deconstruct()
+        if self.condition is not None:
+            kwargs['condition'] = self.condition
+        if self.include:
+            kwargs['include'] = self.include
+        for option in ('online', 'resumable', 'maxdop', 'sort_in_tempdb', 'data_compression'):
+            if getattr(self, option) is not None:
+                kwargs[option] = getattr(self, option)
+        return path, args, kwargs
+
+    def _get_condition_sql(self, model, schema_editor):
+        connection = schema_editor.connection
+        query = Query(model)
+        where, _ = query._add_q(self.condition, used_aliases=set(), allow_joins=False)
+        compiler = query.get_compiler(connection=connection)
+        sql, params = where.as_sql(compiler, connection)
+        # filtered index predicate can't have qualified column names
+        sql = sql.replace('%s.' % schema_editor.quote_name(model._meta.db_table), '')
+        return sql % tuple(schema_editor.quote_value(param) for param in params)
+
+    def _get_include_sql(self, model, schema_editor):
+        return ', '.join(
+            schema_editor.quote_name(model._meta.get_field(field_name).column)
+            for field_name in self.include
+        )
+
+    def get_sql_create_template_values(self, model, schema_editor, using):
+        with schema_editor._building_index(model, self):
+            parameters = super(Index, self).get_sql_create_template_values(model, schema_editor, using)
+            extra = ''
+            if self.include:
+                extra += ' INCLUDE (%s)' % self._get_include_sql(model, schema_editor)
+            if self.condition is not None:
+                extra += ' WHERE %s' % self._get_condition_sql(model, schema_editor)
+            parameters['extra'] = extra + _get_extra_sql(self, model, schema_editor)
+        return parameters
+
+
+class UniqueIndex(Index):
+    """
+    Unique index, with a condition it enforces uniqueness only among rows
+    which match the condition, e.g. ``condition=Q(code__isnull=False)``
+    allows multiple NULLs in a unique column. Included fields are not part
+    of the unique key.
+    """
+    suffix = 'unq'
+
+    def create_sql(self, model, schema_editor, using=''):
+        sql_parameters = self.get_sql_create_template_values(model, schema_editor, using)
+        return schema_editor.sql_create_unique_index % sql_parameters
+
+
+class ColumnstoreIndex(models.Index):
+    """
+    Columnstore index, stores data by columns instead of rows which makes
+    scans and aggregations over large tables much cheaper.
+
+    Clustered columnstore index stores the whole table and does not accept
+    fields, nonclustered columnstore index stores only given fields.
+
+    ``data_compression`` is 'columnstore' or 'columnstore_archive', clustered
+    index defaults to ``data_compression`` of the model's Meta.
+    """
+    suffix = 'csi'
+    # build options which columnstore indexes don't support
+    resumable = False
+    sort_in_tempdb = False
+
+    def __init__(self, fields=[], name=None, clustered=False, data_compression=None):
+        if data_compression not in (None, 'columnstore', 'columnstore_archive'):
+            raise ValueError(
+                "ColumnstoreIndex.data_compression must be 'columnstore' or 'columnstore_archive'.")
+        self.clustered = clustered
+        self.data_compression = data_compression
+        if clustered:
+            if fields:
+                raise ValueError('Clustered columnstore index can not have fields.')
+            # clustered columnstore index always covers all columns of the table,
+            # base class does not allow indexes without fields
+            self.fields = []
+            self.fields_orders = []
+            self.name = name or ''
+            if self.name:
+                errors = self.check_name()
+                if len(self.name) > self.max_name_length:
+                    errors.append('Index names cannot be longer than %s characters.' % self.max_name_length)
+                if errors:
+                    raise ValueError(errors)
+        else:
+            super(ColumnstoreIndex, self).__init__(fields, name)
+            if any(order for field_name, order in self.fields_orders):
+                raise ValueError('Columnstore index fields can not have ordering.')
+
+    def __repr__(self):
+        if self.clustered:
+            return '<%s: clustered>' % self.__class__.__name__
+        return super(ColumnstoreIndex, self).__repr__()
+
+    def deconstruct(self):
+        path, args, kwargs = super(ColumnstoreIndex, self).deconstruct()
+        if self.clustered:
+            del kwargs['fields']
+            kwargs['clustered'] = True
+        if self.data_compression is not None:
+            kwargs['data_compression'] = self.data_compression
+        return path, args, kwargs
+
+    def get_sql_create_template_values(self, model, schema_editor, using):
+        with schema_editor._building_index(model, self):
+            parameters = super(ColumnstoreIndex, self).get_sql_create_template_values(model, schema_editor, using)
+            parameters['extra'] = _get_extra_sql(self, model, schema_editor)
+        return parameters
+
+    def create_sql(self, model, schema_editor, using=''):
+        sql_parameters = self.get_sql_create_template_values(model, schema_editor, using)
+        if self.clustered:
+            return schema_editor.sql_create_clustered_columnstore_index % sql_parameters
+        return schema_editor.sql_create_columnstore_index % sql_parameters
+
+    def set_name_with_model(self, model):
+        if not self.clustered:
+            return super(ColumnstoreIndex, self).set_name_with_model(model)
+        # table name without schema, db_table can be '"schema"."table"'
+        table_name = model._meta.db_table.split('"."')[-1].strip('"')
+        self.name = '%s_%s_%s' % (
+            table_name[:19],
+            self._hash_generator(table_name, self.suffix),
+            self.suffix,
+        )
+        self.check_name()
+
+
+class HashIndex(models.Index):
+    """
+    Hash index of a memory-optimized table, it is used for lookups by
+    equality on all of its fields. ``bucket_count`` should be one to two
+    times the number of distinct keys.
+
+    Regular indexes of memory-optimized table are range indexes.
+    """
+    suffix = 'hsh'
+
+    def __init__(self, fields=[], name=None, bucket_count=None):
+        if not bucket_count:
+            raise ValueError('HashIndex.bucket_count is required.')
+        self.bucket_count = bucket_count
+        super(HashIndex, self).__init__(fields, name)
+        if any(order for field_name, order in self.fields_orders):
+            raise ValueError('Hash index fields can not have ordering.')
+
+    def deconstruct(self):
+        path, args, kwargs = super(HashIndex, self).deconstruct()
+        kwargs['bucket_count'] = self.bucket_count
+        return path, args, kwargs
+
+    def create_sql(self, model, schema_editor, using=''):
+        # hash index can only exist on memory-optimized table
+        return schema_editor._add_memory_optimized_index_sql(model, self)
+
+    def remove_sql(self, model, schema_editor):
+        return schema_editor._delete_constraint_sql(schema_editor.sql_delete_memory_optimized_index, model, self.name)
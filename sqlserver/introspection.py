@@ -0,0 +1,197 @@
+from __future__ import absolute_import, unicode_literals
+
+import sqlserver_ado.introspection
+
+# values of sys.indexes.type column
+INDEX_TYPE_CLUSTERED_COLUMNSTORE = 5
+INDEX_TYPE_NONCLUSTERED_COLUMNSTORE = 6
+INDEX_TYPE_NONCLUSTERED_HASH = 7
+
+# values of 'type' of indexes returned by get_constraints(), they are
+# suffixes of Index, ColumnstoreIndex and HashIndex classes, which are
+# not imported because they require Django 1.11
+INDEX_SUFFIX = 'idx'
+COLUMNSTORE_INDEX_SUFFIX = 'csi'
+HASH_INDEX_SUFFIX = 'hsh'
+
+
+class DatabaseIntrospection(sqlserver_ado.introspection.DatabaseIntrospection):
+    def get_table_row_count(self, cursor, table_name):
+        """
+        Returns number of rows in the table as recorded in partition metadata,
+        or None if table has no partitions (e.g. it is a view).
+
+        This does not scan the table, but the number is only approximate while
+        there are uncommitted or in-flight modifications.
+        """
+        cursor.execute("""
+SELECT SUM(p.rows)
+FROM sys.partitions p
+WHERE p.object_id = OBJECT_ID(%s) AND p.index_id IN (0, 1)
+""", [table_name])
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    def get_data_compression(self, cursor, table_name):
+        """
+        Returns data compression of the table (its heap or clustered index),
+        one of 'none', 'row', 'page', 'columnstore', 'columnstore_archive',
+        or None if table does not exist.
+        """
+        cursor.execute("""
+SELECT LOWER(p.data_compression_desc)
+FROM sys.partitions p
+WHERE p.object_id = OBJECT_ID(%s) AND p.index_id IN (0, 1) AND p.partition_number = 1
+""", [table_name])
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    def get_partitioning(self, cursor, table_name):
+        """
+        Returns dict with names of partition scheme, partition function and
+        partitioning column of the table, or None if table is not partitioned.
+        """
+        cursor.execute("""
+SELECT ps.name, pf.name, c.name
+FROM sys.indexes i
+JOIN sys.partition_schemes ps ON ps.data_space_id = i.data_space_id
+JOIN sys.partition_functions pf ON pf.function_id = ps.function_id
+JOIN sys.index_columns ic ON ic.object_id = i.object_id AND ic.index_id = i.index_id AND ic.partition_ordinal = 1
+JOIN sys.columns c ON c.object_id = ic.object_id AND c.column_id = ic.column_id
+WHERE i.object_id = OBJECT_ID(%s) AND i.index_id IN (0, 1)
+""", [table_name])
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        return {'scheme': row[0], 'function': row[1], 'column': row[2]}
+
+    def get_durability(self, cursor, table_name):
+        """
+        Returns durability of memory-optimized table, 'schema_and_data' or
+        'schema_only', or None if table is not memory-optimized.
+        """
+        # OBJECTPROPERTY returns NULL instead of failing on versions
+        # without In-Memory OLTP
+        cursor.execute("SELECT OBJECTPROPERTY(OBJECT_ID(%s), 'TableIsMemoryOptimized')", [table_name])
+        if not cursor.fetchone()[0]:
+            return None
+        cursor.execute("SELECT LOWER(durability_desc) FROM sys.tables WHERE object_id = OBJECT_ID(%s)", [table_name])
+        return cursor.fetchone()[0]
+
+    def get_referencing_tables(self, cursor, table_name):
+        """
+        Returns names of tables which have foreign keys referencing the given
+        table, including the table itself for self-referencing keys.
+        """
+        cursor.execute("""
+SELECT DISTINCT OBJECT_NAME(fk.parent_object_id)
+FROM sys.foreign_keys fk
+WHERE fk.referenced_object_id = OBJECT_ID(%s)
+""", [table_name])
+        return [row[0] for row in cursor.fetchall()]
+
+    def get_constraints(self, cursor, table_name):
+        """
+        Retrieves any constraints or keys (unique, pk, fk, check, index)
+        across one or more columns.
+
+        In addition to keys documented by Django, index entries have:
+         * type: suffix of the Index class which creates such index
+         * orders: list of 'ASC'/'DESC' for key columns
+         * include: list of non-key columns stored in the index
+         * condition: predicate of a filtered index, or None
+         * data_compression: compression of the index, e.g. 'none' or 'page'
+         * bucket_count: number of buckets of a hash index, or None
+        """
+        constraints = {}
+
+        cursor.execute("""
+SELECT i.name, i.type, i.is_unique, i.is_primary_key, i.filter_definition,
+       LOWER(p.data_compression_desc), c.name, ic.is_descending_key, ic.is_included_column
+FROM sys.indexes i
+LEFT JOIN sys.partitions p ON p.object_id = i.object_id AND p.index_id = i.index_id AND p.partition_number = 1
+LEFT JOIN sys.index_columns ic ON ic.object_id = i.object_id AND ic.index_id = i.index_id
+LEFT JOIN sys.columns c ON c.object_id = ic.object_id AND c.column_id = ic.column_id
+WHERE i.object_id = OBJECT_ID(%s) AND i.name IS NOT NULL
+ORDER BY i.index_id, ic.is_included_column, ic.key_ordinal, ic.index_column_id
+""", [table_name])
+        for row in cursor.fetchall():
+            name, type_, unique, primary_key, condition, data_compression, column, descending, included = row
+            if name not in constraints:
+                if type_ in (INDEX_TYPE_CLUSTERED_COLUMNSTORE, INDEX_TYPE_NONCLUSTERED_COLUMNSTORE):
+                    index_type = COLUMNSTORE_INDEX_SUFFIX
+                elif type_ == INDEX_TYPE_NONCLUSTERED_HASH:
+                    index_type = HASH_INDEX_SUFFIX
+                else:
+                    index_type = INDEX_SUFFIX
+                constraints[name] = {
+                    'columns': [],
+                    'orders': [],
+                    'include': [],
+                    'primary_key': bool(primary_key),
+                    'unique': bool(unique),
+                    'index': True,
+                    'check': False,
+                    'foreign_key': None,
+                    'type': index_type,
+                    'condition': condition,
+                    'data_compression': data_compression,
+                    'bucket_count': None,
+                }
+            # clustered columnstore index stores all columns, but it
+            # does not have key columns
+            if column is None or type_ == INDEX_TYPE_CLUSTERED_COLUMNSTORE:
+                continue
+            # columns of nonclustered columnstore index are all reported
+            # as included, but they are the columns given to CREATE INDEX
+            if included and type_ != INDEX_TYPE_NONCLUSTERED_COLUMNSTORE:
+                constraints[name]['include'].append(column)
+            else:
+                constraints[name]['columns'].append(column)
+                constraints[name]['orders'].append('DESC' if descending else 'ASC')
+
+        if any(info['type'] == HASH_INDEX_SUFFIX for info in constraints.values()):
+            cursor.execute(
+                "SELECT name, bucket_count FROM sys.hash_indexes WHERE object_id = OBJECT_ID(%s)", [table_name])
+            for name, bucket_count in cursor.fetchall():
+                constraints[name]['bucket_count'] = bucket_count
+
+        cursor.execute("""
+SELECT fk.name, pc.name, rt.name, rc.name
+FROM sys.foreign_keys fk
+JOIN sys.tables rt ON rt.object_id = fk.referenced_object_id
+JOIN sys.foreign_key_columns fkc ON fkc.constraint_object_id = fk.object_id
+JOIN sys.columns pc ON pc.object_id = fkc.parent_object_id AND pc.column_id = fkc.parent_column_id
+JOIN sys.columns rc ON rc.object_id = fkc.referenced_object_id AND rc.column_id = fkc.referenced_column_id
+WHERE fk.parent_object_id = OBJECT_ID(%s)
+ORDER BY fk.name, fkc.constraint_column_id
+""", [table_name])
+        for name, column, ref_table, ref_column in cursor.fetchall():
+            if name not in constraints:
+                constraints[name] = {
+                    'columns': [],
+                    'primary_key': False,
+                    'unique': False,
+                    'index': False,
+                    'check': False,
+                    'foreign_key': (ref_table, ref_column),
+                }
+            constraints[name]['columns'].append(column)
+
+        cursor.execute("""
+SELECT cc.name, c.name
+FROM sys.check_constraints cc
+LEFT JOIN sys.columns c ON c.object_id = cc.parent_object_id AND c.column_id = cc.parent_column_id
+WHERE cc.parent_object_id = OBJECT_ID(%s)
+""", [table_name])
+        for name, column in cursor.fetchall():
+            constraints[name] = {
+                'columns': [column] if column is not None else [],
+                'primary_key': False,
+                'unique': False,
+                'index': False,
+                'check': True,
+                'foreign_key': None,
+            }
+
+        return constraints
@@ -0,0 +1,266 @@
+from __future__ import absolute_import, unicode_literals
+import time
+
+from django.apps import apps
+from django.core.exceptions import FieldDoesNotExist
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+# name of extended property of the shadow column which keeps the last
+# backfilled primary key value
+PROGRESS_PROPERTY = 'django_sqlserver_backfill'
+
+
+class Command(BaseCommand):
+    help = (
+        "Converts DATETIME column to DATETIME2(6) without locking the table "
+        "for the duration of the conversion: adds a shadow column kept in sync "
+        "by a trigger, backfills it in short batches and swaps the columns. "
+        "Interrupted conversion is resumed by running the command again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', help='Model as app_label.ModelName.')
+        parser.add_argument('field', help='Name of the DateTimeField stored in DATETIME column.')
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='Nominates a database. Defaults to the "default" database.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=4000,
+            help='Number of rows updated by one statement, default 4000 stays below the lock escalation threshold.',
+        )
+        parser.add_argument(
+            '--sleep', type=float, default=0,
+            help='Number of seconds to wait between batches.',
+        )
+        parser.add_argument(
+            '--no-swap', action='store_false', dest='swap',
+            help="Stops after backfill, so that columns are swapped by another run, e.g. in maintenance window.",
+        )
+
+    def handle(self, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'microsoft':
+            raise CommandError('Database %s is not a SQL Server database.' % options['database'])
+        try:
+            model = apps.get_model(options['model'])
+            field = model._meta.get_field(options['field'])
+        except (LookupError, ValueError, FieldDoesNotExist) as e:
+            raise CommandError(str(e))
+        if model._meta.pk.column == field.column:
+            raise CommandError('Primary key column can not be converted.')
+        self.verbosity = options['verbosity']
+        self.connection = connection
+        self.table = model._meta.db_table
+        self.column = field.column
+        self.shadow = '%s_dt2' % field.column
+        self.trigger = '%s_%s_dt2_sync' % (self.table, field.column)
+        self.not_null_constraint = '%s_%s_not_null' % (self.table, field.column)
+        self.pk = model._meta.pk.column
+        with connection.cursor() as cursor:
+            data_type = self.get_data_type(cursor, self.column)
+            if data_type is None:
+                raise CommandError('Column %s does not exist in table %s.' % (self.column, self.table))
+            if data_type != 'datetime':
+                if data_type == 'datetime2' and self.get_data_type(cursor, self.shadow) is None:
+                    self.log('Column %s of table %s is already converted.' % (self.column, self.table))
+                    return
+                raise CommandError('Column %s of table %s is %s, not datetime.' % (self.column, self.table, data_type))
+            if self.get_data_type(cursor, self.shadow) is None:
+                self.add_shadow_column(cursor)
+            self.backfill(cursor, options['batch_size'], options['sleep'])
+            if options['swap']:
+                self.swap(cursor)
+
+    def log(self, message, level=1):
+        if self.verbosity >= level:
+            self.stdout.write(message)
+
+    def get_data_type(self, cursor, column):
+        cursor.execute(
+            "SELECT TYPE_NAME(system_type_id) FROM sys.columns WHERE object_id = OBJECT_ID(%s) AND name = %s",
+            [self.table, column],
+        )
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    def extended_property_sql(self, procedure):
+        """
+        Returns statement which executes extended property procedure for the
+        shadow column, parameters are schema name and, except for
+        sp_dropextendedproperty, the value.
+        """
+        return (
+            "EXEC sys.%(procedure)s @name = N'%(name)s',%(value)s "
+            "@level0type = N'SCHEMA', @level0name = %%s, @level1type = N'TABLE', @level1name = N'%(table)s', "
+            "@level2type = N'COLUMN', @level2name = N'%(column)s'"
+        ) % {
+            'procedure': procedure,
+            'name': PROGRESS_PROPERTY,
+            'value': '' if procedure == 'sp_dropextendedproperty' else ' @value = %s,',
+            'table': self.table.replace("'", "''"),
+            'column': self.shadow.replace("'", "''"),
+        }
+
+    def get_schema(self, cursor):
+        cursor.execute("SELECT OBJECT_SCHEMA_NAME(OBJECT_ID(%s))", [self.table])
+        return cursor.fetchone()[0]
+
+    def add_shadow_column(self, cursor):
+        quote_name = self.connection.ops.quote_name
+        # adding nullable column is a metadata operation, trigger is created
+        # in the same transaction so no modification is missed
+        with transaction.atomic(using=self.connection.alias, savepoint=False):
+            cursor.execute('ALTER TABLE %s ADD %s datetime2(6) NULL' % (
+                quote_name(self.table), quote_name(self.shadow)))
+            cursor.execute(
+                'CREATE TRIGGER %(trigger)s ON %(table)s AFTER INSERT, UPDATE AS\n'
+                'SET NOCOUNT ON;\n'
+                'IF UPDATE(%(column)s)\n'
+                '    UPDATE t SET %(shadow)s = i.%(column)s\n'
+                '    FROM %(table)s AS t JOIN inserted AS i ON t.%(pk)s = i.%(pk)s' % {
+                    'trigger': quote_name(self.trigger),
+                    'table': quote_name(self.table),
+                    'column': quote_name(self.column),
+                    'shadow': quote_name(self.shadow),
+                    'pk': quote_name(self.pk),
+                }
+            )
+            cursor.execute(self.extended_property_sql('sp_addextendedproperty'), ['', self.get_schema(cursor)])
+        self.log('Added column %s and trigger %s to table %s.' % (self.shadow, self.trigger, self.table))
+
+    def get_progress(self, cursor):
+        cursor.execute(
+            "SELECT CAST(value AS nvarchar(4000)) FROM sys.extended_properties "
+            "WHERE major_id = OBJECT_ID(%s) AND minor_id = COLUMNPROPERTY(OBJECT_ID(%s), %s, 'ColumnId') AND name = %s",
+            [self.table, self.table, self.shadow, PROGRESS_PROPERTY],
+        )
+        row = cursor.fetchone()
+        return row[0] if row and row[0] else None
+
+    def backfill(self, cursor, batch_size, sleep):
+        quote_name = self.connection.ops.quote_name
+        params = {
+            'table': quote_name(self.table),
+            'column': quote_name(self.column),
+            'shadow': quote_name(self.shadow),
+            'pk': quote_name(self.pk),
+            'batch_size': batch_size,
+        }
+        schema = self.get_schema(cursor)
+        total = self.connection.introspection.get_table_row_count(cursor, self.table) or 0
+        last = self.get_progress(cursor)
+        if last is not None:
+            cursor.execute('SELECT COUNT_BIG(*) FROM %(table)s WHERE %(pk)s <= %%s' % params, [last])
+            done = cursor.fetchone()[0]
+            self.log('Resuming backfill of %s after %s=%s.' % (self.shadow, self.pk, last))
+        else:
+            done = 0
+        start = time.time()
+        done_at_start = done
+        while True:
+            # keyset pagination seeks the clustered index instead of
+            # scanning rows which are already backfilled
+            where = ' WHERE %(pk)s > %%s' % params if last is not None else ''
+            cursor.execute(
+                'SELECT MAX(%(pk)s), COUNT_BIG(*) FROM (SELECT TOP (%(batch_size)d) %(pk)s FROM %(table)s' % params +
+                where + ' ORDER BY %(pk)s) AS batch' % params,
+                [last] if last is not None else [],
+            )
+            upper, count = cursor.fetchone()
+            if upper is None:
+                break
+            with transaction.atomic(using=self.connection.alias, savepoint=False):
+                cursor.execute(
+                    'UPDATE %(table)s SET %(shadow)s = %(column)s WHERE %(pk)s <= %%s' % params +
+                    (' AND %(pk)s > %%s' % params if last is not None else ''),
+                    [upper, last] if last is not None else [upper],
+                )
+                cursor.execute(self.extended_property_sql('sp_updateextendedproperty'), [upper, schema])
+            last = upper
+            done += count
+            elapsed = time.time() - start
+            self.log('Backfilled %d of %d rows (%.1f%%), %.0f rows/s.' % (
+                done, max(total, done), 100.0 * done / max(total, done),
+                (done - done_at_start) / elapsed if elapsed else 0))
+            if sleep:
+                time.sleep(sleep)
+        self.log('Backfilled %s of table %s, %d rows.' % (self.shadow, self.table, done))
+
+    def get_dependencies(self, cursor):
+        """
+        Returns names of indexes, statistics and constraints which use the
+        original column and prevent dropping it.
+        """
+        cursor.execute("""
+SELECT i.name
+FROM sys.index_columns ic
+JOIN sys.indexes i ON i.object_id = ic.object_id AND i.index_id = ic.index_id
+WHERE ic.object_id = OBJECT_ID(%s) AND ic.column_id = COLUMNPROPERTY(OBJECT_ID(%s), %s, 'ColumnId')
+UNION
+SELECT s.name
+FROM sys.stats_columns sc
+JOIN sys.stats s ON s.object_id = sc.object_id AND s.stats_id = sc.stats_id
+WHERE sc.object_id = OBJECT_ID(%s) AND sc.column_id = COLUMNPROPERTY(OBJECT_ID(%s), %s, 'ColumnId')
+    AND s.user_created = 1
+UNION
+SELECT name
+FROM sys.default_constraints
+WHERE parent_object_id = OBJECT_ID(%s) AND parent_column_id = COLUMNPROPERTY(OBJECT_ID(%s), %s, 'ColumnId')
+UNION
+SELECT name
+FROM sys.check_constraints
+WHERE parent_object_id = OBJECT_ID(%s) AND parent_column_id = COLUMNPROPERTY(OBJECT_ID(%s), %s, 'ColumnId')
+UNION
+SELECT OBJECT_NAME(fkc.constraint_object_id)
+FROM sys.foreign_key_columns fkc
+WHERE fkc.parent_object_id = OBJECT_ID(%s) AND fkc.parent_column_id = COLUMNPROPERTY(OBJECT_ID(%s), %s, 'ColumnId')
+UNION
+SELECT OBJECT_NAME(d.referencing_id)
+FROM sys.sql_expression_dependencies d
+WHERE d.referenced_id = OBJECT_ID(%s) AND d.referenced_minor_id = COLUMNPROPERTY(OBJECT_ID(%s), %s, 'ColumnId')
+    AND d.referencing_id <> OBJECT_ID(%s)
+""", [self.table, self.table, self.column] * 6 + [self.trigger])
+        return sorted(row[0] for row in cursor.fetchall())
+
+    def swap(self, cursor):
+        quote_name = self.connection.ops.quote_name
+        dependencies = self.get_dependencies(cursor)
+        if dependencies:
+            raise CommandError(
+                'Column %s is used by %s. Create them on column %s, drop them and run the command again.' % (
+                    self.column, ', '.join(dependencies), self.shadow))
+        cursor.execute(
+            "SELECT is_nullable FROM sys.columns WHERE object_id = OBJECT_ID(%s) AND name = %s",
+            [self.table, self.column],
+        )
+        nullable = cursor.fetchone()[0]
+        if not nullable:
+            # checked without locking the table, the trigger copies values of
+            # the NOT NULL column so NULLs can't appear after this check
+            cursor.execute('SELECT TOP (1) %s FROM %s WHERE %s IS NULL' % (
+                quote_name(self.pk), quote_name(self.table), quote_name(self.shadow)))
+            row = cursor.fetchone()
+            if row is not None:
+                raise CommandError(
+                    'Column %s is not backfilled, e.g. in row %s=%s. Drop it and trigger %s and run the command '
+                    'again.' % (self.shadow, self.pk, row[0], self.trigger))
+        schema = self.get_schema(cursor)
+        with transaction.atomic(using=self.connection.alias, savepoint=False):
+            # exclusive lock is held only for metadata changes
+            cursor.execute('SELECT TOP (0) NULL FROM %s WITH (TABLOCKX, HOLDLOCK)' % quote_name(self.table))
+            cursor.execute('DROP TRIGGER %s' % quote_name(self.trigger))
+            cursor.execute(self.extended_property_sql('sp_dropextendedproperty'), [schema])
+            cursor.execute('ALTER TABLE %s DROP COLUMN %s' % (quote_name(self.table), quote_name(self.column)))
+            cursor.execute(
+                "EXEC sp_rename %s, %s, 'COLUMN'",
+                ['%s.%s.%s' % (quote_name(schema), quote_name(self.table), quote_name(self.shadow)), self.column],
+            )
+            if not nullable:
+                # ALTER COLUMN ... NOT NULL would scan the table under the
+                # exclusive lock, constraint added WITH NOCHECK only applies
+                # to new values
+                cursor.execute('ALTER TABLE %s WITH NOCHECK ADD CONSTRAINT %s CHECK (%s IS NOT NULL)' % (
+                    quote_name(self.table), quote_name(self.not_null_constraint), quote_name(self.column)))
+        self.log('Converted column %s of table %s to datetime2(6).' % (self.column, self.table))
@@ -0,0 +1,52 @@
+from __future__ import absolute_import, unicode_literals
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import CommandError
+from django.core.management.commands import createcachetable
+from django.db import DatabaseError, connections, router
+from django.utils.encoding import force_text
+
+from sqlserver.cache import DatabaseCache
+
+
+class Command(createcachetable.Command):
+    """
+    Creates cache tables like Django's command, tables of caches which use
+    memory-optimized table are created as memory-optimized.
+    """
+    def get_memory_optimized_cache(self, tablename):
+        for cache_alias in settings.CACHES:
+            cache = caches[cache_alias]
+            if isinstance(cache, DatabaseCache) and cache._table == tablename and cache._memory_optimized:
+                return cache
+        return None
+
+    def create_table(self, database, tablename, dry_run):
+        cache = self.get_memory_optimized_cache(tablename)
+        if cache is None:
+            return super(Command, self).create_table(database, tablename, dry_run)
+        if not router.allow_migrate_model(database, cache.cache_model_class):
+            return
+        connection = connections[database]
+
+        if tablename in connection.introspection.table_names():
+            if self.verbosity > 0:
+                self.stdout.write("Cache table '%s' already exists." % tablename)
+            return
+
+        statement = cache.create_memory_optimized_table_sql(connection)
+        if dry_run:
+            self.stdout.write(statement + ';')
+            return
+
+        with connection.cursor() as cursor:
+            try:
+                cursor.execute(statement)
+            except DatabaseError as e:
+                raise CommandError(
+                    "Cache table '%s' could not be created.\nThe error was: %s." %
+                    (tablename, force_text(e)))
+
+        if self.verbosity > 1:
+            self.stdout.write("Cache table '%s' created." % tablename)
@@ -0,0 +1,95 @@
+from __future__ import absolute_import, unicode_literals
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+
+class Command(BaseCommand):
+    help = (
+        "Sliding window maintenance of a partitioned table: splits and merges "
+        "partitions, switches out or truncates a partition. These are metadata "
+        "operations which don't move rows when affected partitions are empty."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='Nominates a database. Defaults to the "default" database.',
+        )
+        subparsers = parser.add_subparsers(dest='action', title='actions')
+        subparsers.required = True
+
+        split = subparsers.add_parser(
+            'split', cmd=self,
+            help='Adds a boundary to the partition function, creating a new partition.',
+        )
+        split.add_argument('model', help='Partitioned model as app_label.ModelName.')
+        split.add_argument('boundary', help='New boundary value.')
+        split.add_argument(
+            '--filegroup',
+            help='Filegroup of the new partition, required if partition scheme is not created with ALL TO.',
+        )
+
+        merge = subparsers.add_parser(
+            'merge', cmd=self,
+            help='Removes a boundary from the partition function, merging two adjacent partitions.',
+        )
+        merge.add_argument('model', help='Partitioned model as app_label.ModelName.')
+        merge.add_argument('boundary', help='Existing boundary value.')
+
+        switch = subparsers.add_parser(
+            'switch', cmd=self,
+            help='Moves rows of a partition into an empty table with the same structure on the same filegroup.',
+        )
+        switch.add_argument('model', help='Partitioned model as app_label.ModelName.')
+        switch.add_argument('value', help='Any value which belongs to the partition.')
+        switch.add_argument('table', help='Name of the target table.')
+
+        truncate = subparsers.add_parser(
+            'truncate', cmd=self,
+            help='Deletes all rows of a partition.',
+        )
+        truncate.add_argument('model', help='Partitioned model as app_label.ModelName.')
+        truncate.add_argument('value', help='Any value which belongs to the partition.')
+
+    def handle(self, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'microsoft':
+            raise CommandError('Database %s is not a SQL Server database.' % options['database'])
+        try:
+            model = apps.get_model(options['model'])
+        except (LookupError, ValueError) as e:
+            raise CommandError(str(e))
+        table = model._meta.db_table
+        with connection.cursor() as cursor:
+            partitioning = connection.introspection.get_partitioning(cursor, table)
+            if partitioning is None:
+                raise CommandError('Table %s is not partitioned.' % table)
+            quote_name = connection.ops.quote_name
+            function = quote_name(partitioning['function'])
+            with transaction.atomic(using=connection.alias, savepoint=False):
+                if options['action'] == 'split':
+                    if options['filegroup']:
+                        cursor.execute('ALTER PARTITION SCHEME %s NEXT USED %s' % (
+                            quote_name(partitioning['scheme']), quote_name(options['filegroup'])))
+                    cursor.execute('ALTER PARTITION FUNCTION %s() SPLIT RANGE (%%s)' % function, [options['boundary']])
+                    message = 'Added boundary %s to partition function %s.' % (
+                        options['boundary'], partitioning['function'])
+                elif options['action'] == 'merge':
+                    cursor.execute('ALTER PARTITION FUNCTION %s() MERGE RANGE (%%s)' % function, [options['boundary']])
+                    message = 'Removed boundary %s from partition function %s.' % (
+                        options['boundary'], partitioning['function'])
+                else:
+                    cursor.execute('SELECT $PARTITION.%s(%%s)' % function, [options['value']])
+                    partition_number = cursor.fetchone()[0]
+                    if options['action'] == 'switch':
+                        cursor.execute('ALTER TABLE %s SWITCH PARTITION %d TO %s' % (
+                            quote_name(table), partition_number, quote_name(options['table'])))
+                        message = 'Switched partition %d of %s to %s.' % (partition_number, table, options['table'])
+                    else:
+                        cursor.execute('TRUNCATE TABLE %s WITH (PARTITIONS (%d))' % (
+                            quote_name(table), partition_number))
+                        message = 'Truncated partition %d of %s.' % (partition_number, table)
+        if options['verbosity'] >= 1:
+            self.stdout.write(message)
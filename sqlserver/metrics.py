@@ -0,0 +1,243 @@
+"""
+Connection and query metrics.
+
+Metrics are enabled per database by ``'metrics'`` in ``OPTIONS``, which is a
+collector instance or a dotted path to collector class. Connections without
+it are not instrumented.
+
+Counters: ``connections``, ``round_trips``, ``bytes_sent``,
+``bytes_received``, ``queries``, ``rows_fetched``.
+
+Histograms: ``connect_time``, ``query_time``, ``cursor_lifetime`` (seconds)
+and ``round_trips_per_request``.
+"""
+from __future__ import absolute_import, unicode_literals
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import request_finished, request_started
+from django.db import connections
+from django.utils import six
+from django.utils.module_loading import import_string
+
+COUNTERS = {
+    'connections': 'Number of opened connections.',
+    'round_trips': 'Number of requests sent to the server.',
+    'bytes_sent': 'Number of bytes sent to the server after login.',
+    'bytes_received': 'Number of bytes received from the server after login.',
+    'queries': 'Number of executed statements.',
+    'rows_fetched': 'Number of fetched rows.',
+}
+
+HISTOGRAMS = {
+    'connect_time': 'Seconds spent opening a connection, including login.',
+    'query_time': 'Seconds spent executing a statement, excluding fetching of rows.',
+    'cursor_lifetime': 'Seconds between creating and closing a cursor.',
+    'round_trips_per_request': 'Number of round trips during a request.',
+}
+
+TIME_HISTOGRAMS = ('connect_time', 'query_time', 'cursor_lifetime')
+
+
+class Collector(object):
+    """
+    Base class of collectors, ``tags`` of metrics contain database alias.
+    """
+    def increment(self, name, value, tags):
+        raise NotImplementedError('subclasses of Collector must provide an increment() method')
+
+    def observe(self, name, value, tags):
+        raise NotImplementedError('subclasses of Collector must provide an observe() method')
+
+
+class InMemoryCollector(Collector):
+    """
+    Collector which keeps totals of counters and lists of observed values
+    of histograms, e.g. for tests.
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.counters = dict((name, 0) for name in COUNTERS)
+        self.histograms = dict((name, []) for name in HISTOGRAMS)
+
+    def increment(self, name, value, tags):
+        self.counters[name] += value
+
+    def observe(self, name, value, tags):
+        self.histograms[name].append(value)
+
+
+class PrometheusCollector(Collector):
+    """
+    Collector which updates prometheus_client counters and histograms
+    labeled by database alias.
+    """
+    def __init__(self, namespace='django_sqlserver', registry=None):
+        try:
+            import prometheus_client
+        except ImportError:
+            raise ImproperlyConfigured('PrometheusCollector requires prometheus_client package.')
+        kwargs = {'namespace': namespace, 'labelnames': ['alias']}
+        if registry is not None:
+            kwargs['registry'] = registry
+        self.metrics = {}
+        for name, documentation in COUNTERS.items():
+            self.metrics[name] = prometheus_client.Counter(name, documentation, **kwargs)
+        for name, documentation in HISTOGRAMS.items():
+            self.metrics[name] = prometheus_client.Histogram(name, documentation, **kwargs)
+
+    def increment(self, name, value, tags):
+        self.metrics[name].labels(tags['alias']).inc(value)
+
+    def observe(self, name, value, tags):
+        self.metrics[name].labels(tags['alias']).observe(value)
+
+
+class StatsdCollector(Collector):
+    """
+    Collector which sends metrics with a statsd client, counters with
+    ``incr(stat, count)`` and histograms with ``timing(stat, value)``, times
+    in milliseconds. Names of stats are ``<prefix>.<alias>.<name>``.
+    """
+    def __init__(self, client, prefix='sqlserver'):
+        self.client = client
+        self.prefix = prefix
+
+    def increment(self, name, value, tags):
+        self.client.incr('%s.%s.%s' % (self.prefix, tags['alias'], name), value)
+
+    def observe(self, name, value, tags):
+        if name in TIME_HISTOGRAMS:
+            value *= 1000
+        self.client.timing('%s.%s.%s' % (self.prefix, tags['alias'], name), value)
+
+
+def get_collector(value):
+    """
+    Returns collector for value of 'metrics' option, or None if metrics are
+    disabled.
+    """
+    if not value:
+        return None
+    if isinstance(value, six.string_types):
+        value = import_string(value)()
+    request_started.connect(_request_started, dispatch_uid='sqlserver.metrics.request_started')
+    request_finished.connect(_request_finished, dispatch_uid='sqlserver.metrics.request_finished')
+    return value
+
+
+class MetricsSocket(object):
+    """
+    Socket proxy which counts bytes and round trips, a round trip starts
+    when data is sent after data was received.
+    """
+    def __init__(self, sock, db):
+        self._sock = sock
+        self._db = db
+        self._receiving = True
+
+    def __getattr__(self, attr):
+        return getattr(self._sock, attr)
+
+    def sendall(self, data, *args):
+        db = self._db
+        if self._receiving:
+            self._receiving = False
+            db.round_trips += 1
+            db.metrics.increment('round_trips', 1, db.metrics_tags)
+        db.metrics.increment('bytes_sent', len(data), db.metrics_tags)
+        return self._sock.sendall(data, *args)
+
+    def recv(self, size, *args):
+        data = self._sock.recv(size, *args)
+        self._receiving = True
+        self._db.metrics.increment('bytes_received', len(data), self._db.metrics_tags)
+        return data
+
+
+def instrument_connection(db, conn, connect_time):
+    """Records metrics of a new pytds connection and instruments its socket."""
+    db.metrics.increment('connections', 1, db.metrics_tags)
+    db.metrics.observe('connect_time', connect_time, db.metrics_tags)
+    # pytds 1.8 reads and writes the socket of the transport directly, sessions
+    # keep the transport itself, so replacing its socket covers all of them
+    transport = conn._conn
+    if not hasattr(transport, '_sock'):
+        raise ImproperlyConfigured('metrics option requires python-tds<1.9.')
+    transport._sock = MetricsSocket(transport._sock, db)
+
+
+class MetricsCursor(object):
+    """
+    Cursor wrapper which records executed statements, fetched rows and
+    lifetime of the cursor.
+    """
+    def __init__(self, cursor, db):
+        self.cursor = cursor
+        self.db = db
+        self._created = time.time()
+
+    def __getattr__(self, attr):
+        return getattr(self.cursor, attr)
+
+    def __iter__(self):
+        while True:
+            row = self.fetchone()
+            if row is None:
+                return
+            yield row
+
+    def _timed(self, method, *args):
+        start = time.time()
+        try:
+            return method(*args)
+        finally:
+            self.db.metrics.increment('queries', 1, self.db.metrics_tags)
+            self.db.metrics.observe('query_time', time.time() - start, self.db.metrics_tags)
+
+    def execute(self, sql, params=()):
+        return self._timed(self.cursor.execute, sql, params)
+
+    def executemany(self, sql, param_list):
+        return self._timed(self.cursor.executemany, sql, param_list)
+
+    def callproc(self, procname, params=()):
+        return self._timed(self.cursor.callproc, procname, params)
+
+    def _fetched(self, rows):
+        if rows:
+            self.db.metrics.increment('rows_fetched', len(rows), self.db.metrics_tags)
+        return rows
+
+    def fetchone(self):
+        row = self.cursor.fetchone()
+        if row is not None:
+            self.db.metrics.increment('rows_fetched', 1, self.db.metrics_tags)
+        return row
+
+    def fetchmany(self, size=None):
+        return self._fetched(self.cursor.fetchmany(size))
+
+    def fetchall(self):
+        return self._fetched(self.cursor.fetchall())
+
+    def close(self):
+        if self._created is not None:
+            self.db.metrics.observe('cursor_lifetime', time.time() - self._created, self.db.metrics_tags)
+            self._created = None
+        self.cursor.close()
+
+
+def _request_started(**kwargs):
+    for db in connections.all():
+        if getattr(db, 'metrics', None) is not None:
+            db._request_round_trips = db.round_trips
+
+
+def _request_finished(**kwargs):
+    for db in connections.all():
+        if getattr(db, 'metrics', None) is not None and db._request_round_trips is not None:
+            db.metrics.observe('round_trips_per_request', db.round_trips - db._request_round_trips, db.metrics_tags)
+            db._request_round_trips = None
@@ -0,0 +1,159 @@
+"""
+Migration operations for SQL Server specific features.
+
+Autodetector does not generate these operations, they should be added to
+migrations manually.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import django
+from django.db.migrations.operations.base import Operation
+from django.utils.functional import cached_property
+
+if django.VERSION >= (1, 10, 0):
+    from django.db.migrations.operations.models import ModelOptionOperation
+else:
+    class ModelOptionOperation(Operation):
+        def __init__(self, name):
+            self.name = name
+
+        @cached_property
+        def name_lower(self):
+            return self.name.lower()
+
+        def references_model(self, name, app_label=None):
+            return name.lower() == self.name_lower
+
+
+class AlterDataCompression(ModelOptionOperation):
+    """
+    Changes data compression of a model's table, table is rebuilt only if
+    its current compression differs.
+    """
+    def __init__(self, name, data_compression):
+        self.data_compression = data_compression
+        super(AlterDataCompression, self).__init__(name)
+
+    def deconstruct(self):
+        kwargs = {
+            'name': self.name,
+            'data_compression': self.data_compression,
+        }
+        return self.__class__.__name__, [], kwargs
+
+    def state_forwards(self, app_label, state):
+        model_state = state.models[app_label, self.name_lower]
+        model_state.options['data_compression'] = self.data_compression
+        if django.VERSION >= (1, 11, 0):
+            state.reload_model(app_label, self.name_lower, delay=True)
+        else:
+            state.reload_model(app_label, self.name_lower)
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'microsoft':
+            return
+        new_model = to_state.apps.get_model(app_label, self.name)
+        if self.allow_migrate_model(schema_editor.connection.alias, new_model):
+            old_model = from_state.apps.get_model(app_label, self.name)
+            schema_editor.alter_data_compression(
+                new_model,
+                old_model._meta.data_compression,
+                new_model._meta.data_compression,
+            )
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        return self.database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def describe(self):
+        return "Alter data compression of %s to %s" % (self.name, self.data_compression or 'none')
+
+
+class CreatePartitionFunction(Operation):
+    """
+    Creates partition function which maps values of ``input_type`` (SQL type,
+    e.g. 'datetime2(6)') to partitions delimited by ``boundaries``.
+    """
+    reversible = True
+
+    def __init__(self, name, input_type, boundaries, range_right=True):
+        self.name = name
+        self.input_type = input_type
+        self.boundaries = boundaries
+        self.range_right = range_right
+
+    def deconstruct(self):
+        kwargs = {
+            'name': self.name,
+            'input_type': self.input_type,
+            'boundaries': self.boundaries,
+        }
+        if not self.range_right:
+            kwargs['range_right'] = False
+        return self.__class__.__name__, [], kwargs
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'microsoft':
+            return
+        schema_editor.execute("CREATE PARTITION FUNCTION %s (%s) AS RANGE %s FOR VALUES (%s)" % (
+            schema_editor.quote_name(self.name),
+            self.input_type,
+            'RIGHT' if self.range_right else 'LEFT',
+            ', '.join(schema_editor.quote_value(value) for value in self.boundaries),
+        ))
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'microsoft':
+            return
+        schema_editor.execute("DROP PARTITION FUNCTION %s" % schema_editor.quote_name(self.name))
+
+    def describe(self):
+        return "Creates partition function %s" % self.name
+
+
+class CreatePartitionScheme(Operation):
+    """
+    Creates partition scheme which maps partitions of ``function`` to
+    ``filegroups``, by default all partitions are stored in PRIMARY filegroup.
+    """
+    reversible = True
+
+    def __init__(self, name, function, filegroups=None):
+        self.name = name
+        self.function = function
+        self.filegroups = filegroups
+
+    def deconstruct(self):
+        kwargs = {
+            'name': self.name,
+            'function': self.function,
+        }
+        if self.filegroups:
+            kwargs['filegroups'] = self.filegroups
+        return self.__class__.__name__, [], kwargs
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'microsoft':
+            return
+        if self.filegroups:
+            filegroups = 'TO (%s)' % ', '.join(schema_editor.quote_name(fg) for fg in self.filegroups)
+        else:
+            filegroups = 'ALL TO ([PRIMARY])'
+        schema_editor.execute("CREATE PARTITION SCHEME %s AS PARTITION %s %s" % (
+            schema_editor.quote_name(self.name),
+            schema_editor.quote_name(self.function),
+            filegroups,
+        ))
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'microsoft':
+            return
+        schema_editor.execute("DROP PARTITION SCHEME %s" % schema_editor.quote_name(self.name))
+
+    def describe(self):
+        return "Creates partition scheme %s" % self.name
@@ -0,0 +1,30 @@
+"""
+Model Meta options specific to SQL Server.
+
+Django rejects unknown attributes of model's Meta, so names of these options
+are added to Django's list of Meta options when this package is imported.
+The package should be listed in INSTALLED_APPS, so that it is imported before
+any models are defined.
+"""
+from __future__ import absolute_import, unicode_literals
+
+from django.db.migrations import state
+from django.db.models import options
+
+# names of Meta options and their default values
+META_OPTIONS = {
+    'data_compression': None,
+    'partition_scheme': None,
+    'partition_field': None,
+    'memory_optimized': False,
+    'durability': None,
+}
+
+
+def register_meta_options():
+    for name, default in META_OPTIONS.items():
+        if name not in options.DEFAULT_NAMES:
+            options.DEFAULT_NAMES += (name,)
+            setattr(options.Options, name, default)
+    # migration state has its own reference to the tuple
+    state.DEFAULT_NAMES = options.DEFAULT_NAMES
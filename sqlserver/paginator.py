@@ -0,0 +1,100 @@
+from __future__ import absolute_import, unicode_literals
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import BigIntegerField, QuerySet
+from django.db.models.expressions import RawSQL
+from django.db.models.query import ModelIterable
+from django.utils.functional import cached_property
+
+from .query import estimated_count
+
+
+class ApproximateCountPaginator(Paginator):
+    """
+    Paginator which avoids COUNT queries over large unfiltered tables.
+
+    When object list is an unfiltered queryset whose table has more than
+    ``approximate_count_threshold`` rows according to partition statistics
+    the estimated number is used as a total count, otherwise exact count is
+    calculated as usual.
+    """
+    approximate_count_threshold = 100000
+
+    def __init__(self, object_list, per_page, orphans=0, allow_empty_first_page=True,
+                 approximate_count_threshold=None):
+        super(ApproximateCountPaginator, self).__init__(
+            object_list, per_page, orphans=orphans, allow_empty_first_page=allow_empty_first_page)
+        if approximate_count_threshold is not None:
+            self.approximate_count_threshold = approximate_count_threshold
+
+    @cached_property
+    def count(self):
+        if hasattr(self.object_list, 'query'):
+            count = estimated_count(self.object_list)
+            if count is not None and count > self.approximate_count_threshold:
+                return count
+        return super(ApproximateCountPaginator, self).count
+
+
+class CountOver(RawSQL):
+    """
+    ``COUNT_BIG(*) OVER ()`` expression. It is a window function, not an
+    aggregate, so it is not added to GROUP BY, and in grouped queries it
+    counts groups.
+    """
+    def __init__(self):
+        super(CountOver, self).__init__('COUNT_BIG(*) OVER ()', [], output_field=BigIntegerField())
+
+    def get_group_by_cols(self):
+        return []
+
+
+class CountOverPaginator(Paginator):
+    """
+    Paginator which fetches total count in the same query as the page rows.
+
+    Page query is annotated with ``COUNT_BIG(*) OVER ()`` which is evaluated
+    before OFFSET/FETCH is applied, so filters are evaluated once per page
+    instead of once for COUNT and once for the page. Separate COUNT query is
+    only issued when requested page is empty or when object list is not
+    a plain model queryset.
+    """
+    count_attname = '_paginator_total_count'
+
+    def _can_count_over(self):
+        object_list = self.object_list
+        if not isinstance(object_list, QuerySet) or object_list._iterable_class is not ModelIterable:
+            return False
+        query = object_list.query
+        return (
+            connections[object_list.db].vendor == 'microsoft' and
+            not query.distinct and
+            # combined queries, e.g. union(), exist since Django 1.11
+            not getattr(query, 'combinator', None) and
+            not query.low_mark and
+            query.high_mark is None
+        )
+
+    def page(self, number):
+        if 'count' in self.__dict__ or not self._can_count_over():
+            return super(CountOverPaginator, self).page(number)
+        try:
+            bottom = (int(number) - 1) * self.per_page
+        except (TypeError, ValueError):
+            bottom = -1
+        if bottom < 0:
+            # let base class raise appropriate error
+            return super(CountOverPaginator, self).page(number)
+        object_list = self.object_list.annotate(**{
+            self.count_attname: CountOver(),
+        })
+        rows = list(object_list[bottom:bottom + self.per_page + self.orphans])
+        if rows:
+            self.count = getattr(rows[0], self.count_attname)
+        # for empty page count is calculated by separate query here
+        number = self.validate_number(number)
+        top = bottom + self.per_page
+        if top + self.orphans >= self.count:
+            top = self.count
+        return self._get_page(rows[:max(top - bottom, 0)], number, self)
@@ -0,0 +1,388 @@
+"""QuerySet helpers which take advantage of SQL Server specific features."""
+from __future__ import absolute_import, unicode_literals
+
+from django.core import exceptions
+from django.db import DatabaseError, connections, transaction
+from django.db.models import QuerySet
+from django.db.models.constants import LOOKUP_SEP
+from django.db.models.deletion import Collector
+from django.db.models.query import get_prefetcher, normalize_prefetch_lookups, prefetch_one_level
+
+from .batch import Batch
+from .showplan import SHOWPLAN_COLUMN, format_showplan
+
+
+def _is_unfiltered(query):
+    return not (
+        query.where or
+        query.distinct or
+        # combined queries, e.g. union(), exist since Django 1.11
+        getattr(query, 'combinator', None) or
+        query.low_mark or
+        query.high_mark is not None or
+        isinstance(query.group_by, list)
+    )
+
+
+def estimated_count(queryset):
+    """
+    Returns number of rows in the queryset estimated from partition
+    statistics of the model's table.
+
+    Returns None if estimation is not possible, which is the case for
+    querysets with filters, slicing, DISTINCT or GROUP BY, for
+    memory-optimized tables, which don't have row counts in partition
+    statistics, and for non SQL Server databases.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'microsoft' or not _is_unfiltered(queryset.query):
+        return None
+    if getattr(queryset.model._meta, 'memory_optimized', False):
+        return None
+    with connection.cursor() as cursor:
+        return connection.introspection.get_table_row_count(cursor, queryset.model._meta.db_table)
+
+
+def approximate_count(queryset):
+    """
+    Returns number of rows in the queryset, using partition statistics for
+    unfiltered querysets and falling back to exact count otherwise.
+    """
+    if queryset._result_cache is not None:
+        return len(queryset._result_cache)
+    count = estimated_count(queryset)
+    if count is None:
+        count = queryset.count()
+    return count
+
+
+_truncate_sql = """
+SET NOCOUNT ON;
+DECLARE @table nvarchar(776) = %%s, @rows bigint, @ident numeric(38, 0);
+SELECT @rows = ISNULL(SUM(p.rows), 0)
+FROM sys.partitions p
+WHERE p.object_id = OBJECT_ID(@table) AND p.index_id IN (0, 1);
+SELECT @ident = CONVERT(numeric(38, 0), last_value) + CONVERT(numeric(38, 0), increment_value)
+FROM sys.identity_columns
+WHERE object_id = OBJECT_ID(@table) AND last_value IS NOT NULL;
+TRUNCATE TABLE %(table)s;
+IF @@ERROR <> 0 RETURN;
+IF %(keep_identity)d = 1 AND @ident IS NOT NULL
+    DBCC CHECKIDENT (@table, RESEED, @ident) WITH NO_INFOMSGS;
+SELECT @rows"""
+
+_batched_delete_sql = """
+SET NOCOUNT ON;
+DECLARE @table nvarchar(776) = %%s, @deleted bigint = 0, @batch bigint, @ident numeric(38, 0);
+WHILE 1 = 1
+BEGIN
+    DELETE TOP (%(batch_size)d) FROM %(table)s;
+    SET @batch = @@ROWCOUNT;
+    SET @deleted = @deleted + @batch;
+    IF @batch < %(batch_size)d BREAK;
+END;
+SELECT @ident = CONVERT(numeric(38, 0), seed_value) - CONVERT(numeric(38, 0), increment_value)
+FROM sys.identity_columns
+WHERE object_id = OBJECT_ID(@table) AND last_value IS NOT NULL;
+IF %(reseed_identity)d = 1 AND @ident IS NOT NULL
+    DBCC CHECKIDENT (@table, RESEED, @ident) WITH NO_INFOMSGS;
+SELECT @deleted"""
+
+
+def delete_all(queryset, reseed_identity=False, batch_size=10000):
+    """
+    Deletes all rows from the table of an unfiltered queryset without
+    fetching primary keys.
+
+    Uses TRUNCATE TABLE when no foreign keys reference the table, number of
+    deleted rows is taken from partition statistics in this case. Otherwise,
+    or when TRUNCATE TABLE fails, e.g. without ALTER permission on the table,
+    rows are deleted by DELETE TOP (batch_size) statements in a loop which
+    runs on the server within a single round trip. Identity column is reset
+    to its seed value only if ``reseed_identity`` is True.
+
+    Returns the same value as QuerySet.delete(), or None if the queryset
+    can't be deleted this way because it is filtered or deletion requires
+    cascades, signals or generic relation handling.
+    """
+    if queryset._fields is not None or not _is_unfiltered(queryset.query):
+        return None
+    del_query = queryset._clone()
+    del_query._for_write = True
+    using = del_query.db
+    connection = connections[using]
+    if connection.vendor != 'microsoft' or not Collector(using=using).can_fast_delete(del_query):
+        return None
+    opts = queryset.model._meta
+    params = {
+        'table': connection.ops.quote_name(opts.db_table),
+        'keep_identity': not reseed_identity,
+        'reseed_identity': reseed_identity,
+        'batch_size': batch_size,
+    }
+    deleted = None
+    with transaction.atomic(using=using, savepoint=False):
+        with connection.cursor() as cursor:
+            # memory-optimized tables can't be truncated
+            if (not getattr(opts, 'memory_optimized', False) and
+                    not connection.introspection.get_referencing_tables(cursor, opts.db_table)):
+                try:
+                    with transaction.atomic(using=using):
+                        cursor.execute(_truncate_sql % params, [opts.db_table])
+                        deleted = int(cursor.fetchone()[0])
+                except DatabaseError:
+                    # TRUNCATE TABLE requires ALTER permission and isn't
+                    # allowed e.g. for tables referenced by indexed views
+                    deleted = None
+            if deleted is None:
+                cursor.execute(_batched_delete_sql % params, [opts.db_table])
+                deleted = int(cursor.fetchone()[0])
+    queryset._result_cache = None
+    return deleted, {opts.label: deleted}
+
+
+class TruncatingQuerySet(QuerySet):
+    """
+    QuerySet which deletes all rows of unfiltered querysets using
+    :func:`delete_all` when it is safe to do so.
+    """
+    reseed_identity = False
+
+    def delete(self):
+        result = delete_all(self, reseed_identity=self.reseed_identity)
+        if result is None:
+            result = super(TruncatingQuerySet, self).delete()
+        return result
+
+    delete.alters_data = True
+
+
+class _PendingLookup(object):
+    """Prefetch lookup which is traversed level by level."""
+    def __init__(self, lookup, obj_list):
+        self.lookup = lookup
+        self.through_attrs = lookup.prefetch_through.split(LOOKUP_SEP)
+        self.level = 0
+        self.obj_list = obj_list
+
+
+class _FetchedPrefetcher(object):
+    """Prefetcher which returns result of get_prefetch_queryset() executed in a batch."""
+    def __init__(self, result):
+        self.result = result
+
+    def get_prefetch_queryset(self, instances, queryset=None):
+        return self.result
+
+
+def _advance(pending, done_queries):
+    """
+    Traverses levels of the lookup which don't require a query, same as
+    django.db.models.query.prefetch_related_objects does.
+
+    Returns (prefetcher, descriptor, prefetch_to) for the level which
+    requires a query or None when the lookup is done.
+    """
+    lookup = pending.lookup
+    if lookup.prefetch_to in done_queries:
+        if lookup.queryset is not None:
+            raise ValueError("'%s' lookup was already seen with a different queryset. "
+                             "You may need to adjust the ordering of your lookups." % lookup.prefetch_to)
+        return None
+    while pending.level < len(pending.through_attrs):
+        level = pending.level
+        through_attr = pending.through_attrs[level]
+        obj_list = pending.obj_list
+        if len(obj_list) == 0:
+            return None
+        prefetch_to = lookup.get_current_prefetch_to(level)
+        if prefetch_to in done_queries:
+            pending.obj_list = done_queries[prefetch_to]
+            pending.level += 1
+            continue
+        for obj in obj_list:
+            if not hasattr(obj, '_prefetched_objects_cache'):
+                try:
+                    obj._prefetched_objects_cache = {}
+                except (AttributeError, TypeError):
+                    # not a model instance, prefetching doesn't make sense
+                    return None
+        first_obj = obj_list[0]
+        to_attr = lookup.get_current_to_attr(level)[0]
+        prefetcher, descriptor, attr_found, is_fetched = get_prefetcher(first_obj, through_attr, to_attr)
+        if not attr_found:
+            raise AttributeError("Cannot find '%s' on %s object, '%s' is an invalid "
+                                 "parameter to prefetch_related()" %
+                                 (through_attr, first_obj.__class__.__name__, lookup.prefetch_through))
+        if level == len(pending.through_attrs) - 1 and prefetcher is None:
+            raise ValueError("'%s' does not resolve to an item that supports "
+                             "prefetching - this is an invalid parameter to "
+                             "prefetch_related()." % lookup.prefetch_through)
+        if prefetcher is not None and not is_fetched:
+            return prefetcher, descriptor, prefetch_to
+        # singly related object which is already fetched or an attribute
+        # which is traversed without prefetching
+        new_obj_list = []
+        for obj in obj_list:
+            if through_attr in getattr(obj, '_prefetched_objects_cache', ()):
+                new_obj = list(obj._prefetched_objects_cache.get(through_attr))
+            else:
+                try:
+                    new_obj = getattr(obj, through_attr)
+                except exceptions.ObjectDoesNotExist:
+                    continue
+            if new_obj is None:
+                continue
+            if isinstance(new_obj, list):
+                new_obj_list.extend(new_obj)
+            else:
+                new_obj_list.append(new_obj)
+        pending.obj_list = new_obj_list
+        pending.level += 1
+    return None
+
+
+def _fetch_prefetch_querysets(requests):
+    """
+    Calls get_prefetch_queryset() for every request and evaluates returned
+    querysets of SQL Server databases in one batch per database.
+    """
+    results = []
+    batches = {}
+    fetched = []
+    for pending, prefetcher, descriptor, prefetch_to in requests:
+        result = prefetcher.get_prefetch_queryset(
+            pending.obj_list, pending.lookup.get_current_queryset(pending.level))
+        rel_qs = result[0]
+        if (isinstance(rel_qs, QuerySet) and rel_qs._result_cache is None and
+                connections[rel_qs.db].vendor == 'microsoft'):
+            if rel_qs.db not in batches:
+                batches[rel_qs.db] = Batch(connections[rel_qs.db])
+            # nested lookups are merged by prefetch_one_level, they must not
+            # be prefetched when the batch is executed
+            queryset = rel_qs._clone()
+            queryset._prefetch_related_lookups = ()
+            fetched.append((rel_qs, batches[rel_qs.db].add(queryset)))
+        results.append(result)
+    for batch in batches.values():
+        batch.execute()
+    for rel_qs, queryset in fetched:
+        rel_qs._result_cache = queryset._result_cache
+    return results
+
+
+def prefetch_related_objects(model_instances, *related_lookups):
+    """
+    Same as django.db.models.prefetch_related_objects, but executes
+    querysets of all lookups which reached the same depth in a single round
+    trip, so ``prefetch_related('a', 'b', 'c')`` costs one query instead of
+    three.
+    """
+    if len(model_instances) == 0:
+        return
+
+    done_queries = {}
+    auto_lookups = set()
+    followed_descriptors = set()
+
+    all_pending = [_PendingLookup(lookup, model_instances)
+                   for lookup in normalize_prefetch_lookups(related_lookups)]
+    while all_pending:
+        requests = []
+        waiting = []
+        claimed = set()
+        for pending in all_pending:
+            request = _advance(pending, done_queries)
+            if request is None:
+                continue
+            if request[2] in claimed:
+                # another lookup fetches the same objects in this round
+                waiting.append(pending)
+            else:
+                claimed.add(request[2])
+                requests.append((pending,) + request)
+
+        new_pending = []
+        results = _fetch_prefetch_querysets(requests)
+        for (pending, prefetcher, descriptor, prefetch_to), result in zip(requests, results):
+            lookup = pending.lookup
+            obj_list, additional_lookups = prefetch_one_level(
+                pending.obj_list, _FetchedPrefetcher(result), lookup, pending.level)
+            # same recursion protection as in Django
+            if not (lookup in auto_lookups and descriptor in followed_descriptors):
+                done_queries[prefetch_to] = obj_list
+                new_lookups = normalize_prefetch_lookups(additional_lookups, prefetch_to)
+                auto_lookups.update(new_lookups)
+                new_pending.extend(_PendingLookup(new_lookup, model_instances) for new_lookup in new_lookups)
+            followed_descriptors.add(descriptor)
+            pending.obj_list = obj_list
+            pending.level += 1
+            new_pending.append(pending)
+        all_pending = new_pending + waiting
+
+
+EXPLAIN_FORMATS = ('text', 'json', 'xml')
+
+
+def explain(queryset, format=None, **options):
+    """
+    Returns execution plan of the queryset, like QuerySet.explain() of
+    newer Django versions.
+
+    The plan is estimated using SET SHOWPLAN_XML ON, which doesn't execute
+    the query. With ``analyze=True`` the query is executed with SET
+    STATISTICS XML ON and actual plan includes actual row counts.
+
+    ``format`` is 'text' (default), a tree of operators with estimated rows
+    and cost, 'json' with the same information, or 'xml' showplan.
+    """
+    format = (format or 'text').lower()
+    if format not in EXPLAIN_FORMATS:
+        raise ValueError("'%s' is not a recognized format. Allowed formats: %s" % (
+            format, ', '.join(EXPLAIN_FORMATS)))
+    analyze = options.pop('analyze', False)
+    if options:
+        raise ValueError('Unknown options: %s' % ', '.join(sorted(options)))
+    connection = connections[queryset.db]
+    if connection.vendor != 'microsoft':
+        raise NotImplementedError('explain() is only supported for SQL Server databases.')
+    sql, params = queryset.query.get_compiler(queryset.db).as_sql()
+    option = 'STATISTICS XML' if analyze else 'SHOWPLAN_XML'
+    plans = []
+    with connection.cursor() as cursor:
+        # SET SHOWPLAN_XML has to be the only statement of a batch
+        savepoints_sql = connection.pop_pending_savepoints_sql()
+        if savepoints_sql:
+            cursor.execute(savepoints_sql)
+        cursor.execute('SET %s ON' % option)
+        try:
+            cursor.execute(sql, params)
+            while True:
+                description = cursor.description
+                if description:
+                    rows = cursor.fetchall()
+                    if len(description) == 1 and description[0][0] == SHOWPLAN_COLUMN:
+                        plans.extend(row[0] for row in rows)
+                if not cursor.nextset():
+                    break
+        finally:
+            cursor.execute('SET %s OFF' % option)
+    return format_showplan(plans, format)
+
+
+class ExplainQuerySet(QuerySet):
+    """
+    QuerySet with explain() method, see :func:`explain`.
+    """
+    def explain(self, format=None, **options):
+        return explain(self, format, **options)
+
+
+class BatchPrefetchQuerySet(QuerySet):
+    """
+    QuerySet which executes prefetch_related() queries of the same depth in
+    a single round trip, see :func:`prefetch_related_objects`.
+    """
+    def _prefetch_related_objects(self):
+        prefetch_related_objects(self._result_cache, *self._prefetch_related_lookups)
+        self._prefetch_done = True
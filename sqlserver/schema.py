@@ -0,0 +1,515 @@
+from __future__ import absolute_import, unicode_literals
+import contextlib
+import warnings
+
+import django
+from django.utils import six
+import sqlserver_ado.schema
+
+if django.VERSION >= (1, 11, 0):
+    from .indexes import ColumnstoreIndex, UniqueIndex
+else:
+    # Meta.indexes are supported since Django 1.11, isinstance() checks
+    # against an empty tuple are always False
+    ColumnstoreIndex = UniqueIndex = ()
+
+# index build options which can be set for an index or for all indexes
+# in OPTIONS['index_options'] of the database settings
+INDEX_OPTIONS = ('online', 'resumable', 'maxdop', 'sort_in_tempdb', 'data_compression')
+
+ROWSTORE_DATA_COMPRESSION = ('none', 'row', 'page')
+COLUMNSTORE_DATA_COMPRESSION = ('columnstore', 'columnstore_archive')
+
+
+class DatabaseSchemaEditor(sqlserver_ado.schema.DatabaseSchemaEditor):
+    sql_create_unique_index = "CREATE UNIQUE INDEX %(name)s ON %(table)s (%(columns)s)%(extra)s"
+    sql_create_columnstore_index = \
+        "CREATE NONCLUSTERED COLUMNSTORE INDEX %(name)s ON %(table)s (%(columns)s)%(extra)s"
+    sql_create_clustered_columnstore_index = "CREATE CLUSTERED COLUMNSTORE INDEX %(name)s ON %(table)s%(extra)s"
+    sql_resume_index = "ALTER INDEX %(name)s ON %(table)s RESUME%(extra)s"
+    sql_rebuild_table = "ALTER TABLE %(table)s REBUILD%(extra)s"
+    # indexes of memory-optimized tables are declared in CREATE TABLE
+    # or added by ALTER TABLE
+    sql_memory_optimized_index = "INDEX %(name)s %(type)s (%(columns)s)%(extra)s"
+    sql_memory_optimized_unique = "CONSTRAINT %(name)s UNIQUE %(type)s (%(columns)s)%(extra)s"
+    sql_memory_optimized_columnstore_index = "INDEX %(name)s CLUSTERED COLUMNSTORE"
+    sql_add_memory_optimized_index = "ALTER TABLE %(table)s ADD %(definition)s"
+    sql_delete_memory_optimized_index = "ALTER TABLE %(table)s DROP INDEX %(name)s"
+
+    # build options of the index which is being created, see _building_index()
+    _index_options = None
+    # True while the base editor alters a field, see _constraint_names()
+    _altering_field = False
+
+    def _get_meta_indexes(self, model):
+        """Returns Meta.indexes of the model, empty before Django 1.11."""
+        return getattr(model._meta, 'indexes', [])
+
+    def _is_memory_optimized(self, model):
+        return bool(getattr(model._meta, 'memory_optimized', False))
+
+    def _has_nonclustered_pk(self, model):
+        """
+        Returns True if primary key of the model should be created as
+        NONCLUSTERED, which is the case when table is stored by a clustered
+        columnstore index or is memory-optimized.
+        """
+        return (
+            self._is_memory_optimized(model) or
+            any(getattr(index, 'clustered', False) for index in self._get_meta_indexes(model))
+        )
+
+    def _check_data_compression(self, data_compression, columnstore=False):
+        """
+        Returns lowercased data compression, raises ValueError if it can't be
+        used for rowstore or columnstore data.
+        """
+        data_compression = data_compression.lower()
+        allowed = COLUMNSTORE_DATA_COMPRESSION if columnstore else ROWSTORE_DATA_COMPRESSION
+        if data_compression not in allowed:
+            raise ValueError("%s data compression must be one of %s, not '%s'." % (
+                'Columnstore' if columnstore else 'Rowstore',
+                ', '.join("'%s'" % value for value in allowed),
+                data_compression,
+            ))
+        return data_compression
+
+    def _get_data_compression(self, model):
+        """
+        Returns validated Meta.data_compression of the model, it is columnstore
+        compression if table is stored by clustered columnstore index.
+        """
+        data_compression = getattr(model._meta, 'data_compression', None)
+        if not data_compression:
+            return None
+        if self._is_memory_optimized(model):
+            raise ValueError('Memory-optimized table can not have data_compression.')
+        return self._check_data_compression(data_compression, columnstore=self._has_nonclustered_pk(model))
+
+    def _get_partition_column(self, model):
+        """
+        Returns partitioning column of the model's table, or None if table is
+        not partitioned.
+        """
+        if not getattr(model._meta, 'partition_scheme', None):
+            return None
+        if not getattr(model._meta, 'partition_field', None):
+            raise ValueError('Meta.partition_field is required when Meta.partition_scheme is set.')
+        return model._meta.get_field(model._meta.partition_field).column
+
+    def _has_composite_pk(self, model):
+        """
+        Returns True if primary key of the model is created with partitioning
+        column added to it. Key of a unique index on a partitioned table has
+        to include partitioning column for the index to be aligned.
+        """
+        partition_column = self._get_partition_column(model)
+        return partition_column is not None and partition_column != model._meta.pk.column
+
+    def column_sql(self, model, field, include_default=False):
+        definition, params = super(DatabaseSchemaEditor, self).column_sql(model, field, include_default)
+        if definition is not None and field.primary_key:
+            if self._has_composite_pk(model):
+                # primary key is added as table constraint
+                definition = definition.replace(' PRIMARY KEY', '', 1)
+            elif self._has_nonclustered_pk(model):
+                definition = definition.replace(' PRIMARY KEY', ' PRIMARY KEY NONCLUSTERED', 1)
+        return definition, params
+
+    def _partition_sql(self, model):
+        partition_column = self._get_partition_column(model)
+        if partition_column is None:
+            return ''
+        return ' ON %s(%s)' % (
+            self.quote_name(model._meta.partition_scheme),
+            self.quote_name(partition_column),
+        )
+
+    def _memory_optimized_index_sql(self, name, columns, bucket_count=None, unique=False):
+        """
+        Returns definition of an index of memory-optimized table, ``columns``
+        are quoted column names with optional ordering. Unique index is
+        declared as UNIQUE constraint.
+        """
+        template = self.sql_memory_optimized_unique if unique else self.sql_memory_optimized_index
+        return template % {
+            'name': self.quote_name(name),
+            'type': 'HASH' if bucket_count else 'NONCLUSTERED',
+            'columns': ', '.join(columns),
+            'extra': ' WITH (BUCKET_COUNT = %d)' % bucket_count if bucket_count else '',
+        }
+
+    def _memory_optimized_index_definition(self, model, index):
+        if isinstance(index, ColumnstoreIndex):
+            if not index.clustered:
+                raise ValueError('Memory-optimized table can only have clustered columnstore index.')
+            if index.data_compression:
+                raise ValueError('Columnstore index of memory-optimized table can not have data_compression.')
+            return self.sql_memory_optimized_columnstore_index % {'name': self.quote_name(index.name)}
+        if getattr(index, 'condition', None) is not None:
+            raise ValueError('Index of memory-optimized table can not have a condition.')
+        if getattr(index, 'include', None):
+            raise ValueError('Index of memory-optimized table can not have included fields.')
+        if getattr(index, 'data_compression', None):
+            raise ValueError('Index of memory-optimized table can not have data_compression.')
+        parameters = index.get_sql_create_template_values(model, self, '')
+        return self._memory_optimized_index_sql(
+            index.name, [parameters['columns']], getattr(index, 'bucket_count', None),
+            unique=isinstance(index, UniqueIndex),
+        )
+
+    def _add_memory_optimized_index_sql(self, model, index):
+        return self.sql_add_memory_optimized_index % {
+            'table': self.quote_name(model._meta.db_table),
+            'definition': self._memory_optimized_index_definition(model, index),
+        }
+
+    def _model_memory_optimized_indexes_sql(self, model):
+        """
+        Returns definitions of all indexes of memory-optimized table, with
+        the same names as indexes created by _model_indexes_sql().
+        """
+        definitions = []
+        for field in model._meta.local_fields:
+            if self._field_should_be_indexed(model, field):
+                definitions.append(self._memory_optimized_index_sql(
+                    self._create_index_name(model, [field.column]),
+                    [self.quote_name(field.column)],
+                ))
+        for field_names in model._meta.index_together:
+            columns = [model._meta.get_field(field_name).column for field_name in field_names]
+            definitions.append(self._memory_optimized_index_sql(
+                self._create_index_name(model, columns, suffix='_idx'),
+                [self.quote_name(column) for column in columns],
+            ))
+        for index in self._get_meta_indexes(model):
+            definitions.append(self._memory_optimized_index_definition(model, index))
+        return definitions
+
+    def _model_indexes_sql(self, model):
+        if self._is_memory_optimized(model):
+            # indexes are declared in CREATE TABLE
+            return []
+        return super(DatabaseSchemaEditor, self)._model_indexes_sql(model)
+
+    def _table_constraints_sql(self, model):
+        sql = ''
+        if self._has_composite_pk(model):
+            pk_column = model._meta.pk.column
+            sql += ', CONSTRAINT %s PRIMARY KEY%s (%s, %s)' % (
+                self.quote_name(self._create_index_name(model, [pk_column], suffix='_pk')),
+                ' NONCLUSTERED' if self._has_nonclustered_pk(model) else '',
+                self.quote_name(pk_column),
+                self.quote_name(self._get_partition_column(model)),
+            )
+        if self._is_memory_optimized(model):
+            for definition in self._model_memory_optimized_indexes_sql(model):
+                sql += ', ' + definition
+        return sql
+
+    def _table_options_sql(self, model):
+        options = []
+        data_compression = self._get_data_compression(model)
+        # table stored by clustered columnstore index gets compression
+        # from its index
+        if data_compression and not self._has_nonclustered_pk(model):
+            options.append('DATA_COMPRESSION = %s' % data_compression.upper())
+        if self._is_memory_optimized(model):
+            options.append('MEMORY_OPTIMIZED = ON')
+            if getattr(model._meta, 'durability', None):
+                options.append('DURABILITY = %s' % model._meta.durability.upper())
+        sql = ' WITH (%s)' % ', '.join(options) if options else ''
+        return sql + self._partition_sql(model)
+
+    def create_model(self, model):
+        # create_model is called recursively for auto-created m2m tables,
+        # each of them gets its own options
+        sql_create_table = self.sql_create_table
+        self.sql_create_table = DatabaseSchemaEditor.sql_create_table.replace(
+            '%(definition)s', '%(definition)s' + self._table_constraints_sql(model),
+        ) + self._table_options_sql(model)
+        try:
+            super(DatabaseSchemaEditor, self).create_model(model)
+        finally:
+            self.sql_create_table = sql_create_table
+
+    def alter_data_compression(self, model, old_data_compression, new_data_compression):
+        """
+        Rebuilds table of the model with the new data compression, table is
+        not rebuilt if it already has requested compression.
+        """
+        if self._is_memory_optimized(model):
+            raise ValueError('Memory-optimized table can not have data_compression.')
+        columnstore = self._has_nonclustered_pk(model)
+        new_data_compression = self._check_data_compression(
+            new_data_compression or ('columnstore' if columnstore else 'none'), columnstore)
+        if not self.collect_sql:
+            with self.connection.cursor() as cursor:
+                current = self.connection.introspection.get_data_compression(cursor, model._meta.db_table)
+            if current == new_data_compression:
+                return
+        options = self._get_index_options()
+        online = options.get('online')
+        # table stored by clustered columnstore index is rebuilt online since
+        # SQL Server 2019
+        if online and columnstore and not self.connection.features.supports_online_clustered_columnstore_index:
+            online = False
+        options_sql = self._index_options_sql({
+            'online': online,
+            'maxdop': options.get('maxdop'),
+            'data_compression': new_data_compression,
+        })
+        self.execute(self.sql_rebuild_table % {
+            'table': self.quote_name(model._meta.db_table),
+            'extra': options_sql,
+        })
+
+    def _get_index_options(self, index=None):
+        """
+        Returns dict of index build options, options of the index override
+        options from the database settings.
+        """
+        if self._index_options is not None:
+            return dict(self._index_options)
+        options = dict(self.connection.settings_dict.get('OPTIONS', {}).get('index_options', {}))
+        for name in INDEX_OPTIONS:
+            value = getattr(index, name, None)
+            if value is not None:
+                options[name] = value
+        if options.get('resumable') and self.connection.in_atomic_block:
+            # resumable index operation can't run in a user transaction,
+            # migration should be marked with atomic = False
+            warnings.warn(
+                'Resumable index build is not possible inside a transaction, '
+                'index is built as non-resumable.', RuntimeWarning)
+            options['resumable'] = False
+        if options.get('resumable') and options.get('sort_in_tempdb'):
+            raise ValueError('Resumable index build can not use sort_in_tempdb.')
+        return options
+
+    @contextlib.contextmanager
+    def _building_index(self, model, index=None):
+        """
+        Computes build options of the index once, _get_index_options() called
+        inside the block returns the same options.
+        """
+        if self._index_options is not None or self._is_memory_optimized(model):
+            # options of enclosing block are used, memory-optimized tables
+            # don't have index build options
+            yield self._index_options
+            return
+        self._index_options = self._get_index_options(index)
+        try:
+            yield self._index_options
+        finally:
+            self._index_options = None
+
+    def _index_options_sql(self, options):
+        sql = []
+        if options.get('online') or options.get('resumable'):
+            sql.append('ONLINE = ON')
+        if options.get('resumable'):
+            sql.append('RESUMABLE = ON')
+        if options.get('maxdop') is not None:
+            sql.append('MAXDOP = %d' % options['maxdop'])
+        if options.get('sort_in_tempdb'):
+            sql.append('SORT_IN_TEMPDB = ON')
+        if options.get('data_compression'):
+            sql.append('DATA_COMPRESSION = %s' % options['data_compression'].upper())
+        return ' WITH (%s)' % ', '.join(sql) if sql else ''
+
+    def _supports_online_columnstore_index(self, index):
+        features = self.connection.features
+        if index.clustered:
+            return features.supports_online_clustered_columnstore_index
+        return features.supports_online_nonclustered_columnstore_index
+
+    def _get_index_tablespace_sql(self, model, fields, index=None):
+        if self._is_memory_optimized(model):
+            # memory-optimized tables don't have index build options
+            return ''
+        options = self._get_index_options(index)
+        columnstore = isinstance(index, ColumnstoreIndex)
+        if columnstore:
+            # rowstore compression from index_options setting does not apply
+            # to columnstore index, clustered columnstore index stores the table
+            options['data_compression'] = index.data_compression
+            if index.clustered and not index.data_compression:
+                data_compression = getattr(model._meta, 'data_compression', None)
+                if data_compression and data_compression.lower() in COLUMNSTORE_DATA_COMPRESSION:
+                    options['data_compression'] = data_compression
+            if options.get('online') and not self._supports_online_columnstore_index(index):
+                warnings.warn(
+                    'SQL Server version does not support online build of %s columnstore index, '
+                    'index is built offline.' % ('clustered' if index.clustered else 'nonclustered'),
+                    RuntimeWarning)
+                options['online'] = False
+        if options.get('data_compression'):
+            options['data_compression'] = self._check_data_compression(options['data_compression'], columnstore)
+        options_sql = self._index_options_sql(options)
+        partition_sql = self._partition_sql(model)
+        if partition_sql:
+            # indexes are aligned with partitions of the table
+            return options_sql + partition_sql
+        return options_sql + super(DatabaseSchemaEditor, self)._get_index_tablespace_sql(model, fields)
+
+    def _is_index_build_paused(self, model, name):
+        """
+        Returns True if resumable build of the index was interrupted and
+        can be resumed.
+        """
+        with self.connection.cursor() as cursor:
+            cursor.execute("""
+SELECT 1
+FROM sys.index_resumable_operations
+WHERE object_id = OBJECT_ID(%s) AND name = %s AND state_desc = 'PAUSED'
+""", [model._meta.db_table, name])
+            return cursor.fetchone() is not None
+
+    def _resume_index_sql(self, model, name, options):
+        """
+        Returns SQL statement which resumes interrupted resumable build of the
+        index if there is one, otherwise returns None.
+        """
+        if not options.get('resumable') or self.collect_sql or not self._is_index_build_paused(model, name):
+            return None
+        extra = ''
+        if options.get('maxdop') is not None:
+            extra = ' WITH (MAXDOP = %d)' % options['maxdop']
+        return self.sql_resume_index % {
+            'name': self.quote_name(name),
+            'table': self.quote_name(model._meta.db_table),
+            'extra': extra,
+        }
+
+    def _create_index_sql(self, model, fields, suffix="", sql=None):
+        if self._is_memory_optimized(model):
+            columns = [field.column for field in fields]
+            return self.sql_add_memory_optimized_index % {
+                'table': self.quote_name(model._meta.db_table),
+                'definition': self._memory_optimized_index_sql(
+                    self._create_index_name(model, columns, suffix=suffix),
+                    [self.quote_name(column) for column in columns],
+                ),
+            }
+        with self._building_index(model) as options:
+            resume_sql = self._resume_index_sql(
+                model,
+                self._create_index_name(model, [field.column for field in fields], suffix=suffix),
+                options,
+            )
+            if resume_sql is not None:
+                return resume_sql
+            return super(DatabaseSchemaEditor, self)._create_index_sql(model, fields, suffix, sql)
+
+    def _index_references_column(self, model, index, column):
+        """
+        Returns True if key columns, included columns or condition of the
+        index reference the column.
+        """
+        field_names = [field_name for field_name, order in index.fields_orders] + list(getattr(index, 'include', []))
+        if column in [model._meta.get_field(field_name).column for field_name in field_names]:
+            return True
+        if getattr(index, 'condition', None) is not None:
+            return self.quote_name(column) in index._get_condition_sql(model, self)
+        return False
+
+    def remove_field(self, model, field):
+        # column can't be dropped while an index references it, base editor
+        # only drops indexes which have exactly this column as key
+        if not field.many_to_many:
+            for index in self._get_meta_indexes(model):
+                if self._index_references_column(model, index, field.column):
+                    self.remove_index(model, index)
+        super(DatabaseSchemaEditor, self).remove_field(model, field)
+
+    def _alter_field(self, model, old_field, new_field, old_type, new_type,
+                     old_db_params, new_db_params, strict=False):
+        # type of the column can't be changed while an index references it,
+        # indexes declared in Meta.indexes are created again afterwards
+        rebuilt_indexes = set()
+        if old_type != new_type:
+            for index in self._get_meta_indexes(model):
+                if self._index_references_column(model, index, old_field.column):
+                    self.remove_index(model, index)
+                    rebuilt_indexes.add(index.name)
+        self._altering_field = True
+        try:
+            super(DatabaseSchemaEditor, self)._alter_field(
+                model, old_field, new_field, old_type, new_type, old_db_params, new_db_params, strict)
+        finally:
+            self._altering_field = False
+        # new field belongs to the model with the new state of indexes
+        new_model = getattr(new_field, 'model', model)
+        for index in self._get_meta_indexes(new_model):
+            if index.name in rebuilt_indexes:
+                self.add_index(new_model, index)
+
+    def add_index(self, model, index):
+        if self._is_memory_optimized(model):
+            self.execute(self._add_memory_optimized_index_sql(model, index))
+            return
+        with self._building_index(model, index) as options:
+            resume_sql = self._resume_index_sql(model, index.name, options)
+            if resume_sql is not None:
+                self.execute(resume_sql)
+            else:
+                super(DatabaseSchemaEditor, self).add_index(model, index)
+
+    def remove_index(self, model, index):
+        if self._is_memory_optimized(model):
+            template = self.sql_delete_unique if isinstance(index, UniqueIndex) else self.sql_delete_index
+            self.execute(self._delete_constraint_sql(template, model, index.name))
+        else:
+            super(DatabaseSchemaEditor, self).remove_index(model, index)
+
+    def _delete_constraint_sql(self, template, model, name):
+        if template == self.sql_delete_index and self._is_memory_optimized(model):
+            template = self.sql_delete_memory_optimized_index
+        return super(DatabaseSchemaEditor, self)._delete_constraint_sql(template, model, name)
+
+    def quote_value(self, value):
+        if isinstance(value, six.string_types):
+            # use unicode literal, columns of text fields are nvarchar
+            return "N'%s'" % six.text_type(value).replace("'", "''")
+        return super(DatabaseSchemaEditor, self).quote_value(value)
+
+    def _constraint_names(self, model, column_names=None, unique=None,
+                          primary_key=None, index=None, foreign_key=None,
+                          check=None, type_=None):
+        """
+        Returns all constraint names matching the columns and conditions.
+
+        Filtered indexes and indexes declared in Meta.indexes are not
+        returned to lookups of unique constraints and indexes while a field
+        is altered, they are managed by AddIndex/RemoveIndex operations and
+        should not be mistaken for indexes created for field options.
+        """
+        if column_names is not None:
+            column_names = [
+                self.connection.introspection.column_name_converter(name)
+                for name in column_names
+            ]
+        skip_indexes = self._altering_field and (unique or index)
+        meta_index_names = set(meta_index.name for meta_index in self._get_meta_indexes(model))
+        with self.connection.cursor() as cursor:
+            constraints = self.connection.introspection.get_constraints(cursor, model._meta.db_table)
+        result = []
+        for name, infodict in constraints.items():
+            if skip_indexes and (name in meta_index_names or infodict.get('condition')):
+                continue
+            if column_names is None or column_names == infodict['columns']:
+                if unique is not None and infodict['unique'] != unique:
+                    continue
+                if primary_key is not None and infodict['primary_key'] != primary_key:
+                    continue
+                if index is not None and infodict['index'] != index:
+                    continue
+                if check is not None and infodict['check'] != check:
+                    continue
+                if foreign_key is not None and not infodict['foreign_key']:
+                    continue
+                if type_ is not None and infodict.get('type') != type_:
+                    continue
+                result.append(name)
+        return result
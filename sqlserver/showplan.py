@@ -0,0 +1,112 @@
+"""
+Parsing and formatting of XML showplans returned by SET SHOWPLAN_XML ON
+(estimated plan) and SET STATISTICS XML ON (actual plan).
+"""
+from __future__ import absolute_import, unicode_literals
+import json
+from xml.etree import ElementTree
+
+NAMESPACE = '{http://schemas.microsoft.com/sqlserver/2004/07/showplan}'
+
+# name of the column of result sets which contain showplans
+SHOWPLAN_COLUMN = 'Microsoft SQL Server 2005 XML Showplan'
+
+
+def _float(value):
+    return None if value is None else float(value)
+
+
+def _child_operators(element):
+    """Returns RelOp elements nested in the element but not in other RelOps."""
+    result = []
+    for child in element:
+        if child.tag == NAMESPACE + 'RelOp':
+            result.append(child)
+        else:
+            result.extend(_child_operators(child))
+    return result
+
+
+def _parse_operator(relop):
+    physical_op = relop.get('PhysicalOp')
+    if 'Seek' in physical_op:
+        access = 'seek'
+    elif 'Scan' in physical_op:
+        access = 'scan'
+    else:
+        access = None
+    node = {
+        'node_id': int(relop.get('NodeId')),
+        'physical_op': physical_op,
+        'logical_op': relop.get('LogicalOp'),
+        'access': access,
+        'object': None,
+        'estimated_rows': _float(relop.get('EstimateRows')),
+        'estimated_cost': _float(relop.get('EstimatedTotalSubtreeCost')),
+    }
+    counters = relop.findall('%sRunTimeInformation/%sRunTimeCountersPerThread' % (NAMESPACE, NAMESPACE))
+    if counters:
+        node['actual_rows'] = sum(int(counter.get('ActualRows', 0)) for counter in counters)
+    # Object element of the operator itself is a child of its
+    # operator-specific element, e.g. IndexScan
+    for child in relop:
+        obj = child.find(NAMESPACE + 'Object')
+        if obj is not None:
+            node['object'] = '.'.join(
+                obj.get(name) for name in ('Table', 'Index') if obj.get(name) is not None)
+            break
+    node['children'] = [_parse_operator(child) for child in _child_operators(relop)]
+    return node
+
+
+def parse_showplan(xml):
+    """
+    Returns list of statements of the XML showplan, each statement is a
+    dict with statement text, estimated cost and tree of operators.
+    """
+    root = ElementTree.fromstring(xml.encode('utf-8'))
+    statements = []
+    for statement in root.iter(NAMESPACE + 'StmtSimple'):
+        query_plan = statement.find(NAMESPACE + 'QueryPlan')
+        if query_plan is None:
+            continue
+        relop = query_plan.find(NAMESPACE + 'RelOp')
+        statements.append({
+            'statement': statement.get('StatementText'),
+            'estimated_cost': _float(statement.get('StatementSubTreeCost')),
+            'plan': None if relop is None else _parse_operator(relop),
+        })
+    return statements
+
+
+def _format_operator(node, depth, lines):
+    line = node['physical_op']
+    if node['physical_op'] != node['logical_op']:
+        line += ' (%s)' % node['logical_op']
+    if node['object']:
+        line += ' on %s' % node['object']
+    details = ['rows=%g' % node['estimated_rows'], 'cost=%g' % node['estimated_cost']]
+    if 'actual_rows' in node:
+        details.append('actual rows=%d' % node['actual_rows'])
+    lines.append('%s%s  %s' % ('  ' * depth, line, ' '.join(details)))
+    for child in node['children']:
+        _format_operator(child, depth + 1, lines)
+
+
+def format_showplan(xmls, format):
+    """
+    Returns XML showplans formatted as 'text', 'json' or 'xml'.
+    """
+    if format == 'xml':
+        return '\n'.join(xmls)
+    statements = []
+    for xml in xmls:
+        statements.extend(parse_showplan(xml))
+    if format == 'json':
+        return json.dumps(statements, indent=2)
+    lines = []
+    for statement in statements:
+        lines.append('%s  cost=%g' % (' '.join(statement['statement'].split()), statement['estimated_cost']))
+        if statement['plan'] is not None:
+            _format_operator(statement['plan'], 1, lines)
+    return '\n'.join(lines)
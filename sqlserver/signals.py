@@ -0,0 +1,7 @@
+from __future__ import absolute_import, unicode_literals
+
+from django.dispatch import Signal
+
+# sent for every query logged by a connection with 'query_statistics'
+# option after its statistics are received from the server
+query_statistics = Signal(providing_args=['connection', 'sql', 'statistics'])
@@ -0,0 +1,118 @@
+"""
+Logging of queries which take longer than 'slow_query_threshold' option.
+"""
+from __future__ import absolute_import, unicode_literals
+import binascii
+import logging
+import os
+import sys
+import time
+
+import django
+from django.db import DatabaseError
+
+import sqlserver_ado
+
+logger = logging.getLogger('sqlserver.slow_queries')
+
+# frames of these packages are skipped when looking for the caller
+_skipped_paths = tuple(
+    os.path.dirname(os.path.abspath(module.__file__)) + os.sep
+    for module in (django, sqlserver_ado, sys.modules[__package__])
+)
+
+# most recent statement of the session is looked up because DMVs don't
+# keep requests which have already finished
+_query_hash_sql = """
+SELECT TOP 1 qs.query_hash, qs.query_plan_hash, qs.plan_handle
+FROM sys.dm_exec_connections c
+JOIN sys.dm_exec_query_stats qs ON qs.sql_handle = c.most_recent_sql_handle
+WHERE c.session_id = %s
+ORDER BY qs.last_execution_time DESC
+"""
+
+
+def get_caller():
+    """
+    Returns 'path:line in function' of the innermost frame outside of Django
+    and database backend packages.
+    """
+    frame = sys._getframe(1)
+    while frame is not None:
+        path = os.path.abspath(frame.f_code.co_filename)
+        if not path.startswith(_skipped_paths):
+            return '%s:%d in %s' % (path, frame.f_lineno, frame.f_code.co_name)
+        frame = frame.f_back
+    return None
+
+
+def _hex(value):
+    if value is None:
+        return None
+    return '0x' + binascii.hexlify(bytes(value)).decode('ascii').upper()
+
+
+class SlowQueryCursor(object):
+    """
+    Cursor wrapper which logs statements executed longer than
+    ``db.slow_query_threshold`` seconds.
+    """
+    def __init__(self, cursor, db):
+        self.cursor = cursor
+        self.db = db
+
+    def __getattr__(self, attr):
+        return getattr(self.cursor, attr)
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+    def _timed(self, method, sql, params):
+        # failed statements are not logged, their exceptions are raised to
+        # the caller and rowcount and query hashes would be of no use
+        start = time.time()
+        result = method(sql, params)
+        duration = time.time() - start
+        if duration >= self.db.slow_query_threshold:
+            self._log(duration, sql, params)
+        return result
+
+    def execute(self, sql, params=()):
+        return self._timed(self.cursor.execute, sql, params)
+
+    def executemany(self, sql, param_list):
+        return self._timed(self.cursor.executemany, sql, param_list)
+
+    def _get_query_hash(self):
+        if not self.db.slow_query_hashes:
+            return None
+        try:
+            spid = self.cursor.spid
+            with self.db.slow_query_connection.cursor() as cursor:
+                cursor.execute(_query_hash_sql, [spid])
+                return cursor.fetchone()
+        except DatabaseError:
+            # requires VIEW SERVER STATE permission, logging should not
+            # break the query which is logged
+            logger.debug('Lookup of query hash failed.', exc_info=True)
+            return None
+
+    def _log(self, duration, sql, params):
+        row = self._get_query_hash() or (None, None, None)
+        query_hash, query_plan_hash, plan_handle = [_hex(value) for value in row]
+        rowcount = self.cursor.rowcount
+        caller = get_caller()
+        logger.warning(
+            '(%.3f) %s; args=%s; rows=%d; caller=%s; query_hash=%s; query_plan_hash=%s',
+            duration, sql, params, rowcount, caller, query_hash, query_plan_hash,
+            extra={
+                'duration': duration,
+                'sql': sql,
+                'params': params,
+                'rowcount': rowcount,
+                'caller': caller,
+                'query_hash': query_hash,
+                'query_plan_hash': query_plan_hash,
+                'plan_handle': plan_handle,
+            }
+        )
@@ -0,0 +1,95 @@
+"""
+Per-query statistics reported by SQL Server with SET STATISTICS IO, TIME ON.
+"""
+from __future__ import absolute_import, unicode_literals
+import re
+
+from django.db.backends.utils import CursorDebugWrapper
+
+from .signals import query_statistics
+
+# message numbers are used because texts of messages are localized
+MSG_EXECUTION_TIMES = 3612
+MSG_PARSE_AND_COMPILE_TIME = 3613
+MSG_TABLE_IO = 3615
+
+_numbers_re = re.compile(r'\d+')
+# table name is quoted in the beginning of the message and can contain digits
+_table_re = re.compile(r"^[^']*'(.*)'\.", re.DOTALL)
+
+
+def parse_statistics(messages):
+    """
+    Returns dict with totals of logical and physical reads, CPU and elapsed
+    time in milliseconds from (msgno, text) pairs of server messages, or
+    None if there are no statistics messages.
+    """
+    statistics = None
+    for msgno, text in messages:
+        if msgno not in (MSG_EXECUTION_TIMES, MSG_PARSE_AND_COMPILE_TIME, MSG_TABLE_IO):
+            continue
+        if statistics is None:
+            statistics = {'logical_reads': 0, 'physical_reads': 0, 'cpu_time': 0, 'elapsed_time': 0}
+        if msgno == MSG_TABLE_IO:
+            match = _table_re.match(text)
+            if match:
+                text = text[match.end():]
+            # scan count, logical reads, physical reads, ...
+            numbers = [int(number) for number in _numbers_re.findall(text)]
+            if len(numbers) >= 3:
+                statistics['logical_reads'] += numbers[1]
+                statistics['physical_reads'] += numbers[2]
+        else:
+            numbers = [int(number) for number in _numbers_re.findall(text)]
+            if len(numbers) >= 2:
+                statistics['cpu_time'] += numbers[0]
+                statistics['elapsed_time'] += numbers[1]
+    return statistics
+
+
+def collect_statistics(connection):
+    """
+    Adds statistics of the last logged query of the connection to its entry
+    in ``connection.queries`` and sends ``query_statistics`` signal.
+
+    Statistics of a query are complete once its results are read, they are
+    collected when the next query is executed or the cursor is closed,
+    because the server sends all messages of a request on the same session.
+    """
+    pending = connection._pending_statistics
+    if pending is None:
+        return
+    connection._pending_statistics = None
+    entry, cursor = pending
+    messages = cursor.messages
+    if not messages:
+        return
+    statistics = parse_statistics((ex.msg_no, ex.text) for _, ex in messages)
+    if statistics is None:
+        return
+    entry.update(statistics)
+    query_statistics.send(
+        sender=connection.__class__, connection=connection, sql=entry['sql'], statistics=statistics)
+
+
+class StatisticsCursorDebugWrapper(CursorDebugWrapper):
+    """
+    Debug cursor which adds server statistics to logged queries.
+    """
+    def _log_statistics(self, method, *args):
+        collect_statistics(self.db)
+        try:
+            return method(*args)
+        finally:
+            # CursorDebugWrapper logs the query even if it fails
+            self.db._pending_statistics = (self.db.queries_log[-1], self.cursor)
+
+    def execute(self, sql, params=None):
+        return self._log_statistics(super(StatisticsCursorDebugWrapper, self).execute, sql, params)
+
+    def executemany(self, sql, param_list):
+        return self._log_statistics(super(StatisticsCursorDebugWrapper, self).executemany, sql, param_list)
+
+    def close(self):
+        collect_statistics(self.db)
+        self.cursor.close()
@@ -0,0 +1,49 @@
+"""Transaction helpers which take advantage of SQL Server specific features."""
+from __future__ import absolute_import, unicode_literals
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.transaction import TransactionManagementError
+
+
+class Atomic(transaction.Atomic):
+    """
+    Atomic block which runs the transaction with the given isolation level,
+    e.g. 'snapshot'. Isolation level can only be set for the outermost
+    block, connection returns to isolation level configured in OPTIONS
+    after the block.
+    """
+    def __init__(self, using, savepoint, isolation_level):
+        super(Atomic, self).__init__(using, savepoint)
+        self.isolation_level = isolation_level
+
+    def __enter__(self):
+        if self.isolation_level is not None:
+            connection = transaction.get_connection(self.using)
+            if connection.in_atomic_block or not connection.get_autocommit():
+                raise TransactionManagementError(
+                    "Isolation level can only be set for the outermost atomic block.")
+            connection.set_isolation_level(self.isolation_level)
+        super(Atomic, self).__enter__()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.isolation_level is not None:
+            connection = transaction.get_connection(self.using)
+            # restored before commit or rollback which start the next
+            # transaction with connection's isolation level
+            if connection.connection is not None:
+                connection.set_isolation_level(None)
+        super(Atomic, self).__exit__(exc_type, exc_value, traceback)
+
+
+def atomic(using=None, savepoint=True, isolation_level=None):
+    """
+    Same as django.db.transaction.atomic with additional isolation_level
+    argument.
+    """
+    # Bare decorator: @atomic -- although the first argument is called
+    # `using`, it's actually the function being decorated.
+    if callable(using):
+        return Atomic(DEFAULT_DB_ALIAS, savepoint, isolation_level)(using)
+    # Decorator: @atomic(...) or context manager: with atomic(...): ...
+    else:
+        return Atomic(using, savepoint, isolation_level)
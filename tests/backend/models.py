@@ -0,0 +1,18 @@
+from django.db import models
+
+from sqlserver.fields import DateTimeOffsetField
+
+
+class Item(models.Model):
+    name = models.CharField(max_length=50)
+
+
+class Event(models.Model):
+    day = models.DateField(db_index=True)
+    created = models.DateTimeField(db_index=True)
+    at = models.TimeField(db_index=True)
+
+
+class OffsetEvent(models.Model):
+    at = DateTimeOffsetField()
+    ends = DateTimeOffsetField(null=True)
@@ -0,0 +1,486 @@
+import copy
+import datetime
+import json
+import os
+
+import pytds.tds
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connection, connections, transaction as django_transaction
+from django.db.models import BooleanField, Case, Value, When
+from django.db.transaction import TransactionManagementError
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, mock
+from django.utils import timezone
+
+from sqlserver import transaction
+from sqlserver.functions import AtTimeZone
+from sqlserver.metrics import InMemoryCollector, MetricsCursor, instrument_connection
+from sqlserver.query import ExplainQuerySet, explain
+from sqlserver.signals import query_statistics
+from sqlserver.statistics import parse_statistics
+
+from .models import Event, Item, OffsetEvent
+
+
+def get_session_isolation_level():
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT transaction_isolation_level FROM sys.dm_exec_sessions WHERE session_id = @@SPID')
+        return cursor.fetchone()[0]
+
+
+def get_connection(**options):
+    settings_dict = copy.deepcopy(connection.settings_dict)
+    settings_dict['OPTIONS'].update(options)
+    # class of connection is its proxy
+    return connections[DEFAULT_DB_ALIAS].__class__(settings_dict, alias='isolation_level')
+
+
+class IsolationLevelOptionTests(SimpleTestCase):
+    def test_init_sql(self):
+        new_connection = get_connection(isolation_level='read uncommitted')
+        new_connection.get_connection_params()
+        self.assertEqual(new_connection.get_connection_init_sql(), ['SET TRANSACTION ISOLATION LEVEL READ UNCOMMITTED'])
+
+    def test_default(self):
+        new_connection = get_connection()
+        new_connection.get_connection_params()
+        self.assertEqual(new_connection.get_connection_init_sql(), [])
+
+    def test_invalid(self):
+        new_connection = get_connection(isolation_level='chaos')
+        with self.assertRaises(ImproperlyConfigured):
+            new_connection.get_connection_params()
+
+
+class IsolationLevelTests(TransactionTestCase):
+    available_apps = []
+
+    def test_connect(self):
+        new_connection = get_connection(isolation_level='serializable')
+        try:
+            with new_connection.cursor() as cursor:
+                cursor.execute('SELECT transaction_isolation_level FROM sys.dm_exec_sessions WHERE session_id = @@SPID')
+                self.assertEqual(cursor.fetchone()[0], 4)
+        finally:
+            new_connection.close()
+
+    def test_atomic(self):
+        with transaction.atomic(isolation_level='repeatable read'):
+            self.assertEqual(get_session_isolation_level(), 3)
+        self.assertEqual(get_session_isolation_level(), 2)
+
+    def test_nested_atomic(self):
+        with transaction.atomic():
+            with self.assertRaises(TransactionManagementError):
+                with transaction.atomic(isolation_level='serializable'):
+                    pass
+
+
+def count_round_trips():
+    # every request to the server ends with a flush of the final packet
+    return mock.patch.object(pytds.tds._TdsWriter, 'flush', autospec=True, side_effect=pytds.tds._TdsWriter.flush)
+
+
+class ConnectionSetupTests(TransactionTestCase):
+    available_apps = []
+
+    def count_round_trips(self, new_connection):
+        with count_round_trips() as flush:
+            new_connection.ensure_connection()
+        new_connection.close()
+        return flush.call_count
+
+    def test_round_trips(self):
+        # prelogin and login
+        self.assertEqual(self.count_round_trips(get_connection()), 2)
+
+    def test_round_trips_init_sql(self):
+        # prelogin, login and a single batch of initialization statements
+        self.assertEqual(self.count_round_trips(get_connection(isolation_level='snapshot')), 3)
+
+    def test_round_trips_read_committed_snapshot(self):
+        new_connection = get_connection(isolation_level='read committed snapshot')
+        with mock.patch('warnings.warn'):
+            self.assertEqual(self.count_round_trips(new_connection), 3)
+        self.assertIn('_database_options', new_connection.features.__dict__)
+
+
+@mock.patch.object(connection, 'lazy_savepoints', True)
+class LazySavepointTests(TransactionTestCase):
+    available_apps = ['backend']
+
+    def test_empty_block(self):
+        with django_transaction.atomic():
+            Item.objects.create(name='a')
+            with count_round_trips() as flush:
+                with django_transaction.atomic():
+                    pass
+            self.assertEqual(flush.call_count, 0)
+
+    def test_savepoint_sent_with_statement(self):
+        with django_transaction.atomic():
+            with count_round_trips() as flush:
+                with django_transaction.atomic():
+                    list(Item.objects.all())
+            self.assertEqual(flush.call_count, 1)
+
+    def test_rollback(self):
+        with django_transaction.atomic():
+            Item.objects.create(name='a')
+            with self.assertRaises(ValueError):
+                with django_transaction.atomic():
+                    Item.objects.create(name='b')
+                    raise ValueError
+            with django_transaction.atomic():
+                Item.objects.create(name='c')
+        self.assertEqual(sorted(Item.objects.values_list('name', flat=True)), ['a', 'c'])
+
+    def test_statement_error(self):
+        with django_transaction.atomic():
+            Item.objects.create(name='a')
+            # savepoint is not created when the batch fails to compile
+            with self.assertRaises(DatabaseError):
+                with django_transaction.atomic():
+                    with connection.cursor() as cursor:
+                        cursor.execute('UPDATE backend_item SET missing_column = 1')
+            self.assertFalse(connection.needs_rollback)
+            # savepoint is created, the statement fails when it is executed
+            with self.assertRaises(DatabaseError):
+                with django_transaction.atomic():
+                    with connection.cursor() as cursor:
+                        cursor.execute('SELECT 1 / 0')
+            self.assertFalse(connection.needs_rollback)
+            Item.objects.create(name='c')
+        self.assertEqual(sorted(Item.objects.values_list('name', flat=True)), ['a', 'c'])
+
+    def test_raw_connection_cursor(self):
+        new_connection = get_connection(lazy_savepoints=True)
+        self.addCleanup(new_connection.close)
+        new_connection.set_autocommit(False)
+        try:
+            with new_connection.cursor() as cursor:
+                cursor.execute("INSERT INTO backend_item (name) VALUES ('a')")
+            sid = new_connection.savepoint()
+            cursor = new_connection.connection.cursor()
+            cursor.execute("INSERT INTO backend_item (name) VALUES ('b')")
+            new_connection.savepoint_rollback(sid)
+            with new_connection.cursor() as cursor:
+                cursor.execute('SELECT name FROM backend_item')
+                self.assertEqual(cursor.fetchall(), [('a',)])
+        finally:
+            new_connection.rollback()
+            new_connection.set_autocommit(True)
+
+
+class BatchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Item.objects.bulk_create([Item(name='a'), Item(name='b'), Item(name='c')])
+
+    def test_batch(self):
+        with count_round_trips() as flush:
+            with connection.batch() as batch:
+                items = batch.add(Item.objects.order_by('name'))
+                names = batch.add(Item.objects.filter(name__gt='a').values_list('name', flat=True).order_by('-name'))
+                empty = batch.add(Item.objects.filter(pk__in=[]))
+        self.assertEqual(flush.call_count, 1)
+        with self.assertNumQueries(0):
+            self.assertEqual([item.name for item in items], ['a', 'b', 'c'])
+            self.assertEqual(list(names), ['c', 'b'])
+            self.assertEqual(list(empty), [])
+
+    def test_parameters_limit(self):
+        pks = list(range(1500))
+        with count_round_trips() as flush:
+            with connection.batch() as batch:
+                first = batch.add(Item.objects.filter(pk__in=pks))
+                second = batch.add(Item.objects.filter(pk__in=pks))
+        self.assertEqual(flush.call_count, 2)
+        self.assertEqual(len(first), len(second))
+
+    def test_exception(self):
+        with self.assertNumQueries(0):
+            with self.assertRaises(ValueError):
+                with connection.batch() as batch:
+                    items = batch.add(Item.objects.all())
+                    raise ValueError
+        self.assertEqual(len(items), 3)
+
+
+@mock.patch.object(connection, 'fast_row_decoding', True)
+class FastRowDecodingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Item.objects.create(name='a')
+
+    def test_no_conversion(self):
+        compiler = Item.objects.all().query.get_compiler(connection=connection)
+        compiler.as_sql()
+        self.assertIsNone(compiler.get_row_decoder([s[0] for s in compiler.select]))
+        self.assertEqual(list(Item.objects.values_list('name', flat=True)), ['a'])
+
+    def test_expression(self):
+        queryset = Item.objects.annotate(
+            is_a=Case(When(name='a', then=Value(1)), default=Value(0), output_field=BooleanField()),
+        )
+        self.assertIs(queryset.get().is_a, True)
+
+
+class DateParameterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        start = timezone.now().replace(microsecond=0)
+        Event.objects.bulk_create([
+            Event(day=(start + datetime.timedelta(days=i)).date(), created=start + datetime.timedelta(days=i),
+                  at=datetime.time(i % 24))
+            for i in range(1000)
+        ])
+        cls.event = Event.objects.order_by('pk')[500]
+
+    def test_native_types(self):
+        self.assertEqual(connection.ops.adapt_datefield_value(datetime.date(2017, 1, 2)), datetime.date(2017, 1, 2))
+        self.assertEqual(
+            connection.ops.adapt_timefield_value(datetime.time(1, 2, 3, 4)), datetime.time(1, 2, 3, 4))
+        self.assertEqual(
+            connection.ops.adapt_datetimefield_value(datetime.datetime(2017, 1, 2, 3, 4, 5, 6, tzinfo=timezone.utc)),
+            datetime.datetime(2017, 1, 2, 3, 4, 5, 6),
+        )
+
+    def get_plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('SET STATISTICS XML ON')
+            try:
+                cursor.execute(sql, params)
+                rows = cursor.fetchall()
+                cursor.nextset()
+                plan = cursor.fetchone()[0]
+            finally:
+                cursor.execute('SET STATISTICS XML OFF')
+        return rows, plan
+
+    def assertSeek(self, queryset):
+        rows, plan = self.get_plan(queryset)
+        self.assertEqual(len(rows), 1)
+        self.assertIn('PhysicalOp="Index Seek"', plan)
+        self.assertNotIn('CONVERT_IMPLICIT', plan)
+
+    def test_date_seek(self):
+        self.assertSeek(Event.objects.filter(day=self.event.day).values_list('pk', 'day'))
+
+    def test_datetime_seek(self):
+        self.assertSeek(Event.objects.filter(created=self.event.created).values_list('pk', 'created'))
+
+    def test_values(self):
+        self.assertEqual(Event.objects.get(day=self.event.day, created=self.event.created).pk, self.event.pk)
+        self.assertEqual(Event.objects.filter(at=datetime.time(0)).count(), 42)
+
+
+class DateTimeOffsetFieldTests(TestCase):
+    def setUp(self):
+        self.value = datetime.datetime(2017, 3, 4, 5, 6, 7, 891011, tzinfo=timezone.get_fixed_timezone(330))
+        self.event = OffsetEvent.objects.create(at=self.value)
+
+    def test_offset_kept(self):
+        value = OffsetEvent.objects.get(pk=self.event.pk).at
+        self.assertEqual(value, self.value)
+        self.assertEqual(value.utcoffset(), datetime.timedelta(minutes=330))
+
+    def test_filter(self):
+        self.assertEqual(OffsetEvent.objects.filter(at=self.value.astimezone(timezone.utc)).get(), self.event)
+        self.assertFalse(OffsetEvent.objects.filter(at__gt=self.value).exists())
+
+    def test_at_time_zone(self):
+        value = OffsetEvent.objects.annotate(utc=AtTimeZone('at', 'UTC')).get().utc
+        self.assertEqual(value, self.value)
+        self.assertEqual(value.utcoffset(), datetime.timedelta(0))
+
+    def test_null(self):
+        self.assertIsNone(OffsetEvent.objects.get(pk=self.event.pk).ends)
+        self.assertEqual(OffsetEvent.objects.filter(ends__isnull=True).get(), self.event)
+        self.event.ends = self.value
+        self.event.save()
+        self.assertEqual(OffsetEvent.objects.get(pk=self.event.pk).ends, self.value)
+        self.event.ends = None
+        self.event.save()
+        self.assertIsNone(OffsetEvent.objects.get(pk=self.event.pk).ends)
+
+
+class QueryStatisticsTests(TransactionTestCase):
+    available_apps = ['backend']
+
+    def test_parse(self):
+        self.assertEqual(parse_statistics([
+            (3613, 'SQL Server parse and compile time: \n   CPU time = 2 ms, elapsed time = 3 ms.'),
+            (3615, "Table 'item2'. Scan count 1, logical reads 12, physical reads 1, read-ahead reads 0."),
+            (3612, ' SQL Server Execution Times:\n   CPU time = 15 ms,  elapsed time = 20 ms.'),
+            (5701, "Changed database context to 'master'."),
+        ]), {'logical_reads': 12, 'physical_reads': 1, 'cpu_time': 17, 'elapsed_time': 23})
+        self.assertIsNone(parse_statistics([(5701, "Changed database context to 'master'.")]))
+
+    def test_queries(self):
+        Item.objects.bulk_create([Item(name='item%d' % i) for i in range(10)])
+        received = []
+
+        def receiver(sender, connection, sql, statistics, **kwargs):
+            received.append((sql, statistics))
+
+        new_connection = get_connection(query_statistics=True)
+        new_connection.force_debug_cursor = True
+        query_statistics.connect(receiver)
+        try:
+            with new_connection.cursor() as cursor:
+                cursor.execute('SELECT COUNT(*) FROM backend_item')
+                self.assertEqual(cursor.fetchone()[0], 10)
+        finally:
+            query_statistics.disconnect(receiver)
+            new_connection.close()
+        entry = new_connection.queries[-1]
+        self.assertEqual(entry['sql'], 'SELECT COUNT(*) FROM backend_item')
+        self.assertGreater(entry['logical_reads'], 0)
+        for key in ('physical_reads', 'cpu_time', 'elapsed_time'):
+            self.assertIn(key, entry)
+        self.assertEqual(received, [(entry['sql'], dict((key, entry[key]) for key in (
+            'logical_reads', 'physical_reads', 'cpu_time', 'elapsed_time')))])
+
+    def test_disabled(self):
+        with self.assertNumQueries(1):
+            list(Item.objects.all())
+        self.assertNotIn('logical_reads', connection.queries[-1])
+
+    def test_not_logged(self):
+        new_connection = get_connection(query_statistics=True)
+        try:
+            self.assertNotIn('SET STATISTICS IO, TIME ON', new_connection.get_connection_init_sql())
+            with new_connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            self.assertFalse(new_connection._statistics_enabled)
+            new_connection.force_debug_cursor = True
+            with new_connection.cursor() as cursor:
+                cursor.execute('SELECT COUNT(*) FROM backend_item')
+            self.assertTrue(new_connection._statistics_enabled)
+            self.assertIn('logical_reads', new_connection.queries[-1])
+            new_connection.force_debug_cursor = False
+            with new_connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            self.assertFalse(new_connection._statistics_enabled)
+        finally:
+            new_connection.close()
+
+
+class ExplainTests(TestCase):
+    def setUp(self):
+        Item.objects.create(name='a')
+        Item.objects.create(name='b')
+
+    def test_text(self):
+        plan = explain(Item.objects.filter(pk=1))
+        self.assertIn('SELECT', plan.splitlines()[0])
+        self.assertIn('Clustered Index Seek', plan)
+        self.assertIn('rows=', plan)
+        self.assertNotIn('actual rows=', plan)
+        # SHOWPLAN_XML is turned off afterwards
+        self.assertEqual(Item.objects.count(), 2)
+
+    def test_json(self):
+        statements = json.loads(explain(Item.objects.all(), format='json'))
+        self.assertEqual(len(statements), 1)
+        plan = statements[0]['plan']
+        self.assertEqual(plan['access'], 'scan')
+        self.assertIn('[backend_item]', plan['object'])
+        self.assertIsInstance(plan['estimated_rows'], float)
+
+    def test_xml(self):
+        self.assertTrue(explain(Item.objects.all(), format='XML').startswith('<ShowPlanXML'))
+
+    def test_analyze(self):
+        plan = ExplainQuerySet(model=Item).filter(name='a').explain(analyze=True)
+        self.assertIn('actual rows=1', plan)
+
+    def test_invalid(self):
+        with self.assertRaisesMessage(ValueError, "'yaml' is not a recognized format."):
+            explain(Item.objects.all(), format='yaml')
+        with self.assertRaisesMessage(ValueError, 'Unknown options: verbose'):
+            explain(Item.objects.all(), verbose=True)
+
+
+class SlowQueryLogTests(TransactionTestCase):
+    available_apps = ['backend']
+
+    def test_log(self):
+        new_connection = get_connection(slow_query_threshold=0.1)
+        try:
+            with mock.patch('sqlserver.slow_queries.logger') as logger:
+                with new_connection.cursor() as cursor:
+                    cursor.execute('SELECT COUNT(*) FROM backend_item')
+                    self.assertFalse(logger.warning.called)
+                    cursor.execute("WAITFOR DELAY '00:00:00.200'; SELECT COUNT(*) FROM backend_item")
+            self.assertEqual(logger.warning.call_count, 1)
+            extra = logger.warning.call_args[1]['extra']
+            self.assertGreaterEqual(extra['duration'], 0.2)
+            self.assertIn('WAITFOR', extra['sql'])
+            self.assertEqual(extra['caller'].split(':')[0], os.path.abspath(__file__).replace('.pyc', '.py'))
+            self.assertTrue(extra['query_hash'].startswith('0x'))
+            self.assertTrue(extra['query_plan_hash'].startswith('0x'))
+        finally:
+            new_connection.close()
+        self.assertIsNone(new_connection.slow_query_connection.connection)
+
+    def test_failed(self):
+        new_connection = get_connection(slow_query_threshold=0.1)
+        try:
+            with mock.patch('sqlserver.slow_queries.logger') as logger:
+                with new_connection.cursor() as cursor:
+                    with self.assertRaises(DatabaseError):
+                        cursor.execute("WAITFOR DELAY '00:00:00.200'; RAISERROR('failed', 16, 1)")
+            self.assertFalse(logger.warning.called)
+        finally:
+            new_connection.close()
+
+
+class MetricsTests(TransactionTestCase):
+    available_apps = ['backend']
+
+    def test_disabled(self):
+        self.assertIsNone(connection.metrics)
+        with connection.cursor() as cursor:
+            self.assertNotIsInstance(cursor.cursor, MetricsCursor)
+
+    def test_collect(self):
+        Item.objects.bulk_create([Item(name='item%d' % i) for i in range(5)])
+        collector = InMemoryCollector()
+        new_connection = get_connection(metrics=collector)
+        try:
+            new_connection.ensure_connection()
+            self.assertEqual(collector.counters['connections'], 1)
+            self.assertEqual(len(collector.histograms['connect_time']), 1)
+            round_trips = collector.counters['round_trips']
+            with new_connection.cursor() as cursor:
+                cursor.execute('SELECT name FROM backend_item')
+                self.assertEqual(len(cursor.fetchmany(2)), 2)
+                self.assertEqual(len(cursor.fetchall()), 3)
+        finally:
+            new_connection.close()
+        self.assertEqual(collector.counters['round_trips'], round_trips + 1)
+        self.assertEqual(collector.counters['queries'], 1)
+        self.assertEqual(collector.counters['rows_fetched'], 5)
+        self.assertGreater(collector.counters['bytes_sent'], 0)
+        self.assertGreater(collector.counters['bytes_received'], 0)
+        self.assertEqual(len(collector.histograms['query_time']), 1)
+        self.assertEqual(len(collector.histograms['cursor_lifetime']), 1)
+
+    def test_driver_socket(self):
+        # transport class of the installed pytds, its socket is replaced
+        collector = InMemoryCollector()
+        new_connection = get_connection(metrics=collector)
+        sock = mock.Mock(**{'recv.return_value': b'reply'})
+        transport = pytds.tds._TdsSocket()
+        transport._sock = sock
+        instrument_connection(new_connection, mock.Mock(_conn=transport), 0.1)
+        transport.send(b'request', True)
+        self.assertEqual(transport.read(4096), b'reply')
+        transport.send(b'request', True)
+        sock.sendall.assert_called_with(b'request', mock.ANY)
+        self.assertEqual(collector.counters['connections'], 1)
+        self.assertEqual(collector.counters['round_trips'], 2)
+        self.assertEqual(collector.counters['bytes_sent'], 14)
+        self.assertEqual(collector.counters['bytes_received'], 5)
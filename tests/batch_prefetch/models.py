@@ -0,0 +1,24 @@
+from django.db import models
+
+from sqlserver.query import BatchPrefetchQuerySet
+
+
+class Author(models.Model):
+    name = models.CharField(max_length=50)
+
+
+class Tag(models.Model):
+    name = models.CharField(max_length=50)
+
+
+class Book(models.Model):
+    title = models.CharField(max_length=50)
+    author = models.ForeignKey(Author, models.CASCADE, related_name='books')
+    tags = models.ManyToManyField(Tag)
+
+    objects = BatchPrefetchQuerySet.as_manager()
+
+
+class Review(models.Model):
+    book = models.ForeignKey(Book, models.CASCADE, related_name='reviews')
+    text = models.CharField(max_length=50)
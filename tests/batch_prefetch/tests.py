@@ -0,0 +1,55 @@
+from django.db.models import Prefetch
+from django.test import TestCase
+
+from sqlserver.query import prefetch_related_objects
+
+from .models import Author, Book, Review, Tag
+
+
+class BatchPrefetchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author1 = Author.objects.create(name='author1')
+        cls.author2 = Author.objects.create(name='author2')
+        cls.tag1 = Tag.objects.create(name='tag1')
+        cls.tag2 = Tag.objects.create(name='tag2')
+        cls.book1 = Book.objects.create(title='book1', author=cls.author1)
+        cls.book2 = Book.objects.create(title='book2', author=cls.author2)
+        cls.book1.tags.add(cls.tag1, cls.tag2)
+        cls.book2.tags.add(cls.tag2)
+        Review.objects.create(book=cls.book1, text='good')
+        Review.objects.create(book=cls.book1, text='bad')
+
+    def test_same_level(self):
+        # books, then authors, tags and reviews in one batch
+        with self.assertNumQueries(2):
+            books = list(Book.objects.order_by('title').prefetch_related('author', 'tags', 'reviews'))
+        with self.assertNumQueries(0):
+            self.assertEqual([book.author.name for book in books], ['author1', 'author2'])
+            self.assertEqual(sorted(tag.name for tag in books[0].tags.all()), ['tag1', 'tag2'])
+            self.assertEqual([tag.name for tag in books[1].tags.all()], ['tag2'])
+            self.assertEqual(sorted(review.text for review in books[0].reviews.all()), ['bad', 'good'])
+            self.assertEqual(list(books[1].reviews.all()), [])
+
+    def test_nested(self):
+        # authors, books, then tags and reviews of books in one batch
+        with self.assertNumQueries(3):
+            authors = list(Author.objects.order_by('name'))
+            prefetch_related_objects(authors, 'books__tags', 'books__reviews')
+        with self.assertNumQueries(0):
+            self.assertEqual([book.title for book in authors[0].books.all()], ['book1'])
+            self.assertEqual(len(authors[0].books.all()[0].reviews.all()), 2)
+            self.assertEqual([tag.name for tag in authors[1].books.all()[0].tags.all()], ['tag2'])
+
+    def test_prefetch_object(self):
+        with self.assertNumQueries(2):
+            books = list(Book.objects.order_by('title').prefetch_related(
+                Prefetch('tags', queryset=Tag.objects.filter(name='tag1'), to_attr='first_tags'),
+                'reviews',
+            ))
+        self.assertEqual([tag.name for tag in books[0].first_tags], ['tag1'])
+        self.assertEqual(books[1].first_tags, [])
+
+    def test_duplicate_lookup_with_queryset(self):
+        with self.assertRaises(ValueError):
+            list(Book.objects.prefetch_related('tags', Prefetch('tags', queryset=Tag.objects.all())))
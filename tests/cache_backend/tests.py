@@ -0,0 +1,87 @@
+import time
+
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from sqlserver.cache import DatabaseCache
+
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'sqlserver.cache.DatabaseCache',
+        'LOCATION': 'test_cache_table',
+        'OPTIONS': {'MAX_ENTRIES': 30, 'CULL_INTERVAL': 0},
+    },
+})
+class DatabaseCacheTests(TestCase):
+    def setUp(self):
+        call_command('createcachetable', verbosity=0)
+        self.cache = caches['default']
+
+    def count_rows(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM [test_cache_table]')
+            return cursor.fetchone()[0]
+
+    def test_backend(self):
+        self.assertIsInstance(self.cache, DatabaseCache)
+
+    def test_set_get(self):
+        self.cache.set('key', 'value')
+        self.assertEqual(self.cache.get('key'), 'value')
+        self.cache.set('key', {'a': [1, 2]})
+        self.assertEqual(self.cache.get('key'), {'a': [1, 2]})
+        self.assertTrue(self.cache.has_key('key'))
+        self.assertIsNone(self.cache.get('missing'))
+        self.assertFalse(self.cache.has_key('missing'))
+        self.cache.delete('key')
+        self.assertEqual(self.cache.get('key', 'default'), 'default')
+
+    def test_add(self):
+        self.assertTrue(self.cache.add('key', 'value'))
+        self.assertFalse(self.cache.add('key', 'other'))
+        self.assertEqual(self.cache.get('key'), 'value')
+        self.cache.set('expired', 'value', timeout=0)
+        self.assertTrue(self.cache.add('expired', 'new'))
+        self.assertEqual(self.cache.get('expired'), 'new')
+
+    def test_expired(self):
+        self.cache.set('key', 'value', timeout=0)
+        self.assertIsNone(self.cache.get('key'))
+        self.assertFalse(self.cache.has_key('key'))
+        self.assertEqual(self.cache.get_many(['key']), {})
+
+    def test_many(self):
+        # more keys than parameters allowed in a single statement
+        data = dict(('key%d' % i, i) for i in range(2500))
+        self.cache.set_many(data)
+        self.assertEqual(self.cache.get_many(list(data) + ['missing']), data)
+        self.cache.delete_many(list(data)[:1000])
+        self.assertEqual(len(self.cache.get_many(list(data))), 1500)
+
+    def test_cull_expired(self):
+        for i in range(10):
+            self.cache.set('expired%d' % i, i, timeout=0)
+        self.cache.set('key', 'value')
+        self.assertEqual(self.count_rows(), 1)
+
+    def assertNumStatements(self, num, func, *args, **kwargs):
+        # savepoints are created because tests run in a transaction
+        with CaptureQueriesContext(connection) as context:
+            result = func(*args, **kwargs)
+        statements = [query for query in context.captured_queries if 'SAVE TRANSACTION' not in query['sql']]
+        self.assertEqual(len(statements), num, statements)
+        return result
+
+    def test_set_is_single_statement(self):
+        self.cache._cull_interval = 60
+        self.cache._last_cull = time.time()
+        self.assertNumStatements(1, self.cache.set, 'key', 'value')
+        self.assertNumStatements(1, self.cache.set_many, {'key1': 1, 'key2': 2})
+        self.assertEqual(
+            self.assertNumStatements(1, self.cache.get_many, ['key', 'key1', 'key2']),
+            {'key': 'value', 'key1': 1, 'key2': 2},
+        )
@@ -5,6 +5,8 @@ import datetime
 from django.db import connection, models, transaction
 from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
 
+from sqlserver.query import delete_all
+
 from .models import (
     Award, AwardNote, Book, Child, Eaten, Email, File, Food, FooFile,
     FooFileProxy, FooImage, FooPhoto, House, Image, Item, Location, Login,
@@ -345,3 +347,40 @@ class OrderedDeleteTests(TestCase):
         OrderedPerson.objects.create(name='Bob', lives_in=h)
         OrderedPerson.objects.filter(lives_in__address='Foo').delete()
         self.assertEqual(OrderedPerson.objects.count(), 0)
+
+
+class DeleteAllTests(TestCase):
+    def test_truncate(self):
+        Book.objects.bulk_create([Book(pagecount=i) for i in range(5)])
+        last_pk = Book.objects.order_by('-pk')[0].pk
+        # referencing tables, savepoint which is rolled back if TRUNCATE TABLE
+        # fails, TRUNCATE TABLE and logged release of the savepoint
+        with self.assertNumQueries(4):
+            self.assertEqual(delete_all(Book.objects.all()), (5, {'delete_regress.Book': 5}))
+        self.assertFalse(Book.objects.exists())
+        self.assertGreater(Book.objects.create(pagecount=1).pk, last_pk)
+
+    def test_truncate_not_allowed(self):
+        Book.objects.bulk_create([Book(pagecount=i) for i in range(5)])
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE USER [delete_all_user] WITHOUT LOGIN')
+            cursor.execute('GRANT SELECT, DELETE ON [delete_regress_book] TO [delete_all_user]')
+            # TRUNCATE TABLE requires ALTER permission
+            cursor.execute("EXECUTE AS USER = 'delete_all_user'")
+            try:
+                self.assertEqual(delete_all(Book.objects.all()), (5, {'delete_regress.Book': 5}))
+            finally:
+                cursor.execute('REVERT')
+        self.assertFalse(Book.objects.exists())
+
+    def test_reseed_identity(self):
+        Book.objects.bulk_create([Book(pagecount=i) for i in range(5)])
+        delete_all(Book.objects.all(), reseed_identity=True)
+        self.assertEqual(Book.objects.create(pagecount=1).pk, 1)
+
+    def test_not_applicable(self):
+        Book.objects.create(pagecount=1)
+        self.assertIsNone(delete_all(Book.objects.filter(pagecount=1)))
+        # cascades have to be collected by Django
+        self.assertIsNone(delete_all(Food.objects.all()))
+        self.assertTrue(Book.objects.exists())
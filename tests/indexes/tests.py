@@ -1,12 +1,25 @@
+import datetime
 from unittest import skipUnless
 
-from django.db import connection
+import django
+from django.db import IntegrityError, connection, models, transaction
 from django.db.models.deletion import CASCADE
 from django.db.models.fields.related import ForeignKey
-from django.test import TestCase, TransactionTestCase
+from django.test import TestCase, TransactionTestCase, mock
 
 from .models import Article, ArticleTranslation, IndexTogetherSingleList
 
+if django.VERSION >= (1, 11, 0):
+    from django.test.utils import isolate_apps
+
+    from sqlserver.indexes import ColumnstoreIndex, Index, Q, UniqueIndex
+else:
+    def isolate_apps(*app_labels):
+        # tests using it are skipped by requires_meta_indexes
+        return lambda obj: obj
+
+requires_meta_indexes = skipUnless(django.VERSION >= (1, 11, 0), 'Meta.indexes require Django 1.11')
+
 
 class SchemaIndexesTests(TestCase):
     """
@@ -123,3 +136,349 @@ class SchemaIndexesMySQLTests(TransactionTestCase):
             if field_created:
                 with connection.schema_editor() as editor:
                     editor.remove_field(ArticleTranslation, new_field)
+
+
+@requires_meta_indexes
+class ColumnstoreIndexTests(TestCase):
+    @isolate_apps('indexes')
+    def test_clustered_create_sql(self):
+        class Fact(models.Model):
+            amount = models.IntegerField()
+
+            class Meta:
+                app_label = 'indexes'
+                indexes = [ColumnstoreIndex(clustered=True, name='fact_csi')]
+
+        editor = connection.schema_editor()
+        self.assertEqual(
+            Fact._meta.indexes[0].create_sql(Fact, editor),
+            'CREATE CLUSTERED COLUMNSTORE INDEX [fact_csi] ON [indexes_fact]',
+        )
+        self.assertIn('PRIMARY KEY NONCLUSTERED', editor.column_sql(Fact, Fact._meta.pk)[0])
+
+    def test_nonclustered_create_sql(self):
+        index = ColumnstoreIndex(fields=['headline', 'pub_date'], name='article_csi')
+        self.assertEqual(
+            index.create_sql(Article, connection.schema_editor()),
+            'CREATE NONCLUSTERED COLUMNSTORE INDEX [article_csi] ON [indexes_article] ([headline], [pub_date])',
+        )
+        self.assertIn('PRIMARY KEY', connection.schema_editor().column_sql(Article, Article._meta.pk)[0])
+        self.assertNotIn('NONCLUSTERED', connection.schema_editor().column_sql(Article, Article._meta.pk)[0])
+
+    def test_deconstruct(self):
+        index = ColumnstoreIndex(clustered=True, name='fact_csi')
+        self.assertEqual(
+            index.deconstruct(),
+            ('sqlserver.indexes.ColumnstoreIndex', (), {'name': 'fact_csi', 'clustered': True}),
+        )
+        self.assertEqual(index, index.clone())
+        index = ColumnstoreIndex(fields=['headline'], name='article_csi')
+        self.assertEqual(
+            index.deconstruct(),
+            ('sqlserver.indexes.ColumnstoreIndex', (), {'fields': ['headline'], 'name': 'article_csi'}),
+        )
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            ColumnstoreIndex(fields=['headline'], clustered=True)
+        with self.assertRaises(ValueError):
+            ColumnstoreIndex(fields=['-headline'])
+
+    def test_introspection(self):
+        index = ColumnstoreIndex(fields=['headline', 'pub_date'], name='article_csi')
+        with connection.schema_editor() as editor:
+            editor.add_index(Article, index)
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, Article._meta.db_table)
+        self.assertEqual(constraints['article_csi']['type'], ColumnstoreIndex.suffix)
+        self.assertEqual(sorted(constraints['article_csi']['columns']), ['headline', 'pub_date'])
+        with connection.schema_editor() as editor:
+            editor.remove_index(Article, index)
+
+
+@requires_meta_indexes
+class FilteredIndexTests(TestCase):
+    def test_create_sql(self):
+        index = Index(fields=['pub_date'], name='article_pending_idx', condition=Q(headline='pending'))
+        self.assertEqual(
+            index.create_sql(Article, connection.schema_editor()),
+            "CREATE INDEX [article_pending_idx] ON [indexes_article] ([pub_date]) WHERE [headline] = N'pending'",
+        )
+        index = UniqueIndex(fields=['headline'], name='article_headline_unq', condition=Q(headline__isnull=False))
+        self.assertEqual(
+            index.create_sql(Article, connection.schema_editor()),
+            "CREATE UNIQUE INDEX [article_headline_unq] ON [indexes_article] ([headline]) "
+            "WHERE [headline] IS NOT NULL",
+        )
+
+    def test_deconstruct(self):
+        index = Index(fields=['pub_date'], name='article_pending_idx', condition=models.Q(headline='pending'))
+        path, args, kwargs = index.deconstruct()
+        self.assertEqual(path, 'sqlserver.indexes.Index')
+        self.assertEqual(kwargs['condition'], Q(headline='pending'))
+        self.assertEqual(index, index.clone())
+        self.assertNotEqual(index, Index(fields=['pub_date'], name='article_pending_idx'))
+
+    def test_unique_with_condition(self):
+        index = UniqueIndex(fields=['headline'], name='article_headline_unq', condition=Q(headline='pending'))
+        with connection.schema_editor() as editor:
+            editor.add_index(Article, index)
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, Article._meta.db_table)
+        self.assertTrue(constraints['article_headline_unq']['unique'])
+        self.assertTrue(constraints['article_headline_unq']['condition'])
+        self.assertIn(
+            'article_headline_unq',
+            connection.schema_editor()._constraint_names(Article, ['headline'], unique=True),
+        )
+        pub_date = datetime.datetime(2017, 1, 1)
+        Article.objects.create(headline='done', pub_date=pub_date)
+        Article.objects.create(headline='done', pub_date=pub_date)
+        Article.objects.create(headline='pending', pub_date=pub_date)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Article.objects.create(headline='pending', pub_date=pub_date)
+        with connection.schema_editor() as editor:
+            editor.remove_index(Article, index)
+
+    @isolate_apps('indexes')
+    def test_remove_field(self):
+        class Task(models.Model):
+            name = models.CharField(max_length=50)
+            status = models.CharField(max_length=10)
+            due = models.DateTimeField()
+
+            class Meta:
+                app_label = 'indexes'
+                indexes = [
+                    Index(fields=['due'], name='task_pending_idx', condition=Q(status='pending')),
+                    Index(fields=['status'], name='task_status_idx', condition=Q(status__isnull=False)),
+                ]
+
+        with connection.schema_editor() as editor:
+            editor.create_model(Task)
+            editor.remove_field(Task, Task._meta.get_field('status'))
+        with connection.cursor() as cursor:
+            columns = [info.name for info in connection.introspection.get_table_description(cursor, 'indexes_task')]
+            constraints = connection.introspection.get_constraints(cursor, 'indexes_task')
+        self.assertNotIn('status', columns)
+        self.assertNotIn('task_pending_idx', constraints)
+        self.assertNotIn('task_status_idx', constraints)
+
+    @isolate_apps('indexes')
+    def test_alter_field(self):
+        class Task(models.Model):
+            status = models.CharField(max_length=10, db_index=True)
+
+            class Meta:
+                app_label = 'indexes'
+                indexes = [Index(fields=['status'], name='task_status_idx', condition=Q(status__isnull=False))]
+
+        old_field = Task._meta.get_field('status')
+        new_field = models.CharField(max_length=20)
+        new_field.set_attributes_from_name('status')
+        with connection.schema_editor() as editor:
+            editor.create_model(Task)
+            # only the index created for db_index is dropped, the filtered
+            # index is created again after the type change
+            editor.alter_field(Task, old_field, new_field, strict=True)
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, 'indexes_task')
+        self.assertEqual(
+            [name for name, info in constraints.items() if info['index'] and info['columns'] == ['status']],
+            ['task_status_idx'],
+        )
+
+
+@requires_meta_indexes
+class CoveringIndexTests(TestCase):
+    def test_create_sql(self):
+        index = Index(fields=['-pub_date'], name='article_covering_idx', include=['headline'])
+        self.assertEqual(
+            index.create_sql(Article, connection.schema_editor()),
+            "CREATE INDEX [article_covering_idx] ON [indexes_article] ([pub_date] DESC) INCLUDE ([headline])",
+        )
+        index = UniqueIndex(
+            fields=['headline'], name='article_headline_unq',
+            include=['pub_date'], condition=Q(headline__isnull=False),
+        )
+        self.assertEqual(
+            index.create_sql(Article, connection.schema_editor()),
+            "CREATE UNIQUE INDEX [article_headline_unq] ON [indexes_article] ([headline]) "
+            "INCLUDE ([pub_date]) WHERE [headline] IS NOT NULL",
+        )
+
+    def test_deconstruct(self):
+        index = Index(fields=['pub_date'], name='article_covering_idx', include=('headline',))
+        path, args, kwargs = index.deconstruct()
+        self.assertEqual(path, 'sqlserver.indexes.Index')
+        self.assertEqual(kwargs, {'fields': ['pub_date'], 'name': 'article_covering_idx', 'include': ['headline']})
+        self.assertEqual(index, index.clone())
+
+    def test_invalid_arguments(self):
+        with self.assertRaisesMessage(ValueError, 'Index.include must be a list or tuple.'):
+            Index(fields=['pub_date'], include='headline')
+        with self.assertRaisesMessage(ValueError, 'Index.include can not contain key fields.'):
+            Index(fields=['-pub_date'], include=['pub_date'])
+
+    def test_introspection(self):
+        index = Index(fields=['pub_date'], name='article_covering_idx', include=['headline'])
+        with connection.schema_editor() as editor:
+            editor.add_index(Article, index)
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, Article._meta.db_table)
+        self.assertEqual(constraints['article_covering_idx']['columns'], ['pub_date'])
+        self.assertEqual(constraints['article_covering_idx']['include'], ['headline'])
+        with connection.schema_editor() as editor:
+            editor.remove_index(Article, index)
+
+
+@requires_meta_indexes
+class IndexOptionsTests(TestCase):
+    def setUp(self):
+        self.options = connection.settings_dict.setdefault('OPTIONS', {})
+        self.addCleanup(self.options.pop, 'index_options', None)
+
+    def test_index_options(self):
+        index = Index(fields=['headline'], name='article_headline_idx', online=True, maxdop=4)
+        self.assertEqual(
+            index.create_sql(Article, connection.schema_editor()),
+            "CREATE INDEX [article_headline_idx] ON [indexes_article] ([headline]) WITH (ONLINE = ON, MAXDOP = 4)",
+        )
+        path, args, kwargs = index.deconstruct()
+        self.assertEqual(kwargs['online'], True)
+        self.assertEqual(kwargs['maxdop'], 4)
+        self.assertNotIn('resumable', kwargs)
+
+    def test_settings_index_options(self):
+        self.options['index_options'] = {'online': True, 'sort_in_tempdb': True}
+        index = models.Index(fields=['headline'], name='article_headline_idx')
+        self.assertEqual(
+            index.create_sql(Article, connection.schema_editor()),
+            "CREATE INDEX [article_headline_idx] ON [indexes_article] ([headline]) "
+            "WITH (ONLINE = ON, SORT_IN_TEMPDB = ON)",
+        )
+        index = Index(fields=['headline'], name='article_headline_idx', online=False)
+        self.assertEqual(
+            index.create_sql(Article, connection.schema_editor()),
+            "CREATE INDEX [article_headline_idx] ON [indexes_article] ([headline]) WITH (SORT_IN_TEMPDB = ON)",
+        )
+
+    def test_data_compression(self):
+        index = Index(fields=['headline'], name='article_headline_idx', data_compression='page')
+        self.assertEqual(
+            index.create_sql(Article, connection.schema_editor()),
+            "CREATE INDEX [article_headline_idx] ON [indexes_article] ([headline]) WITH (DATA_COMPRESSION = PAGE)",
+        )
+        self.assertEqual(index.deconstruct()[2]['data_compression'], 'page')
+        index = ColumnstoreIndex(fields=['headline'], name='article_csi', data_compression='columnstore_archive')
+        self.assertEqual(
+            index.create_sql(Article, connection.schema_editor()),
+            "CREATE NONCLUSTERED COLUMNSTORE INDEX [article_csi] ON [indexes_article] ([headline]) "
+            "WITH (DATA_COMPRESSION = COLUMNSTORE_ARCHIVE)",
+        )
+        with self.assertRaises(ValueError):
+            Index(fields=['headline'], data_compression='columnstore')
+        with self.assertRaises(ValueError):
+            ColumnstoreIndex(fields=['headline'], data_compression='page')
+
+    @isolate_apps('indexes')
+    def test_clustered_columnstore_data_compression(self):
+        class Fact(models.Model):
+            amount = models.IntegerField()
+
+            class Meta:
+                app_label = 'indexes'
+                data_compression = 'page'
+                indexes = [ColumnstoreIndex(clustered=True, name='fact_csi')]
+
+        editor = connection.schema_editor()
+        # rowstore compression of the table is not applied to columnstore index
+        self.assertEqual(
+            Fact._meta.indexes[0].create_sql(Fact, editor),
+            'CREATE CLUSTERED COLUMNSTORE INDEX [fact_csi] ON [indexes_fact]',
+        )
+        message = "Columnstore data compression must be one of 'columnstore', 'columnstore_archive', not 'page'."
+        with self.assertRaisesMessage(ValueError, message):
+            editor.create_model(Fact)
+        Fact._meta.data_compression = 'columnstore_archive'
+        self.assertEqual(
+            Fact._meta.indexes[0].create_sql(Fact, editor),
+            'CREATE CLUSTERED COLUMNSTORE INDEX [fact_csi] ON [indexes_fact] '
+            'WITH (DATA_COMPRESSION = COLUMNSTORE_ARCHIVE)',
+        )
+
+    def test_settings_data_compression(self):
+        self.options['index_options'] = {'data_compression': 'page'}
+        index = models.Index(fields=['headline'], name='article_headline_idx')
+        self.assertEqual(
+            index.create_sql(Article, connection.schema_editor()),
+            "CREATE INDEX [article_headline_idx] ON [indexes_article] ([headline]) WITH (DATA_COMPRESSION = PAGE)",
+        )
+        # rowstore compression from settings is not applied to columnstore index
+        index = ColumnstoreIndex(fields=['headline'], name='article_csi')
+        self.assertEqual(
+            index.create_sql(Article, connection.schema_editor()),
+            "CREATE NONCLUSTERED COLUMNSTORE INDEX [article_csi] ON [indexes_article] ([headline])",
+        )
+        self.options['index_options'] = {'data_compression': 'columnstore'}
+        index = models.Index(fields=['headline'], name='article_headline_idx')
+        message = "Rowstore data compression must be one of 'none', 'row', 'page', not 'columnstore'."
+        with self.assertRaisesMessage(ValueError, message):
+            index.create_sql(Article, connection.schema_editor())
+
+    def test_columnstore_online(self):
+        self.options['index_options'] = {'online': True, 'resumable': True}
+        features = connection.features
+        index = ColumnstoreIndex(fields=['headline'], name='article_csi')
+        with mock.patch.object(features, 'supports_online_nonclustered_columnstore_index', True):
+            self.assertEqual(
+                index.create_sql(Article, connection.schema_editor()),
+                "CREATE NONCLUSTERED COLUMNSTORE INDEX [article_csi] ON [indexes_article] ([headline]) "
+                "WITH (ONLINE = ON)",
+            )
+        with mock.patch.object(features, 'supports_online_nonclustered_columnstore_index', False):
+            with mock.patch('warnings.warn') as warn:
+                sql = index.create_sql(Article, connection.schema_editor())
+        self.assertEqual(
+            sql, "CREATE NONCLUSTERED COLUMNSTORE INDEX [article_csi] ON [indexes_article] ([headline])")
+        self.assertEqual(warn.call_count, 1)
+        index = ColumnstoreIndex(clustered=True, name='article_csi')
+        with mock.patch.object(features, 'supports_online_clustered_columnstore_index', False):
+            with mock.patch('warnings.warn'):
+                sql = index.create_sql(Article, connection.schema_editor())
+        self.assertEqual(sql, "CREATE CLUSTERED COLUMNSTORE INDEX [article_csi] ON [indexes_article]")
+
+    def test_resumable_in_transaction(self):
+        index = Index(fields=['headline'], name='article_headline_idx', resumable=True)
+        with mock.patch('warnings.warn') as warn:
+            sql = index.create_sql(Article, connection.schema_editor())
+        self.assertEqual(sql, "CREATE INDEX [article_headline_idx] ON [indexes_article] ([headline])")
+        self.assertEqual(warn.call_count, 1)
+
+    def test_resumable_warning_once(self):
+        self.options['index_options'] = {'resumable': True}
+        index = Index(fields=['headline'], name='article_headline_idx')
+        with mock.patch('warnings.warn') as warn:
+            with connection.schema_editor(collect_sql=True) as editor:
+                editor.add_index(Article, index)
+        self.assertEqual(warn.call_count, 1)
+        with mock.patch('warnings.warn') as warn:
+            editor._create_index_sql(Article, [Article._meta.get_field('headline')])
+        self.assertEqual(warn.call_count, 1)
+
+    def test_resumable_sort_in_tempdb(self):
+        index = Index(fields=['headline'], name='article_headline_idx', resumable=True, sort_in_tempdb=True)
+        with mock.patch.object(connection, 'in_atomic_block', False):
+            with self.assertRaisesMessage(ValueError, 'Resumable index build can not use sort_in_tempdb.'):
+                index.create_sql(Article, connection.schema_editor())
+
+    def test_resume_paused_build(self):
+        editor = connection.schema_editor()
+        options = {'resumable': True, 'maxdop': 2}
+        with mock.patch.object(editor, '_is_index_build_paused', return_value=True):
+            self.assertEqual(
+                editor._resume_index_sql(Article, 'article_headline_idx', options),
+                "ALTER INDEX [article_headline_idx] ON [indexes_article] RESUME WITH (MAXDOP = 2)",
+            )
+        with mock.patch.object(editor, '_is_index_build_paused', return_value=False):
+            self.assertIsNone(editor._resume_index_sql(Article, 'article_headline_idx', options))
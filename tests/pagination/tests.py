@@ -11,9 +11,13 @@ from django.core.paginator import (
 if django.VERSION >= (1, 11, 0):
     from django.core.paginator import UnorderedObjectListWarning
 
+from django.db.models import Count
 from django.test import TestCase
 from django.utils import six
 
+from sqlserver.paginator import ApproximateCountPaginator, CountOverPaginator
+from sqlserver.query import approximate_count, estimated_count
+
 from .custom import ValidAdjacentNumsPaginator
 from .models import Article
 
@@ -360,3 +364,80 @@ class ModelPaginationTests(TestCase):
             "Pagination may yield inconsistent results with an unordered "
             "object_list: {!r}.".format(object_list)
         ))
+
+
+class ApproximateCountTests(TestCase):
+    def setUp(self):
+        for x in range(1, 10):
+            Article.objects.create(headline='Article %s' % x, pub_date=datetime(2005, 7, 29))
+
+    def test_estimated_count(self):
+        self.assertIsInstance(estimated_count(Article.objects.all()), six.integer_types)
+        self.assertIsNone(estimated_count(Article.objects.filter(headline='Article 1')))
+        self.assertIsNone(estimated_count(Article.objects.all()[:5]))
+        self.assertIsNone(estimated_count(Article.objects.distinct()))
+
+    def test_approximate_count_falls_back_to_exact(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(approximate_count(Article.objects.filter(headline='Article 1')), 1)
+
+    def test_paginator_below_threshold(self):
+        paginator = ApproximateCountPaginator(Article.objects.order_by('id'), 5)
+        self.assertEqual(paginator.count, 9)
+        self.assertEqual(paginator.num_pages, 2)
+
+    def test_paginator_above_threshold(self):
+        estimate = estimated_count(Article.objects.all())
+        paginator = ApproximateCountPaginator(Article.objects.order_by('id'), 5, approximate_count_threshold=-1)
+        with self.assertNumQueries(1):
+            self.assertEqual(paginator.count, estimate)
+
+
+class CountOverPaginatorTests(TestCase):
+    def setUp(self):
+        for x in range(1, 10):
+            Article.objects.create(headline='Article %s' % x, pub_date=datetime(2005, 7, 29))
+
+    def test_single_query(self):
+        paginator = CountOverPaginator(Article.objects.order_by('id'), 5)
+        with self.assertNumQueries(1):
+            p = paginator.page(2)
+            self.assertEqual(paginator.count, 9)
+            self.assertEqual("<Page 2 of 2>", six.text_type(p))
+            self.assertEqual([a.headline for a in p], ['Article %s' % x for x in range(6, 10)])
+
+    def test_orphans(self):
+        paginator = CountOverPaginator(Article.objects.order_by('id'), 4, orphans=1)
+        with self.assertNumQueries(1):
+            p = paginator.page(2)
+            self.assertEqual(len(p), 5)
+            self.assertFalse(p.has_next())
+
+    def test_empty_page(self):
+        paginator = CountOverPaginator(Article.objects.order_by('id'), 5)
+        with self.assertNumQueries(2):
+            with self.assertRaises(EmptyPage):
+                paginator.page(3)
+        paginator = CountOverPaginator(Article.objects.filter(headline='missing').order_by('id'), 5)
+        with self.assertNumQueries(2):
+            self.assertEqual(len(paginator.page(1)), 0)
+
+    def test_aggregated_queryset(self):
+        queryset = Article.objects.values('headline').annotate(n=Count('id')).order_by('headline')
+        paginator = CountOverPaginator(queryset, 5)
+        # values() querysets are counted separately
+        with self.assertNumQueries(2):
+            self.assertEqual(len(paginator.page(2)), 4)
+        paginator = CountOverPaginator(Article.objects.annotate(n=Count('id')).order_by('id'), 5)
+        with self.assertNumQueries(1):
+            p = paginator.page(2)
+            self.assertEqual(paginator.count, 9)
+            self.assertEqual([(a.headline, a.n) for a in p], [('Article %s' % x, 1) for x in range(6, 10)])
+
+    def test_invalid_page_number(self):
+        paginator = CountOverPaginator(Article.objects.order_by('id'), 5)
+        with self.assertNumQueries(0):
+            with self.assertRaises(PageNotAnInteger):
+                paginator.page('x')
+            with self.assertRaises(EmptyPage):
+                paginator.page(0)
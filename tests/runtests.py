@@ -63,6 +63,7 @@ ALWAYS_INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.admin.apps.SimpleAdminConfig',
     'django.contrib.staticfiles',
+    'sqlserver',
 ]
 
 ALWAYS_MIDDLEWARE = [
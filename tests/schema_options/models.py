@@ -0,0 +1,46 @@
+import django
+from django.db import models
+
+if django.VERSION >= (1, 11, 0):
+    from sqlserver.indexes import HashIndex
+
+
+class History(models.Model):
+    event = models.CharField(max_length=100)
+    created = models.DateTimeField()
+
+    class Meta:
+        data_compression = 'page'
+
+
+class Event(models.Model):
+    name = models.CharField(max_length=100, db_index=True)
+    created = models.DateTimeField()
+
+    class Meta:
+        # table is created by tests after partition scheme
+        managed = False
+        partition_scheme = 'schema_options_ps'
+        partition_field = 'created'
+
+
+class RateLimit(models.Model):
+    key = models.CharField(max_length=100, unique=True)
+    hits = models.IntegerField()
+    expires = models.DateTimeField(db_index=True)
+
+    class Meta:
+        # database needs MEMORY_OPTIMIZED_DATA filegroup for this table
+        managed = False
+        memory_optimized = True
+        durability = 'schema_only'
+        if django.VERSION >= (1, 11, 0):
+            indexes = [HashIndex(fields=['key'], name='ratelimit_key_hsh', bucket_count=1024)]
+
+
+class Legacy(models.Model):
+    created = models.DateTimeField(null=True)
+
+    class Meta:
+        # table with datetime column is created by tests
+        managed = False
@@ -0,0 +1,244 @@
+import datetime
+from unittest import skipUnless
+
+import django
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, migrations
+from django.db.migrations.state import ProjectState
+from django.test import TestCase
+from django.utils.six import StringIO
+
+from sqlserver.operations import AlterDataCompression, CreatePartitionFunction, CreatePartitionScheme
+
+from .models import Event, History, Legacy, RateLimit
+
+if django.VERSION >= (1, 11, 0):
+    from sqlserver.indexes import ColumnstoreIndex, HashIndex, Index, Q, UniqueIndex
+
+
+class DataCompressionTests(TestCase):
+    def get_data_compression(self):
+        with connection.cursor() as cursor:
+            return connection.introspection.get_data_compression(cursor, History._meta.db_table)
+
+    def test_create_model(self):
+        with connection.schema_editor(collect_sql=True) as editor:
+            editor.create_model(History)
+        self.assertTrue(editor.collected_sql[0].endswith('WITH (DATA_COMPRESSION = PAGE);'))
+        self.assertEqual(self.get_data_compression(), 'page')
+
+    def test_alter_data_compression(self):
+        with connection.schema_editor() as editor:
+            editor.alter_data_compression(History, 'page', 'row')
+        self.assertEqual(self.get_data_compression(), 'row')
+        with connection.schema_editor(collect_sql=True) as editor:
+            editor.alter_data_compression(History, 'row', 'row')
+        self.assertEqual(editor.collected_sql, [])
+        with connection.schema_editor() as editor:
+            editor.alter_data_compression(History, 'row', 'page')
+        self.assertEqual(self.get_data_compression(), 'page')
+
+    def test_operation(self):
+        project_state = ProjectState()
+        project_state.add_model(migrations.state.ModelState.from_model(History))
+        operation = AlterDataCompression('History', 'row')
+        self.assertEqual(operation.describe(), 'Alter data compression of History to row')
+        new_state = project_state.clone()
+        operation.state_forwards('schema_options', new_state)
+        self.assertEqual(new_state.models['schema_options', 'history'].options['data_compression'], 'row')
+        self.assertEqual(new_state.apps.get_model('schema_options', 'History')._meta.data_compression, 'row')
+        with connection.schema_editor() as editor:
+            operation.database_forwards('schema_options', editor, project_state, new_state)
+        self.assertEqual(self.get_data_compression(), 'row')
+        with connection.schema_editor() as editor:
+            operation.database_backwards('schema_options', editor, new_state, project_state)
+        self.assertEqual(self.get_data_compression(), 'page')
+        name, args, kwargs = operation.deconstruct()
+        self.assertEqual(name, 'AlterDataCompression')
+        self.assertEqual(kwargs, {'name': 'History', 'data_compression': 'row'})
+
+
+class PartitioningTests(TestCase):
+    def test_create_model_sql(self):
+        with connection.schema_editor(collect_sql=True) as editor:
+            editor.create_model(Event)
+        self.assertEqual(editor.collected_sql[0], (
+            "CREATE TABLE [schema_options_event] ([id] int IDENTITY (1, 1) NOT NULL, "
+            "[name] nvarchar(100) NOT NULL, [created] datetime2 NOT NULL, "
+            "CONSTRAINT [schema_options_event_id_f3fa2420_pk] PRIMARY KEY ([id], [created])) "
+            "ON [schema_options_ps]([created]);"
+        ))
+        self.assertTrue(editor.collected_sql[1].endswith(' ON [schema_options_ps]([created]);'))
+
+    def test_sliding_window(self):
+        operations = [
+            CreatePartitionFunction('schema_options_pf', 'datetime2', ['2017-01-01', '2017-02-01']),
+            CreatePartitionScheme('schema_options_ps', 'schema_options_pf'),
+        ]
+        with connection.schema_editor() as editor:
+            for operation in operations:
+                operation.database_forwards('schema_options', editor, ProjectState(), ProjectState())
+            editor.create_model(Event)
+        with connection.cursor() as cursor:
+            self.assertEqual(connection.introspection.get_partitioning(cursor, Event._meta.db_table), {
+                'scheme': 'schema_options_ps',
+                'function': 'schema_options_pf',
+                'column': 'created',
+            })
+        for month in (1, 2, 3):
+            Event.objects.create(name='event', created=datetime.datetime(2017, month, 15))
+        out = StringIO()
+        call_command('partition', 'split', 'schema_options.Event', '2017-03-01', stdout=out)
+        self.assertEqual(out.getvalue(), 'Added boundary 2017-03-01 to partition function schema_options_pf.\n')
+        call_command('partition', 'truncate', 'schema_options.Event', '2017-01-15', stdout=StringIO())
+        self.assertEqual(Event.objects.filter(created__lt=datetime.datetime(2017, 2, 1)).count(), 0)
+        self.assertEqual(Event.objects.count(), 2)
+        call_command('partition', 'merge', 'schema_options.Event', '2017-01-01', stdout=StringIO())
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT COUNT(*) FROM sys.partitions WHERE object_id = OBJECT_ID(%s) AND index_id IN (0, 1)",
+                [Event._meta.db_table],
+            )
+            self.assertEqual(cursor.fetchone()[0], 3)
+
+
+@skipUnless(django.VERSION >= (1, 11, 0), 'Meta.indexes require Django 1.11')
+class MemoryOptimizedTests(TestCase):
+    def test_create_model_sql(self):
+        with connection.schema_editor(collect_sql=True) as editor:
+            editor.create_model(RateLimit)
+        self.assertEqual(editor.collected_sql, [
+            "CREATE TABLE [schema_options_ratelimit] ([id] int IDENTITY (1, 1) NOT NULL PRIMARY KEY NONCLUSTERED, "
+            "[key] nvarchar(100) NOT NULL UNIQUE, [hits] int NOT NULL, [expires] datetime2 NOT NULL, "
+            "INDEX [schema_options_ratelimit_expires_4128d0c3] NONCLUSTERED ([expires]), "
+            "INDEX [ratelimit_key_hsh] HASH ([key]) WITH (BUCKET_COUNT = 1024)) "
+            "WITH (MEMORY_OPTIMIZED = ON, DURABILITY = SCHEMA_ONLY);",
+        ])
+
+    def test_add_remove_index_sql(self):
+        index = Index(fields=['-hits'], name='ratelimit_hits_idx')
+        with connection.schema_editor(collect_sql=True) as editor:
+            editor.add_index(RateLimit, index)
+            editor.remove_index(RateLimit, index)
+        self.assertEqual(editor.collected_sql, [
+            "ALTER TABLE [schema_options_ratelimit] ADD INDEX [ratelimit_hits_idx] NONCLUSTERED ([hits] DESC);",
+            "ALTER TABLE [schema_options_ratelimit] DROP INDEX [ratelimit_hits_idx];",
+        ])
+
+    def test_unique_index_sql(self):
+        index = UniqueIndex(fields=['key', 'expires'], name='ratelimit_key_unq')
+        with connection.schema_editor(collect_sql=True) as editor:
+            editor.add_index(RateLimit, index)
+            editor.remove_index(RateLimit, index)
+        self.assertEqual(editor.collected_sql, [
+            "ALTER TABLE [schema_options_ratelimit] ADD CONSTRAINT [ratelimit_key_unq] "
+            "UNIQUE NONCLUSTERED ([key], [expires]);",
+            "ALTER TABLE [schema_options_ratelimit] DROP CONSTRAINT [ratelimit_key_unq];",
+        ])
+
+    def test_columnstore_index_sql(self):
+        index = ColumnstoreIndex(clustered=True, name='ratelimit_csi')
+        with connection.schema_editor(collect_sql=True) as editor:
+            editor.add_index(RateLimit, index)
+        self.assertEqual(editor.collected_sql, [
+            "ALTER TABLE [schema_options_ratelimit] ADD INDEX [ratelimit_csi] CLUSTERED COLUMNSTORE;",
+        ])
+
+    def test_unsupported_index_options(self):
+        tests = [
+            (Index(fields=['hits'], name='ratelimit_hits_idx', condition=Q(hits__gt=0)),
+             'Index of memory-optimized table can not have a condition.'),
+            (Index(fields=['hits'], name='ratelimit_hits_idx', include=['expires']),
+             'Index of memory-optimized table can not have included fields.'),
+            (Index(fields=['hits'], name='ratelimit_hits_idx', data_compression='page'),
+             'Index of memory-optimized table can not have data_compression.'),
+            (ColumnstoreIndex(fields=['hits'], name='ratelimit_hits_csi'),
+             'Memory-optimized table can only have clustered columnstore index.'),
+            (ColumnstoreIndex(clustered=True, name='ratelimit_csi', data_compression='columnstore_archive'),
+             'Columnstore index of memory-optimized table can not have data_compression.'),
+        ]
+        for index, message in tests:
+            with connection.schema_editor(collect_sql=True) as editor:
+                with self.assertRaisesMessage(ValueError, message):
+                    editor.add_index(RateLimit, index)
+
+    def test_hash_index(self):
+        index = HashIndex(fields=['key'], name='ratelimit_key_hsh', bucket_count=1024)
+        path, args, kwargs = index.deconstruct()
+        self.assertEqual(path, 'sqlserver.indexes.HashIndex')
+        self.assertEqual(kwargs['bucket_count'], 1024)
+        with self.assertRaisesMessage(ValueError, 'HashIndex.bucket_count is required.'):
+            HashIndex(fields=['key'])
+        with self.assertRaisesMessage(ValueError, 'Hash index fields can not have ordering.'):
+            HashIndex(fields=['-key'], bucket_count=1024)
+
+    def test_durability_introspection(self):
+        with connection.cursor() as cursor:
+            self.assertIsNone(connection.introspection.get_durability(cursor, History._meta.db_table))
+
+
+class ConvertDatetimeTests(TestCase):
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TABLE [schema_options_legacy] ([id] int NOT NULL PRIMARY KEY, [created] datetime NULL)')
+            cursor.execute(
+                'INSERT INTO [schema_options_legacy] VALUES (1, %s), (2, %s), (3, NULL), (4, %s), (5, %s)',
+                ['2017-01-01 10:00:00', '2017-01-02 10:00:00', '2017-01-04 10:00:00', '2017-01-05 10:00:00'],
+            )
+
+    def get_data_type(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT TYPE_NAME(system_type_id), scale FROM sys.columns "
+                "WHERE object_id = OBJECT_ID('schema_options_legacy') AND name = 'created'"
+            )
+            return cursor.fetchone()
+
+    def test_convert(self):
+        out = StringIO()
+        call_command('convertdatetime', 'schema_options.Legacy', 'created', '--batch-size=2', '--no-swap', stdout=out)
+        self.assertIn('Backfilled created_dt2 of table schema_options_legacy, 5 rows.', out.getvalue())
+        self.assertEqual(self.get_data_type(), ('datetime', 3))
+        # trigger keeps the shadow column in sync
+        Legacy.objects.create(id=6, created=datetime.datetime(2017, 1, 6, 10))
+        Legacy.objects.filter(id=1).update(created=datetime.datetime(2016, 12, 31, 10))
+        out = StringIO()
+        call_command('convertdatetime', 'schema_options.Legacy', 'created', '--batch-size=2', stdout=out)
+        self.assertIn('Resuming backfill of created_dt2 after id=5.', out.getvalue())
+        self.assertIn('Converted column created of table schema_options_legacy to datetime2(6).', out.getvalue())
+        self.assertEqual(self.get_data_type(), ('datetime2', 6))
+        self.assertEqual(
+            list(Legacy.objects.order_by('id').values_list('created', flat=True)),
+            [
+                datetime.datetime(2016, 12, 31, 10), datetime.datetime(2017, 1, 2, 10), None,
+                datetime.datetime(2017, 1, 4, 10), datetime.datetime(2017, 1, 5, 10), datetime.datetime(2017, 1, 6, 10),
+            ],
+        )
+        out = StringIO()
+        call_command('convertdatetime', 'schema_options.Legacy', 'created', stdout=out)
+        self.assertEqual(out.getvalue(), 'Column created of table schema_options_legacy is already converted.\n')
+
+    def test_not_null(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM [schema_options_legacy] WHERE [created] IS NULL')
+            cursor.execute('ALTER TABLE [schema_options_legacy] ALTER COLUMN [created] datetime NOT NULL')
+        call_command('convertdatetime', 'schema_options.Legacy', 'created', stdout=StringIO())
+        self.assertEqual(self.get_data_type(), ('datetime2', 6))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT is_not_trusted FROM sys.check_constraints "
+                "WHERE parent_object_id = OBJECT_ID('schema_options_legacy') AND name = %s",
+                ['schema_options_legacy_created_not_null'],
+            )
+            self.assertEqual(cursor.fetchall(), [(True,)])
+        with self.assertRaises(IntegrityError):
+            Legacy.objects.create(id=6, created=None)
+
+    def test_dependencies(self):
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE INDEX [legacy_created] ON [schema_options_legacy] ([created])')
+        msg = 'Column created is used by legacy_created.'
+        with self.assertRaisesMessage(CommandError, msg):
+            call_command('convertdatetime', 'schema_options.Legacy', 'created', stdout=StringIO())
+        self.assertEqual(self.get_data_type(), ('datetime', 3))